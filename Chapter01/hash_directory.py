@@ -0,0 +1,258 @@
+from __future__ import print_function
+import argparse
+import csv
+import hashlib
+import multiprocessing as mp
+import os
+import sys
+import threading
+import time
+from hash_manifest import HashManifest, stat_key
+
+"""
+MIT License
+
+Copyright (c) 2017 Chapin Bryce, Preston Miller
+
+Please share comments and questions at:
+    https://github.com/PythonForensics/PythonForensicsCookbook
+    or email pyforcookbook@gmail.com
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+__authors__ = ["Chapin Bryce", "Preston Miller"]
+__date__ = 20170815
+__description__ = "Hash every file under a directory with a process pool"
+
+available_algorithms = {
+    "md5": hashlib.md5,
+    "sha1": hashlib.sha1,
+    "sha256": hashlib.sha256,
+    "sha512": hashlib.sha512
+}
+
+
+def main(target, output, algorithms, num_workers, batch_count, small_size,
+         buff_size, manifest_path=None):
+    print("[+] Hashing files under {} with {} worker(s)".format(
+        target, num_workers))
+    if manifest_path is not None:
+        print("[+] Reusing unchanged digests from {}".format(manifest_path))
+        # Create the schema once before the workers open read connections
+        HashManifest(manifest_path).close()
+
+    # Bounded queues keep memory flat regardless of the size of the tree:
+    # the walk blocks once the workers fall behind
+    task_queue = mp.Queue(maxsize=num_workers * 2)
+    result_queue = mp.Queue(maxsize=num_workers * 4)
+
+    workers = []
+    for w in range(num_workers):
+        p = mp.Process(target=hash_worker,
+                       args=(task_queue, result_queue, algorithms,
+                             buff_size, manifest_path))
+        p.start()
+        workers.append(p)
+
+    stats = {"files": 0, "bytes": 0, "cached": 0, "errors": 0}
+    writer = threading.Thread(target=write_csv,
+                              args=(result_queue, output, algorithms, stats,
+                                    manifest_path))
+    writer.start()
+
+    start_time = time.time()
+    for batch in batch_files(target, batch_count, small_size):
+        task_queue.put(batch)
+
+    for worker in workers:
+        task_queue.put(None)
+    for worker in workers:
+        worker.join()
+
+    result_queue.put(None)
+    writer.join()
+    elapsed = time.time() - start_time
+
+    print("[+] Hashed {} files ({} bytes) in {:.2f} seconds".format(
+        stats["files"], stats["bytes"], elapsed))
+    if manifest_path is not None:
+        print("[+] {} file(s) were unchanged and served from the "
+              "manifest".format(stats["cached"]))
+    if stats["errors"]:
+        print("[-] {} file(s) could not be read, see {}".format(
+            stats["errors"], output))
+
+
+def batch_files(target, batch_count, small_size):
+    # Small files are grouped so a single task amortizes the IPC cost,
+    # large files are dispatched on their own
+    batch = []
+    batch_bytes = 0
+    for root, directories, files in os.walk(target):
+        for file_entry in files:
+            file_path = os.path.join(root, file_entry)
+            try:
+                file_size = os.path.getsize(file_path)
+            except OSError:
+                file_size = 0
+
+            if file_size >= small_size:
+                yield [file_path]
+                continue
+
+            batch.append(file_path)
+            batch_bytes += file_size
+            if len(batch) >= batch_count or batch_bytes >= small_size:
+                yield batch
+                batch = []
+                batch_bytes = 0
+
+    if batch:
+        yield batch
+
+
+def hash_worker(task_queue, result_queue, algorithms, buff_size,
+                manifest_path):
+    manifest = None
+    if manifest_path is not None:
+        manifest = HashManifest(manifest_path)
+
+    batch = task_queue.get()
+    while batch is not None:
+        results = []
+        for file_path in batch:
+            results.append(hash_file(file_path, algorithms, buff_size,
+                                     manifest))
+        result_queue.put(results)
+        batch = task_queue.get()
+
+    if manifest is not None:
+        manifest.close()
+
+
+def hash_file(file_path, algorithms, buff_size, manifest=None):
+    # Returns the CSV row, the manifest key and whether it was cached
+    hash_objs = [available_algorithms[alg]() for alg in algorithms]
+    file_size = 0
+    try:
+        with open(file_path, "rb") as open_file:
+            # Stat the open handle so the key describes the bytes we read
+            key = stat_key(os.fstat(open_file.fileno()))
+            if manifest is not None:
+                digests = manifest.lookup(key, algorithms)
+                if digests is not None:
+                    return [file_path, key[2]] + digests + [""], key, True
+
+            buff = open_file.read(buff_size)
+            while buff:
+                file_size += len(buff)
+                for hash_obj in hash_objs:
+                    hash_obj.update(buff)
+                buff = open_file.read(buff_size)
+    except (IOError, OSError):
+        _, e, _ = sys.exc_info()
+        row = [file_path, file_size] + [""] * len(algorithms) + [str(e)]
+        return row, None, False
+
+    row = [file_path, file_size] + \
+        [hash_obj.hexdigest() for hash_obj in hash_objs] + [""]
+    return row, key, False
+
+
+def write_csv(result_queue, output, algorithms, stats, manifest_path=None):
+    manifest = None
+    if manifest_path is not None:
+        manifest = HashManifest(manifest_path)
+
+    if sys.version_info < (3, 0):
+        csvfile = open(output, "wb")
+    else:
+        csvfile = open(output, "w", newline="")
+
+    with csvfile:
+        csv_writer = csv.writer(csvfile)
+        csv_writer.writerow(["File Path", "Size"] + algorithms + ["Error"])
+        results = result_queue.get()
+        while results is not None:
+            for row, key, cached in results:
+                stats["files"] += 1
+                stats["bytes"] += row[1]
+                if row[-1]:
+                    stats["errors"] += 1
+                elif cached:
+                    stats["cached"] += 1
+                elif manifest is not None:
+                    manifest.record(key, row[0], algorithms,
+                                    row[2:2 + len(algorithms)])
+                csv_writer.writerow(row)
+            csvfile.flush()
+            results = result_queue.get()
+
+    if manifest is not None:
+        manifest.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=__description__,
+        epilog="Developed by {} on {}".format(
+            ", ".join(__authors__), __date__)
+    )
+    parser.add_argument("DIR_PATH", help="Path to directory")
+    parser.add_argument("OUTPUT_CSV", help="Output CSV with file hashes")
+    parser.add_argument("-a", "--algorithm", action="append",
+                        choices=sorted(available_algorithms.keys()),
+                        help="Hash algorithm to use, may be repeated "
+                             "(default: md5)")
+    parser.add_argument("-w", "--workers", type=int,
+                        default=mp.cpu_count(),
+                        help="Number of hashing processes")
+    parser.add_argument("--batch", type=int, default=64,
+                        help="Maximum number of small files per task")
+    parser.add_argument("--small", type=int, default=1024 * 1024,
+                        help="Files below this size in bytes are batched")
+    parser.add_argument("-b", "--buffer-size", type=int, default=1,
+                        help="Read buffer size in MiB (default: 1)")
+    parser.add_argument("-m", "--manifest",
+                        help="SQLite manifest of previous digests; "
+                             "unchanged files are not re-read and an "
+                             "interrupted run resumes where it stopped")
+    args = parser.parse_args()
+
+    if args.workers < 1 or args.batch < 1 or args.buffer_size < 1:
+        parser.error("workers, batch and buffer size must be at least 1")
+
+    algorithms = []
+    for alg in args.algorithm or ["md5"]:
+        if alg not in algorithms:
+            algorithms.append(alg)
+
+    if not os.path.isdir(args.DIR_PATH):
+        print("[-] Supplied directory {} does not exist or is not a "
+              "directory".format(args.DIR_PATH))
+        sys.exit(1)
+
+    directory = os.path.dirname(args.OUTPUT_CSV)
+    if directory != "" and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    main(args.DIR_PATH, args.OUTPUT_CSV, algorithms, args.workers,
+         args.batch, args.small, args.buffer_size * 1024 * 1024,
+         args.manifest)
@@ -0,0 +1,96 @@
+from __future__ import print_function
+import sqlite3
+
+"""
+MIT License
+
+Copyright (c) 2017 Chapin Bryce, Preston Miller
+
+Please share comments and questions at:
+    https://github.com/PythonForensics/PythonForensicsCookbook
+    or email pyforcookbook@gmail.com
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+__authors__ = ["Chapin Bryce", "Preston Miller"]
+__date__ = 20170815
+__description__ = "SQLite backed cache of previously computed file hashes"
+
+
+def stat_key(stat_info):
+    # The same fields file_metadata.py reports; if any of them changes the
+    # cached digest can no longer be trusted
+    mtime_ns = getattr(stat_info, "st_mtime_ns", None)
+    if mtime_ns is None:
+        mtime_ns = int(stat_info.st_mtime * 1000000000)
+    return (to_signed(stat_info.st_dev), to_signed(stat_info.st_ino),
+            stat_info.st_size, mtime_ns)
+
+
+def to_signed(value):
+    # SQLite integers are signed 64-bit, some inode numbers are not
+    if value >= 2 ** 63:
+        return value - 2 ** 64
+    return value
+
+
+class HashManifest(object):
+    """Persistent digests keyed on (st_dev, st_ino, st_size, st_mtime_ns)"""
+    def __init__(self, path, commit_every=1000):
+        self.path = path
+        self.commit_every = commit_every
+        self._pending = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("pragma journal_mode=WAL")
+        self.conn.execute("pragma synchronous=NORMAL")
+        self.conn.execute(
+            "create table if not exists manifest ("
+            "st_dev integer, st_ino integer, st_size integer, "
+            "st_mtime_ns integer, algorithm text, digest text, path text, "
+            "primary key (st_dev, st_ino, st_size, st_mtime_ns, algorithm))")
+        self.conn.commit()
+
+    def lookup(self, key, algorithms):
+        cur = self.conn.execute(
+            "select algorithm, digest from manifest where st_dev = ? and "
+            "st_ino = ? and st_size = ? and st_mtime_ns = ?", key)
+        cached = dict(cur.fetchall())
+        if not all(alg in cached for alg in algorithms):
+            return None
+        return [cached[alg] for alg in algorithms]
+
+    def record(self, key, path, algorithms, digests):
+        self.conn.executemany(
+            "insert or replace into manifest values (?, ?, ?, ?, ?, ?, ?)",
+            [key + (alg, digest, path)
+             for alg, digest in zip(algorithms, digests)])
+        self._pending += 1
+        # Committing in batches lets an interrupted run resume from the
+        # last checkpoint without paying for a transaction per file
+        if self._pending >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        self.conn.commit()
+        self._pending = 0
+
+    def close(self):
+        self.commit()
+        self.conn.close()
@@ -2,6 +2,13 @@ from __future__ import print_function
 import argparse
 import hashlib
 import os
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 """
 MIT License
@@ -42,33 +49,92 @@ available_algorithms = {
     "sha512": hashlib.sha512
 }
 
+
+def reader(open_file, buff_size, buff_queues, stats):
+    # Read the file once and hand every buffer to each hashing thread
+    try:
+        buff = open_file.read(buff_size)
+        while buff:
+            stats["bytes"] += len(buff)
+            for buff_queue in buff_queues:
+                buff_queue.put(buff)
+            buff = open_file.read(buff_size)
+    except Exception as e:
+        # Raised again by the main thread once the hashers have stopped
+        stats["error"] = e
+    finally:
+        # Without the sentinels a failed read leaves the hashers waiting
+        for buff_queue in buff_queues:
+            buff_queue.put(None)
+
+
+def hasher(hash_obj, buff_queue):
+    # hashlib releases the GIL on large updates, so each algorithm can
+    # digest the same buffer on its own core
+    buff = buff_queue.get()
+    while buff is not None:
+        hash_obj.update(buff)
+        buff = buff_queue.get()
+
+
 parser = argparse.ArgumentParser(
     description=__description__,
     epilog="Developed by {} on {}".format(", ".join(__authors__), __date__)
 )
 parser.add_argument("FILE_NAME", help="Path of file to hash")
-parser.add_argument("ALGORITHM", help="Hash algorithm to use",
-                    choices=sorted(available_algorithms.keys()))
+parser.add_argument("ALGORITHM", help="Hash algorithm(s) to use",
+                    nargs="+", choices=sorted(available_algorithms.keys()))
+parser.add_argument("-b", "--buffer-size", type=int, default=8,
+                    help="Read buffer size in MiB (default: 8)")
+parser.add_argument("-q", "--queue-depth", type=int, default=4,
+                    help="Buffers queued per algorithm (default: 4)")
 args = parser.parse_args()
 
+if args.buffer_size < 1 or args.queue_depth < 1:
+    parser.error("buffer size and queue depth must be at least 1")
+
 input_file = args.FILE_NAME
-hash_alg = args.ALGORITHM
+hash_algs = []
+for alg in args.ALGORITHM:
+    if alg not in hash_algs:
+        hash_algs.append(alg)
 
-file_name = available_algorithms[hash_alg]()
 abs_path = os.path.abspath(input_file)
-file_name.update(abs_path.encode())
+for hash_alg in hash_algs:
+    file_name = available_algorithms[hash_alg]()
+    file_name.update(abs_path.encode())
+    print("The {} of the filename is: {}".format(
+        hash_alg, file_name.hexdigest()))
 
-print("The {} of the filename is: {}".format(
-    hash_alg, file_name.hexdigest()))
+file_contents = []
+buff_queues = []
+threads = []
+for hash_alg in hash_algs:
+    file_content = available_algorithms[hash_alg]()
+    buff_queue = queue.Queue(maxsize=args.queue_depth)
+    file_contents.append(file_content)
+    buff_queues.append(buff_queue)
+    threads.append(threading.Thread(target=hasher,
+                                    args=(file_content, buff_queue)))
 
-file_content = available_algorithms[hash_alg]()
+stats = {"bytes": 0}
+start_time = time.time()
 with open(input_file, 'rb') as open_file:
-    buff_size = 1024
-    buff = open_file.read(buff_size)
+    buff_size = args.buffer_size * 1024 * 1024
+    threads.append(threading.Thread(
+        target=reader, args=(open_file, buff_size, buff_queues, stats)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+elapsed = time.time() - start_time
+if "error" in stats:
+    raise stats["error"]
 
-    while buff:
-        file_content.update(buff)
-        buff = open_file.read(buff_size)
+for hash_alg, file_content in zip(hash_algs, file_contents):
+    print("The {} of the content is: {}".format(
+        hash_alg, file_content.hexdigest()))
 
-print("The {} of the content is: {}".format(
-    hash_alg, file_content.hexdigest()))
+if elapsed > 0:
+    print("Hashed {} bytes in {:.2f} seconds ({:.2f} MiB/s)".format(
+        stats["bytes"], elapsed, stats["bytes"] / 1024.0 / 1024 / elapsed))
@@ -0,0 +1,158 @@
+from __future__ import print_function
+import argparse
+from bisect import bisect_right
+from itertools import islice, product
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from sqlite_carver import find_candidates, find_gaps
+from sqlite_varint import decode_varint, encode_varint
+
+"""
+MIT License
+
+Copyright (c) 2017 Chapin Bryce, Preston Miller
+
+Please share comments and questions at:
+    https://github.com/PythonForensics/PythonForensicsCookbook
+    or email pyforcookbook@gmail.com
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+__authors__ = ["Chapin Bryce", "Preston Miller"]
+__date__ = 20170815
+__description__ = "Benchmark ROWID gap finding and candidate carving " \
+                  "for sqlite_carver.py"
+
+
+def main(rows, delete_ratio, sample, seed):
+    random.seed(seed)
+    fd, database = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        print("[+] Building a {:,} row table, deleting {:.0%} of "
+              "rows".format(rows, delete_ratio))
+        build_table(database, rows, delete_ratio)
+
+        conn = sqlite3.connect(database)
+        c = conn.cursor()
+        start = time.time()
+        gaps = find_gaps(c, "messages", "id")
+        gap_time = time.time() - start
+        conn.close()
+
+        size = os.path.getsize(database)
+        start = time.time()
+        candidates = find_candidates(database, gaps)
+        carve_time = time.time() - start
+    finally:
+        os.remove(database)
+
+    missing = sum(last - first + 1 for first, last in gaps)
+    print("[+] find_gaps:       {:8.3f}s for {:,} missing ROWIDs in {:,} "
+          "ranges".format(gap_time, missing, len(gaps)))
+    print("[+] find_candidates: {:8.3f}s for {:,} candidates in {:,} "
+          "bytes ({:,.1f} MiB/s)".format(
+              carve_time, len(candidates), size,
+              size / 1024.0 / 1024 / max(carve_time, 1e-9)))
+
+    # Every search term must start with the varint of a missing ROWID
+    firsts = [first for first, _ in gaps]
+    for rowid, term, _ in candidates:
+        value, _ = decode_varint(bytearray.fromhex(term))
+        index = bisect_right(firsts, rowid) - 1
+        if value != rowid or index < 0 or rowid > gaps[index][1]:
+            print("[-] {} is not a missing ROWID {}".format(term, rowid))
+            sys.exit(2)
+    print("[+] All {:,} candidates are missing ROWIDs".format(
+        len(candidates)))
+
+    # The old approach searched every n-byte combination per ROWID;
+    # time it on a small sample of 2-byte ROWIDs to extrapolate
+    two_byte = list(islice(
+        (x for first, last in gaps
+         for x in range(max(first, 128), min(last, 16383) + 1)), sample))
+    if two_byte:
+        start = time.time()
+        for rowid in two_byte:
+            if product_search(rowid) != encode_varint(rowid):
+                print("[-] Exhaustive search disagrees for {}".format(rowid))
+                sys.exit(2)
+        per_rowid = (time.time() - start) / len(two_byte)
+        print("[+] Exhaustive 2-byte search: {:.4f}s per ROWID, about "
+              "{:,.0f}s for this gap set; 3-byte ROWIDs cost 256x "
+              "more".format(per_rowid, per_rowid * missing))
+
+
+def build_table(database, rows, delete_ratio):
+    conn = sqlite3.connect(database)
+    # Leave deleted records in place for find_candidates to carve
+    conn.execute("pragma secure_delete = off")
+    # A 36-character guid and 50 NULL columns give each record the
+    # 0x35 0x00 0x55 header that sqlite_carver.py searches for
+    conn.execute("create table messages (id integer primary key, guid text, "
+                 "{})".format(", ".join("c{} text".format(i)
+                                        for i in range(50))))
+    conn.executemany("insert into messages (id, guid) values (?, ?)",
+                     ((i, "{:08X}-0000-0000-0000-{:012X}".format(i, i))
+                      for i in range(1, rows + 1)))
+    # Keep the last row so the gap range spans the whole table
+    conn.executemany("delete from messages where id = ?",
+                     ((i,) for i in range(2, rows)
+                      if random.random() < delete_ratio))
+    conn.commit()
+    conn.close()
+
+
+def product_search(rowid):
+    # Reference for the removed brute-force converter, limited to 2 bytes
+    for combo in product(range(128, 256), range(128)):
+        value, _ = decode_varint(bytearray(combo))
+        if value == rowid:
+            return bytes(bytearray(combo))
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__description__,
+        epilog="Developed by {} on {}".format(
+            ", ".join(__authors__), __date__)
+    )
+    parser.add_argument("-r", "--rows", type=int, default=1000000,
+                        help="Rows in the synthetic table "
+                             "(default: 1000000)")
+    parser.add_argument("-d", "--deleted", type=float, default=0.1,
+                        help="Fraction of rows to delete (default: 0.1)")
+    parser.add_argument("-s", "--sample", type=int, default=20,
+                        help="2-byte ROWIDs to time the exhaustive search "
+                             "on (default: 20)")
+    parser.add_argument("--seed", type=int, default=1,
+                        help="Random seed (default: 1)")
+    args = parser.parse_args()
+
+    if args.rows < 3:
+        parser.error("--rows must be at least 3")
+    if not 0 < args.deleted < 1:
+        parser.error("--deleted must be between 0 and 1")
+
+    main(args.rows, args.deleted, args.sample, args.seed)
@@ -1,12 +1,17 @@
 from __future__ import print_function
 import argparse
 import binascii
+from bisect import bisect_right
 import csv
-from itertools import product
+import mmap
 import os
 import re
 import sqlite3
 import sys
+from sqlite_gaps import gap_ranges, ordered_keys
+from sqlite_journal import connect, open_snapshot
+from sqlite_pages import read_schema
+from sqlite_varint import decode_varint
 
 """
 MIT License
@@ -40,6 +45,10 @@ __authors__ = ["Chapin Bryce", "Preston Miller"]
 __date__ = 20170815
 __description__ = "SQLite carving utility"
 
+# Record header bytes expected right after a carved ROWID varint
+CANDIDATE_TAILS = (b"\x35\x00\x55", b"\x36\x00\x55")
+CANDIDATE_RE = re.compile(b"|".join(re.escape(x) for x in CANDIDATE_TAILS))
+
 
 def main(database, table, out_csv, **kwargs):
     print("[+] Attempting connection to {} database".format(database))
@@ -47,20 +56,35 @@ def main(database, table, out_csv, **kwargs):
         print("[-] Database does not exist or is not a file")
         sys.exit(1)
 
-    # Connect to SQLite Database
-    conn = sqlite3.connect(database)
-    c = conn.cursor()
+    try:
+        snapshot = open_snapshot(database, kwargs.get("commit"))
+    except ValueError:
+        _, e, _ = sys.exc_info()
+        print("[-] Unable to parse database: {}".format(e))
+        sys.exit(5)
+    if kwargs.get("commit") is not None:
+        # Read the table from the pages as of a WAL commit
+        print("[+] Reading {} as of commit {}".format(
+            table, kwargs["commit"]))
+        conn = c = None
+        schema = read_schema(snapshot, table)
+        table_data = schema.columns if schema is not None else []
+    else:
+        # Connect to SQLite Database
+        conn = connect(database)
+        c = conn.cursor()
 
-    # Query Table for Primary Key
-    c.execute("pragma table_info({})".format(table))
-    table_data = c.fetchall()
+        # Query Table for Primary Key
+        c.execute("pragma table_info({})".format(table))
+        table_data = c.fetchall()
     if table_data == []:
         print("[-] Check spelling of table name - '{}' did not return "
               "any results".format(table))
         sys.exit(2)
 
+    source = snapshot if conn is None else None
     if "col" in kwargs:
-        gaps = find_gaps(c, table, kwargs["col"])
+        gaps = find_gaps(c, table, kwargs["col"], source)
 
     else:
         # Add Primary Keys to List
@@ -75,102 +99,132 @@ def main(database, table, out_csv, **kwargs):
                   "using the --column argument")
             sys.exit(3)
 
-        gaps = find_gaps(c, table, potential_pks[0])
-    conn.close()
+        gaps = find_gaps(c, table, potential_pks[0], source)
+    if conn is not None:
+        conn.close()
 
     print("[+] Carving for missing ROWIDs")
-    varints = varint_converter(list(gaps))
-    search_results = find_candidates(database, varints)
+    search_results = []
+    for source in (snapshot.db, snapshot.wal, snapshot.journal):
+        if source is not None:
+            search_results.extend(locate_candidates(
+                source, find_candidates(source.path, gaps)))
+    snapshot.close()
     if search_results != []:
         print("[+] Writing {} potential candidates to {}".format(
             len(search_results), out_csv))
-        write_csv(out_csv, ["ROWID", "Search Term", "Offset"],
+        write_csv(out_csv, ["File", "Page", "Commit", "ROWID",
+                            "Search Term", "Offset"],
                   search_results)
     else:
         print("[-] No search results found for missing ROWIDs")
 
 
-def find_gaps(db_conn, table, pk):
+def find_gaps(db_conn, table, pk, snapshot=None):
     print("[+] Identifying missing ROWIDs for {} column".format(pk))
     try:
-        db_conn.execute("select {} from {}".format(pk, table))
-    except sqlite3.OperationalError:
+        keys = ordered_keys(db_conn, table, pk, snapshot)
+    except (sqlite3.OperationalError, ValueError):
         print("[-] '{}' column does not exist -- "
               "please check spelling".format(pk))
         sys.exit(4)
-    results = db_conn.fetchall()
-    rowids = sorted([x[0] for x in results])
-    total_missing = rowids[-1] - len(rowids)
+    try:
+        gaps = list(gap_ranges(keys))
+    except TypeError:
+        print("[-] '{}' column holds values other than integers".format(pk))
+        sys.exit(6)
+    total_missing = sum(last - first + 1 for first, last in gaps)
 
     if total_missing == 0:
         print("[*] No missing ROWIDs from {} column".format(pk))
         sys.exit(0)
     else:
-        print("[+] {} missing ROWID(s) from {} column".format(
-            total_missing, pk))
-
-    # Find Missing ROWIDs
-    gaps = set(range(rowids[0], rowids[-1] + 1)).difference(rowids)
+        print("[+] {} missing ROWID(s) in {} range(s) from {} "
+              "column".format(total_missing, len(gaps), pk))
     return gaps
 
 
-def varint_converter(rows):
-    varints = {}
-    varint_combos = []
-    for i, row in enumerate(rows):
-        if row <= 127:
-            varints[hex(row)[2:]] = row
-
-        else:
-            combos = [x for x in range(0, 256)]
-            counter = 1
-            while True:
-                counter += 1
-                print("[+] Generating and finding all {} byte "
-                      "varints..".format(counter))
-                varint_combos = list(product(combos, repeat=counter))
-                varint_combos = [x for x in varint_combos if x[0] >= 128]
-                for varint_combo in varint_combos:
-                    varint = integer_converter(varint_combo)
-                    if varint == row:
-                        varints["".join([hex(v)[2:].zfill(2) for v in
-                                         varint_combo])] = row
-                        i += 1
-                        try:
-                            row = rows[i]
-                        except IndexError:
-                            return varints
-
-
-def integer_converter(numbs):
-    binary = ""
-    for numb in numbs:
-        binary += bin(numb)[2:].zfill(8)[1:]
-    binvar = binary.lstrip("0")
-    if binvar != '':
-        return int(binvar, 2)
-    else:
-        return 0
-
+def find_candidates(database, gaps, chunk_size=16 * 1024 * 1024):
+    # Every search term is a ROWID varint followed by one of two fixed
+    # record header tails, so one pass over the file looks for the tails
+    # and decodes each varint that could end in front of one. A varint
+    # is kept if its ROWID falls in one of the sorted gap ranges, which
+    # a bisect finds without listing every missing ROWID. The file is
+    # memory-mapped and scanned in windows that overlap by the longest
+    # varint, so memory use does not grow with the file either.
+    if not gaps or os.path.getsize(database) == 0:
+        return []
+    firsts = [first for first, _ in gaps]
+    overlap = 9
 
-def find_candidates(database, varints):
     results = []
-    candidate_a = "350055"
-    candidate_b = "360055"
-
     with open(database, "rb") as infile:
-        hex_data = str(binascii.hexlify(infile.read()))
-    for varint in varints:
-        search_a = varint + candidate_a
-        search_b = varint + candidate_b
-
-        for result in re.finditer(search_a, hex_data):
-            results.append([varints[varint], search_a, result.start() / 2])
+        data = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            size = len(data)
+            for start in range(0, size, chunk_size):
+                base = max(0, start - overlap)
+                stop = min(start + chunk_size, size)
+                window = data[base:min(stop + len(CANDIDATE_TAILS[0]) - 1,
+                                       size)]
+                for match in CANDIDATE_RE.finditer(window, start - base):
+                    tail = match.start()
+                    if base + tail >= stop:
+                        break
+                    for rowid, length in varints_before(window, tail):
+                        index = bisect_right(firsts, rowid) - 1
+                        if index < 0 or rowid > gaps[index][1]:
+                            continue
+                        term = window[tail - length:tail] + match.group(0)
+                        results.append([
+                            rowid, binascii.hexlify(term).decode("ascii"),
+                            base + tail - length])
+        finally:
+            data.close()
+
+    results.sort()
+    return results
 
-        for result in re.finditer(search_b, hex_data):
-            results.append([varints[varint], search_b, result.start() / 2])
 
-    return results
+def varints_before(data, end):
+    """Yield (value, length) for each varint that could end at data[end]
+
+    Only the encoding SQLite writes for a value counts, so a varint of
+    up to 8 bytes may not start with an empty 0x80 byte, and a 9-byte
+    one must hold more than 56 bits.
+    """
+    if end >= 1 and not data[end - 1] & 0x80:
+        value = data[end - 1]
+        yield value, 1
+        for length in range(2, 9):
+            byte = data[end - length] if end >= length else 0
+            if not byte & 0x80:
+                break
+            value |= (byte & 0x7F) << (7 * (length - 1))
+            if byte != 0x80:
+                yield value, length
+    if end >= 9 and all(x & 0x80 for x in data[end - 9:end - 1]):
+        value = decode_varint(data, end - 9)[0]
+        if value > 0x00FFFFFFFFFFFFFF:
+            yield value, 9
+
+
+def locate_candidates(source, results):
+    # Name the file, database page and WAL commit each hit falls in, so
+    # hits in old page versions can be told from hits in the database
+    located = []
+    for rowid, term, offset in results:
+        page = commit = ""
+        if hasattr(source, "version_at"):
+            version = source.version_at(offset)
+            if version is not None:
+                page = version.page_no
+                commit = "" if version.commit is None else version.commit
+        else:
+            page = offset // source.header.page_size + 1
+        located.append([os.path.basename(source.path), page, commit, rowid,
+                        term, offset])
+    return located
 
 
 def write_csv(output, cols, msgs):
@@ -191,10 +245,14 @@ if __name__ == "__main__":
     parser.add_argument("TABLE", help="Table to query from")
     parser.add_argument("OUTPUT_CSV", help="Output CSV File")
     parser.add_argument("--column", help="Optional column argument")
+    parser.add_argument("-c", "--commit", type=int, default=None,
+                        help="Find gaps as of this WAL commit "
+                        "(0 for the main file alone)")
     args = parser.parse_args()
 
     if args.column is not None:
         main(args.SQLITE_DATABASE, args.TABLE,
-             args.OUTPUT_CSV, col=args.column)
+             args.OUTPUT_CSV, col=args.column, commit=args.commit)
     else:
-        main(args.SQLITE_DATABASE, args.TABLE, args.OUTPUT_CSV)
+        main(args.SQLITE_DATABASE, args.TABLE, args.OUTPUT_CSV,
+             commit=args.commit)
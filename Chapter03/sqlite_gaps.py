@@ -1,8 +1,11 @@
 from __future__ import print_function
 import argparse
+import csv
 import os
 import sqlite3
 import sys
+from sqlite_journal import connect, open_snapshot
+from sqlite_pages import column_index, column_values, read_schema
 
 """
 MIT License
@@ -43,20 +46,35 @@ def main(database, table, **kwargs):
         print("[-] Database does not exist or is not a file")
         sys.exit(1)
 
-    # Connect to SQLite Database
-    conn = sqlite3.connect(database)
-    c = conn.cursor()
+    snapshot = None
+    if kwargs.get("commit") is not None:
+        # Read the table from the pages as of a WAL commit
+        print("[+] Reading {} as of commit {}".format(
+            table, kwargs["commit"]))
+        c = None
+        try:
+            snapshot = open_snapshot(database, kwargs["commit"])
+        except ValueError:
+            _, e, _ = sys.exc_info()
+            print("[-] Unable to parse database: {}".format(e))
+            sys.exit(5)
+        schema = read_schema(snapshot, table)
+        table_data = schema.columns if schema is not None else []
+    else:
+        # Connect to SQLite Database
+        conn = connect(database)
+        c = conn.cursor()
 
-    # Query Table for Primary Key
-    c.execute("pragma table_info({})".format(table))
-    table_data = c.fetchall()
+        # Query Table for Primary Key
+        c.execute("pragma table_info({})".format(table))
+        table_data = c.fetchall()
     if table_data == []:
         print("[-] Check spelling of table name - '{}' did not return "
               "any results".format(table))
         sys.exit(2)
 
     if "col" in kwargs:
-        find_gaps(c, table, kwargs["col"])
+        find_gaps(c, table, kwargs["col"], snapshot, kwargs.get("output"))
 
     else:
         # Add Primary Keys to List
@@ -71,31 +89,89 @@ def main(database, table, **kwargs):
                   "key using the --column argument")
             sys.exit(3)
 
-        find_gaps(c, table, potential_pks[0])
+        find_gaps(c, table, potential_pks[0], snapshot,
+                  kwargs.get("output"))
 
 
-def find_gaps(db_conn, table, pk):
+def find_gaps(db_conn, table, pk, snapshot=None, out_csv=None):
     print("[+] Identifying missing ROWIDs for {} column".format(pk))
     try:
-        db_conn.execute("select {} from {}".format(pk, table))
-    except sqlite3.OperationalError:
+        keys = ordered_keys(db_conn, table, pk, snapshot)
+    except (sqlite3.OperationalError, ValueError):
         print("[-] '{}' column does not exist -- "
               "please check spelling".format(pk))
         sys.exit(4)
-    results = db_conn.fetchall()
-    rowids = sorted([x[0] for x in results])
-    total_missing = rowids[-1] - len(rowids)
+
+    # Only the gaps are kept, however far apart the keys are
+    gaps = []
+    total_missing = 0
+    csvfile = None
+    if out_csv is not None:
+        csvfile = open(out_csv, "w", newline="")
+        csv_writer = csv.writer(csvfile)
+        csv_writer.writerow(["First Missing", "Last Missing", "Count"])
+    try:
+        for first, last in gap_ranges(keys):
+            gaps.append((first, last))
+            total_missing += last - first + 1
+            if csvfile is not None:
+                csv_writer.writerow([first, last, last - first + 1])
+    except TypeError:
+        print("[-] '{}' column holds values other than integers".format(pk))
+        sys.exit(6)
+    finally:
+        if csvfile is not None:
+            csvfile.close()
 
     if total_missing == 0:
         print("[*] No missing ROWIDs from {} column".format(pk))
         sys.exit(0)
     else:
-        print("[+] {} missing ROWID(s) from {} column".format(
-            total_missing, pk))
+        print("[+] {} missing ROWID(s) in {} range(s) from {} "
+              "column".format(total_missing, len(gaps), pk))
+
+    if out_csv is not None:
+        print("[+] Wrote missing ROWID ranges to {}".format(out_csv))
+    else:
+        print("[*] Missing ROWIDS: {}".format(format_ranges(gaps)))
+    return gaps
+
+
+def ordered_keys(db_conn, table, pk, snapshot=None):
+    """Return an iterator over the non-NULL values of pk, in order
 
-    # Find Missing ROWIDs
-    gaps = set(range(rowids[0], rowids[-1] + 1)).difference(rowids)
-    print("[*] Missing ROWIDS: {}".format(gaps))
+    The cursor streams rows in index order, so nothing is held in
+    memory. From a page snapshot, ROWIDs and their aliases come out in
+    order as the b-tree is walked; any other column has to be sorted.
+    """
+    if snapshot is None:
+        db_conn.execute("select {0} from {1} where {0} is not null "
+                        "order by {0}".format(pk, table))
+        return (x[0] for x in db_conn)
+    schema = read_schema(snapshot, table)
+    index = column_index(schema, pk)
+    values = column_values(snapshot, schema, index)
+    if index is None:
+        return values
+    return iter(sorted(x for x in values if x is not None))
+
+
+def gap_ranges(keys):
+    """Yield (first, last) for each run of integers missing from keys
+
+    keys must be in ascending order. Repeated keys are fine. Only the
+    span between the lowest and highest key is checked.
+    """
+    previous = None
+    for key in keys:
+        if previous is not None and key > previous + 1:
+            yield previous + 1, key - 1
+        previous = key
+
+
+def format_ranges(gaps):
+    return ", ".join(str(first) if first == last else
+                     "{}-{}".format(first, last) for first, last in gaps)
 
 
 if __name__ == "__main__":
@@ -108,9 +184,21 @@ if __name__ == "__main__":
     parser.add_argument("SQLITE_DATABASE", help="Input SQLite database")
     parser.add_argument("TABLE", help="Table to query from")
     parser.add_argument("--column", help="Optional column argument")
+    parser.add_argument("-c", "--commit", type=int, default=None,
+                        help="Read the table as of this WAL commit "
+                        "(0 for the main file alone)")
+    parser.add_argument("-o", "--output",
+                        help="Write missing ROWID ranges to this CSV file")
     args = parser.parse_args()
 
+    if args.output is not None:
+        directory = os.path.dirname(args.output)
+        if directory != '' and not os.path.exists(directory):
+            os.makedirs(directory)
+
     if args.column is not None:
-        main(args.SQLITE_DATABASE, args.TABLE, col=args.column)
+        main(args.SQLITE_DATABASE, args.TABLE, col=args.column,
+             commit=args.commit, output=args.output)
     else:
-        main(args.SQLITE_DATABASE, args.TABLE)
+        main(args.SQLITE_DATABASE, args.TABLE, commit=args.commit,
+             output=args.output)
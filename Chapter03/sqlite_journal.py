@@ -0,0 +1,346 @@
+from __future__ import print_function
+from bisect import bisect_right
+from collections import namedtuple
+import os
+import sqlite3
+import struct
+from urllib.request import pathname2url
+from sqlite_pages import MappedFile, PageFile, read_header
+
+"""
+MIT License
+
+Copyright (c) 2017 Chapin Bryce, Preston Miller
+
+Please share comments and questions at:
+    https://github.com/PythonForensics/PythonForensicsCookbook
+    or email pyforcookbook@gmail.com
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+WAL_MAGIC = (0x377F0682, 0x377F0683)
+WAL_HEADER = struct.Struct(">IIIIIIII")
+WAL_FRAME = struct.Struct(">IIIIII")
+JOURNAL_MAGIC = b"\xd9\xd5\x05\xf9\x20\xa1\x63\xd7"
+JOURNAL_HEADER = struct.Struct(">8sIIIII")
+
+# One saved image of a database page. commit is the WAL commit the
+# frame belongs to, or None for uncommitted frames and journal pages.
+PageVersion = namedtuple("PageVersion", ["path", "offset", "page_no",
+                                         "commit"])
+
+
+def connect(database):
+    """Open database read-only, so closing it cannot checkpoint the WAL
+
+    A read-write connection that closes last checkpoints the WAL into
+    the database and deletes it, destroying every old page version.
+    """
+    uri = "file:{}?mode=ro".format(pathname2url(os.path.abspath(database)))
+    return sqlite3.connect(uri, uri=True)
+
+
+class WalFile(MappedFile):
+    """Frames of a write-ahead log, indexed by page number and commit
+
+    Frames whose salts and running checksum check out belong to commit
+    1, 2, ... in log order, each commit ending at a frame that records
+    the new database size. Frames after the last commit, or left over
+    from an earlier generation of the log, are kept as versions with no
+    commit number but never enter a snapshot.
+    """
+
+    def __init__(self, path):
+        super(WalFile, self).__init__(path)
+        data = self.map
+        if len(data) < WAL_HEADER.size:
+            self.close()
+            raise ValueError("Not a SQLite write-ahead log")
+        magic, _, page_size, _, salt1, salt2, sum1, sum2 = \
+            WAL_HEADER.unpack_from(data, 0)
+        if magic not in WAL_MAGIC or not page_size:
+            self.close()
+            raise ValueError("Not a SQLite write-ahead log")
+        self.page_size = page_size
+        self._frame_size = WAL_FRAME.size + page_size
+        # The checksums sum 32-bit words in the byte order the magic
+        # number names
+        words = ">" if magic & 1 else "<"
+
+        self.versions = []
+        self.commits = []
+        self._pages = {}
+        sums = _wal_checksum(data, 0, 24, words, (0, 0))
+        valid = sums == (sum1, sum2)
+        pending = []
+        for offset in range(WAL_HEADER.size,
+                            len(data) - self._frame_size + 1,
+                            self._frame_size):
+            page_no, db_size, fsalt1, fsalt2, fsum1, fsum2 = \
+                WAL_FRAME.unpack_from(data, offset)
+            self.versions.append(PageVersion(
+                path, offset + WAL_FRAME.size, page_no, None))
+            if valid and (fsalt1, fsalt2) == (salt1, salt2):
+                sums = _wal_checksum(data, offset, 8, words, sums)
+                sums = _wal_checksum(data, offset + WAL_FRAME.size,
+                                     page_size, words, sums)
+                valid = sums == (fsum1, fsum2)
+            else:
+                valid = False
+            if not valid:
+                continue
+            pending.append(len(self.versions) - 1)
+            if db_size:
+                self.commits.append(db_size)
+                self._add_commit(pending, len(self.commits))
+                pending = []
+
+    def _add_commit(self, indexes, commit):
+        for index in indexes:
+            version = self.versions[index]._replace(commit=commit)
+            self.versions[index] = version
+            commits, frames = self._pages.setdefault(
+                version.page_no, ([], []))
+            commits.append(commit)
+            frames.append(index)
+
+    def lookup(self, page_no, commit):
+        """Return the newest version of a page at or before commit"""
+        entry = self._pages.get(page_no)
+        if entry is None:
+            return None
+        index = bisect_right(entry[0], commit)
+        if not index:
+            return None
+        return self.versions[entry[1][index - 1]]
+
+    def version_at(self, offset):
+        """Return the version whose frame holds offset, or None"""
+        index = (offset - WAL_HEADER.size) // self._frame_size
+        if offset < WAL_HEADER.size or index >= len(self.versions):
+            return None
+        return self.versions[index]
+
+    def page(self, version):
+        return self.view(version.offset, self.page_size)
+
+
+def _wal_checksum(data, offset, size, words, sums):
+    s0, s1 = sums
+    values = struct.unpack_from("{}{}I".format(words, size // 4),
+                                data, offset)
+    for i in range(0, len(values), 2):
+        s0 = (s0 + values[i] + s1) & 0xFFFFFFFF
+        s1 = (s1 + values[i + 1] + s0) & 0xFFFFFFFF
+    return s0, s1
+
+
+class JournalFile(MappedFile):
+    """Original page images saved in a rollback journal
+
+    Each segment header is followed by page records, and the next
+    segment starts at the following sector boundary. A record whose
+    page number is zero or whose checksum does not match the segment's
+    nonce ends the journal, as it does for SQLite's own rollback.
+    """
+
+    def __init__(self, path):
+        super(JournalFile, self).__init__(path)
+        data = self.map
+        self.page_size = None
+        self.db_size = None
+        self.versions = []
+        self._pages = {}
+        pos = 0
+        while pos + JOURNAL_HEADER.size <= len(data):
+            magic, records, nonce, db_size, sector, page_size = \
+                JOURNAL_HEADER.unpack_from(data, pos)
+            if magic != JOURNAL_MAGIC or not sector or not page_size or \
+                    page_size != (self.page_size or page_size):
+                break
+            if self.page_size is None:
+                self.page_size = page_size
+                self.db_size = db_size
+            size = page_size + 8
+            start = pos + sector
+            if records in (0, 0xFFFFFFFF):
+                # Unsynced journals leave the count unset
+                records = (len(data) - start) // size
+            end = self._read_segment(start, records, nonce)
+            if end is None:
+                break
+            pos = -(-end // sector) * sector
+        if self.page_size is None:
+            self.close()
+            raise ValueError("Not a SQLite rollback journal")
+
+    def _read_segment(self, start, records, nonce):
+        # Return where the segment's records end, or None if a bad
+        # record cut it short
+        data = self.map
+        size = self.page_size + 8
+        for offset in range(start, start + records * size, size):
+            if offset + size > len(data):
+                return None
+            page_no, = struct.unpack_from(">I", data, offset)
+            checksum, = struct.unpack_from(
+                ">I", data, offset + 4 + self.page_size)
+            if not page_no or checksum != _journal_checksum(
+                    data, offset + 4, self.page_size, nonce):
+                return None
+            self._pages.setdefault(page_no, len(self.versions))
+            self.versions.append(PageVersion(
+                self.path, offset + 4, page_no, None))
+        return start + records * size
+
+    def lookup(self, page_no):
+        """Return the page as it was before the journaled transaction"""
+        index = self._pages.get(page_no)
+        return None if index is None else self.versions[index]
+
+    def version_at(self, offset):
+        """Return the version whose record holds offset, or None"""
+        starts = [x.offset for x in self.versions]
+        index = bisect_right(starts, offset) - 1
+        if index < 0 or offset >= starts[index] + self.page_size:
+            return None
+        return self.versions[index]
+
+    def page(self, version):
+        return self.view(version.offset, self.page_size)
+
+
+def _journal_checksum(data, offset, page_size, nonce):
+    # SQLite samples one byte in every 200 of the page
+    checksum = nonce
+    i = page_size - 200
+    while i > 0:
+        checksum += data[offset + i]
+        i -= 200
+    return checksum & 0xFFFFFFFF
+
+
+class Snapshot(object):
+    """The database as of a WAL commit, served page by page
+
+    Each page comes from the newest WAL frame at or before the commit,
+    else from the journal's saved image (undoing a transaction that
+    never finished), else from the main file. Pages are views into the
+    files they live in; nothing is copied. commit 0 is the main file
+    (and journal) alone, and the default is the last commit, which is
+    what SQLite itself would read.
+    """
+
+    def __init__(self, db, wal=None, journal=None, commit=None):
+        self.db = db
+        self.wal = wal
+        self.journal = journal
+        commits = len(wal.commits) if wal is not None else 0
+        if commit is None:
+            commit = commits
+        if not 0 <= commit <= commits:
+            raise ValueError("No commit {} (the WAL has {})".format(
+                commit, commits))
+        for sidecar in (wal, journal):
+            if sidecar is not None and \
+                    sidecar.page_size != db.header.page_size:
+                raise ValueError("{} does not match the database page "
+                                 "size".format(sidecar.path))
+        self.commit = commit
+
+        page_count = db.header.page_count
+        if journal is not None and journal.db_size:
+            page_count = journal.db_size
+        if commit:
+            page_count = wal.commits[commit - 1]
+        # The freelist and encoding come from the snapshot's own page 1
+        self.header = db.header._replace(page_count=page_count)
+        self.header = read_header(self.page(1))._replace(
+            page_count=page_count)
+
+    def locate(self, page_no):
+        """Return (file, offset) holding the snapshot's copy of a page"""
+        if self.commit:
+            version = self.wal.lookup(page_no, self.commit)
+            if version is not None:
+                return self.wal, version.offset
+        if self.journal is not None:
+            version = self.journal.lookup(page_no)
+            if version is not None:
+                return self.journal, version.offset
+        return self.db, self.db.offset(page_no)
+
+    def page(self, page_no):
+        if not 1 <= page_no <= self.header.page_count:
+            raise ValueError("Page {} out of range".format(page_no))
+        source, offset = self.locate(page_no)
+        return source.view(offset, self.header.page_size)
+
+    def versions(self):
+        """Return every saved page version the snapshot does not serve
+
+        That is every WAL frame and journal page the snapshot does not
+        read, plus the main file's copy of each page it reads from
+        elsewhere.
+        """
+        served = set()
+        for page_no in range(1, self.header.page_count + 1):
+            source, offset = self.locate(page_no)
+            served.add((source.path, offset))
+        versions = []
+        for page_no in range(1, self.db.header.page_count + 1):
+            offset = self.db.offset(page_no)
+            if (self.db.path, offset) not in served:
+                versions.append(PageVersion(self.db.path, offset, page_no,
+                                            None))
+        for sidecar in (self.wal, self.journal):
+            if sidecar is not None:
+                versions.extend(x for x in sidecar.versions
+                                if (x.path, x.offset) not in served)
+        return versions
+
+    def close(self):
+        for source in (self.wal, self.journal, self.db):
+            if source is not None:
+                source.close()
+
+
+def open_snapshot(database, commit=None):
+    """Return a Snapshot of database with its -wal and -journal files
+
+    Sidecar files that are missing, empty or not valid are left out.
+    """
+    db = PageFile(database)
+    sidecars = []
+    for suffix, reader in (("-wal", WalFile), ("-journal", JournalFile)):
+        path = database + suffix
+        sidecar = None
+        if os.path.isfile(path):
+            try:
+                sidecar = reader(path)
+            except ValueError:
+                pass
+        sidecars.append(sidecar)
+    try:
+        return Snapshot(db, sidecars[0], sidecars[1], commit)
+    except ValueError:
+        for source in sidecars + [db]:
+            if source is not None:
+                source.close()
+        raise
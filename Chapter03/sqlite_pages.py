@@ -0,0 +1,643 @@
+from __future__ import print_function
+import binascii
+from collections import namedtuple
+import mmap
+import sqlite3
+import struct
+from sqlite_varint import decode_varint
+
+"""
+MIT License
+
+Copyright (c) 2017 Chapin Bryce, Preston Miller
+
+Please share comments and questions at:
+    https://github.com/PythonForensics/PythonForensicsCookbook
+    or email pyforcookbook@gmail.com
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+SQLITE_MAGIC = b"SQLite format 3\x00"
+HEADER_SIZE = 100
+
+# B-tree page types
+INDEX_INTERIOR = 0x02
+TABLE_INTERIOR = 0x05
+INDEX_LEAF = 0x0A
+TABLE_LEAF = 0x0D
+
+ENCODINGS = {1: "utf-8", 2: "utf-16-le", 3: "utf-16-be"}
+
+# Storage classes of record serial types
+NULL, INTEGER, REAL, TEXT, BLOB = range(5)
+FIXED_SIZES = (0, 1, 2, 3, 4, 6, 8, 8, 0, 0)
+
+# Page and region labels used in recovered rows
+LIVE_LEAF = "Live Leaf"
+UNALLOCATED = "Unallocated"
+FREEBLOCK = "Freeblock"
+FREELIST_TRUNK = "Freelist Trunk"
+FREELIST_LEAF = "Freelist Leaf"
+WAL_FRAME = "WAL Frame"
+JOURNAL_PAGE = "Journal Page"
+SUPERSEDED_PAGE = "Superseded Page"
+
+# pragma table_info rows for the schema table itself
+MASTER_COLUMNS = [(0, "type", "text", 0, None, 0),
+                  (1, "name", "text", 0, None, 0),
+                  (2, "tbl_name", "text", 0, None, 0),
+                  (3, "rootpage", "int", 0, None, 0),
+                  (4, "sql", "text", 0, None, 0)]
+
+DatabaseHeader = namedtuple("DatabaseHeader", [
+    "page_size", "usable_size", "page_count", "freelist_trunk",
+    "freelist_count", "encoding"])
+
+
+def read_header(data):
+    """Return the DatabaseHeader parsed from the first 100 bytes"""
+    raw = bytes(data[:HEADER_SIZE])
+    if len(raw) < HEADER_SIZE or not raw.startswith(SQLITE_MAGIC):
+        raise ValueError("Not a SQLite 3 database")
+    page_size = struct.unpack(">H", raw[16:18])[0]
+    if page_size == 1:
+        page_size = 65536
+    reserved = bytearray(raw)[20]
+    change_counter = struct.unpack(">I", raw[24:28])[0]
+    page_count, trunk, count = struct.unpack(">III", raw[28:40])
+    valid_for = struct.unpack(">I", raw[92:96])[0]
+    if page_count == 0 or valid_for != change_counter:
+        # Older writers leave the in-header size stale
+        page_count = len(data) // page_size
+    encoding = ENCODINGS.get(struct.unpack(">I", raw[56:60])[0], "utf-8")
+    return DatabaseHeader(page_size, page_size - reserved, page_count,
+                          trunk, count, encoding)
+
+
+def header_offset(page_no):
+    """Return where the b-tree page header starts within a page"""
+    return HEADER_SIZE if page_no == 1 else 0
+
+
+class MappedFile(object):
+    """Read-only memory map of a file handing out memoryviews
+
+    Views are slices of the map rather than copies. They must be
+    released (or dropped) before close(), which raises BufferError
+    while one is still alive.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self.map = mmap.mmap(self._file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+        except (ValueError, mmap.error):
+            self._file.close()
+            raise ValueError("{} is empty".format(path))
+
+    def __len__(self):
+        return len(self.map)
+
+    def view(self, offset, size):
+        return memoryview(self.map)[offset:offset + size]
+
+    def close(self):
+        self.map.close()
+        self._file.close()
+
+
+class PageFile(MappedFile):
+    """Memory-mapped database file handing out pages as memoryviews"""
+
+    def __init__(self, path):
+        try:
+            super(PageFile, self).__init__(path)
+        except ValueError:
+            raise ValueError("Not a SQLite 3 database")
+        try:
+            self.header = read_header(self.map)
+        except ValueError:
+            self.close()
+            raise
+
+    def offset(self, page_no):
+        return (page_no - 1) * self.header.page_size
+
+    def locate(self, page_no):
+        """Return (file, offset) holding the page"""
+        return self, self.offset(page_no)
+
+    def page(self, page_no):
+        if not 1 <= page_no <= self.header.page_count:
+            raise ValueError("Page {} out of range".format(page_no))
+        return self.view(self.offset(page_no), self.header.page_size)
+
+
+class TableSchema(object):
+    """Column names and the storage classes each column may hold
+
+    Built from pragma table_info. An INTEGER PRIMARY KEY column is an
+    alias for the ROWID and is always stored as NULL in the record.
+    NOT NULL columns never hold NULL, which rules out many false hits.
+    """
+
+    def __init__(self, name, columns, rootpage):
+        self.name = name
+        self.rootpage = rootpage
+        self.columns = columns
+        self.names = [x[1] for x in columns]
+        pks = [x for x in columns if x[5]]
+        alias = None
+        if len(pks) == 1 and pks[0][2].strip().upper() == "INTEGER":
+            alias = pks[0][0]
+        self.allowed = []
+        self.real_columns = []
+        for cid, _, decl, notnull, _, _ in columns:
+            affinity = _affinity(decl)
+            if affinity == "REAL":
+                self.real_columns.append(cid)
+            if cid == alias:
+                allowed = {NULL}
+            else:
+                allowed = set(AFFINITY_CLASSES[affinity])
+                if notnull:
+                    allowed.discard(NULL)
+            self.allowed.append(frozenset(allowed))
+        self.rowid_alias = alias
+        count = len(self.names)
+        self.min_header = count + 1
+        self.max_header = 9 * count + 9
+
+    def apply_affinity(self, values):
+        """Turn integers back into floats in REAL columns, as SQLite does
+
+        SQLite stores whole-number REAL values as integers on disk.
+        """
+        for cid in self.real_columns:
+            if cid < len(values) and isinstance(values[cid], int):
+                values[cid] = float(values[cid])
+        return values
+
+
+# Storage classes each column affinity may leave on disk
+AFFINITY_CLASSES = {
+    "INTEGER": (NULL, INTEGER, REAL),
+    "TEXT": (NULL, TEXT, BLOB),
+    "BLOB": (NULL, INTEGER, REAL, TEXT, BLOB),
+    "REAL": (NULL, INTEGER, REAL),
+    "NUMERIC": (NULL, INTEGER, REAL, TEXT),
+}
+
+
+def _affinity(decl):
+    # Column affinity rules from the SQLite datatype documentation
+    decl = (decl or "").upper()
+    if "INT" in decl:
+        return "INTEGER"
+    if "CHAR" in decl or "CLOB" in decl or "TEXT" in decl:
+        return "TEXT"
+    if "BLOB" in decl or not decl:
+        return "BLOB"
+    if "REAL" in decl or "FLOA" in decl or "DOUB" in decl:
+        return "REAL"
+    return "NUMERIC"
+
+
+def load_schema(conn, table):
+    """Return the TableSchema of table, or None if it does not exist"""
+    c = conn.cursor()
+    c.execute("pragma table_info({})".format(table))
+    columns = c.fetchall()
+    if columns == []:
+        return None
+    c.execute("select rootpage from sqlite_master "
+              "where type = 'table' and name = ?", (table,))
+    row = c.fetchone()
+    return TableSchema(table, columns, row[0] if row else 0)
+
+
+def read_schema(source, table):
+    """Return the TableSchema of table as stored in the source's pages
+
+    The CREATE TABLE statement is read from sqlite_master on page 1 and
+    replayed in an in-memory database for pragma table_info, so the
+    database itself is never opened by SQLite. Returns None if there is
+    no such ordinary table.
+    """
+    master = TableSchema("sqlite_master", MASTER_COLUMNS, 1)
+    for _, values in table_rows(source, master):
+        kind, name, _, rootpage, sql = values
+        if kind != "table" or not name or not sql or \
+                name.lower() != table.lower():
+            continue
+        conn = sqlite3.connect(":memory:")
+        try:
+            conn.execute(sql)
+            columns = conn.execute(
+                "pragma table_info({})".format(name)).fetchall()
+        except sqlite3.Error:
+            return None
+        finally:
+            conn.close()
+        return TableSchema(name, columns, rootpage)
+    return None
+
+
+def table_leaves(source, rootpage):
+    """Yield the leaf page numbers of the table b-tree rooted at rootpage"""
+    count = source.header.page_count
+    stack = [rootpage]
+    seen = set()
+    while stack:
+        page_no = stack.pop()
+        if page_no in seen or not 1 <= page_no <= count:
+            continue
+        seen.add(page_no)
+        page = source.page(page_no)
+        hdr = header_offset(page_no)
+        kind = page[hdr]
+        if kind == TABLE_LEAF:
+            yield page_no
+        elif kind == TABLE_INTERIOR:
+            cells, = struct.unpack_from(">H", page, hdr + 3)
+            right, = struct.unpack_from(">I", page, hdr + 8)
+            children = []
+            for i in range(cells):
+                ptr, = struct.unpack_from(">H", page, hdr + 12 + 2 * i)
+                if ptr + 4 <= len(page):
+                    children.append(
+                        struct.unpack_from(">I", page, ptr)[0])
+            stack.append(right)
+            stack.extend(reversed(children))
+
+
+def freelist_pages(source):
+    """Yield (page number, label) for every freelist trunk and leaf page"""
+    header = source.header
+    trunk = header.freelist_trunk
+    seen = set()
+    while trunk and trunk not in seen and trunk <= header.page_count:
+        seen.add(trunk)
+        page = source.page(trunk)
+        next_trunk, leaves = struct.unpack_from(">II", page, 0)
+        leaves = min(leaves, (header.usable_size - 8) // 4)
+        yield trunk, FREELIST_TRUNK
+        for i in range(leaves):
+            leaf, = struct.unpack_from(">I", page, 8 + 4 * i)
+            if 1 <= leaf <= header.page_count:
+                yield leaf, FREELIST_LEAF
+        trunk = next_trunk
+
+
+def table_rows(source, schema):
+    """Yield (ROWID, values) for each live row of a table, in ROWID order
+
+    Payloads that spill onto overflow pages are reassembled. Rows
+    written before an ALTER TABLE ADD COLUMN are padded with None.
+    """
+    header = source.header
+    count = len(schema.names)
+    for page_no in table_leaves(source, schema.rootpage):
+        page = bytes(source.page(page_no))
+        hdr = header_offset(page_no)
+        cells, = struct.unpack_from(">H", page, hdr + 3)
+        for i in range(cells):
+            ptr, = struct.unpack_from(">H", page, hdr + 8 + 2 * i)
+            payload, size1 = decode_varint(page, ptr)
+            rowid, size2 = decode_varint(page, ptr + size1)
+            if rowid >= 1 << 63:
+                rowid -= 1 << 64
+            data = _payload(source, page, ptr + size1 + size2, payload)
+            values = record_values(data, header.encoding)
+            values = (values + [None] * count)[:count]
+            if schema.rowid_alias is not None:
+                values[schema.rowid_alias] = rowid
+            yield rowid, schema.apply_affinity(values)
+
+
+def column_index(schema, column):
+    """Return the index of column, or None if it names the ROWID"""
+    names = [x.lower() for x in schema.names]
+    if column.lower() in names:
+        index = names.index(column.lower())
+        return None if index == schema.rowid_alias else index
+    if column.lower() in ("rowid", "oid", "_rowid_"):
+        return None
+    raise ValueError("'{}' column does not exist".format(column))
+
+
+def column_values(source, schema, index):
+    """Yield column index (or the ROWID, for None) of each live row
+
+    Rows come in ROWID order, so ROWIDs come out sorted.
+    """
+    for rowid, values in table_rows(source, schema):
+        yield rowid if index is None else values[index]
+
+
+def record_values(data, encoding):
+    """Return the values of the record in data, without schema checks"""
+    header_size, pos = decode_varint(data, 0)
+    types = []
+    while pos < header_size:
+        serial, size = decode_varint(data, pos)
+        types.append(serial)
+        pos += size
+    hit = _read_values(data, types, header_size, len(data), 0, encoding,
+                       lenient=True)
+    return hit[0] if hit is not None else [None] * len(types)
+
+
+def _payload(source, page, start, payload):
+    # Local payload sizes follow the b-tree page format in the SQLite
+    # file format documentation
+    usable = source.header.usable_size
+    max_local = usable - 35
+    if payload <= max_local:
+        return page[start:start + payload]
+    min_local = (usable - 12) * 32 // 255 - 23
+    local = min_local + (payload - min_local) % (usable - 4)
+    if local > max_local:
+        local = min_local
+    parts = [page[start:start + local]]
+    remaining = payload - local
+    next_page, = struct.unpack_from(">I", page, start + local)
+    seen = set()
+    while remaining > 0 and next_page not in seen and \
+            1 <= next_page <= source.header.page_count:
+        seen.add(next_page)
+        overflow = source.page(next_page)
+        next_page, = struct.unpack_from(">I", overflow, 0)
+        part = bytes(overflow[4:4 + min(remaining, usable - 4)])
+        parts.append(part)
+        remaining -= len(part)
+    return b"".join(parts)
+
+
+def page_regions(page, page_no, label, usable):
+    """Return the (start, end, label) byte ranges of a page to carve
+
+    A live table leaf page gives the gap between its cell pointer array
+    and cell content area, plus each block on its freeblock chain. A
+    freelist trunk page gives everything after its leaf list. Freelist
+    leaf pages and old page versions (from a WAL or journal, or main
+    file pages a WAL has superseded) give all of their usable bytes,
+    unless they are interior table pages, which hold no records.
+    """
+    hdr = header_offset(page_no)
+    if label == FREELIST_TRUNK:
+        leaves, = struct.unpack_from(">I", page, 4)
+        return [(min(8 + 4 * leaves, usable), usable, label)]
+    if label != LIVE_LEAF:
+        if page[hdr] == TABLE_INTERIOR:
+            return []
+        return [(0, usable, label)]
+
+    if page[hdr] != TABLE_LEAF:
+        return []
+    first_free, cells, content = struct.unpack_from(">HHH", page, hdr + 1)
+    content = content or 65536
+    ptr_end = hdr + 8 + 2 * cells
+    regions = []
+    if ptr_end < content:
+        regions.append((ptr_end, min(content, usable), UNALLOCATED))
+    seen = set()
+    block = first_free
+    while block and block not in seen and ptr_end <= block <= usable - 4:
+        seen.add(block)
+        next_block, size = struct.unpack_from(">HH", page, block)
+        regions.append((block, min(block + size, usable), FREEBLOCK))
+        block = next_block
+    return regions
+
+
+def carve_page(page, page_no, label, schema, encoding, usable, base=0):
+    """Return [page, offset, region, ROWID] + values for each carved record
+
+    base is the file offset of the page, so offsets point back into the
+    file the page was read from. Records whose payload spilled onto
+    overflow pages are not reassembled and are skipped.
+    """
+    buf = bytes(page)
+    rows = []
+    for start, end, region in page_regions(buf, page_no, label, usable):
+        for offset, rowid, values in carve_region(
+                buf, start, end, schema, encoding):
+            rows.append([page_no, base + offset, region, rowid] +
+                        schema.apply_affinity(values))
+    return rows
+
+
+def carve_region(buf, start, end, schema, encoding):
+    """Yield (offset, ROWID or "", values) for records found in buf
+
+    Every offset is tried as a whole cell (payload length, ROWID,
+    record), then as a bare record, then as a freed cell. A hit resumes
+    the scan after the record it decoded.
+    """
+    pos = start
+    while pos < end:
+        hit = _cell_at(buf, pos, end, schema, encoding)
+        if hit is not None:
+            rowid, values, length = hit
+            yield pos, rowid, values
+            pos += length
+            continue
+        hit = decode_record(buf, pos, end, schema, encoding)
+        if hit is None:
+            hit = _freed_cell_at(buf, pos, end, schema, encoding)
+            if hit is not None:
+                # The record starts after the freeblock header
+                pos += 4
+        if hit is not None:
+            values, length = hit
+            yield pos, "", values
+            pos += length
+            continue
+        pos += 1
+
+
+def _cell_at(buf, pos, end, schema, encoding):
+    if not buf[pos]:
+        return None
+    try:
+        payload, size1 = decode_varint(buf, pos)
+        rowid, size2 = decode_varint(buf, pos + size1)
+    except ValueError:
+        return None
+    start = pos + size1 + size2
+    if payload < schema.min_header or start + payload > end:
+        return None
+    hit = decode_record(buf, start, end, schema, encoding)
+    if hit is None or hit[1] != payload:
+        return None
+    if rowid >= 1 << 63:
+        rowid -= 1 << 64
+    values = hit[0]
+    if schema.rowid_alias is not None:
+        values[schema.rowid_alias] = rowid
+    return rowid, values, start + payload - pos
+
+
+def decode_record(buf, pos, end, schema, encoding):
+    """Return (values, length) if buf[pos:end] starts with a record
+
+    The record must have one serial type per schema column, each of a
+    storage class the column allows, and must fit before end.
+    """
+    first = buf[pos]
+    if first < 0x80 and not \
+            schema.min_header <= first <= schema.max_header:
+        return None
+    try:
+        header_size, size = decode_varint(buf, pos)
+    except ValueError:
+        return None
+    if not schema.min_header <= header_size <= schema.max_header or \
+            pos + header_size > end:
+        return None
+    serials = _read_serials(buf, pos + size, pos + header_size, schema, 0)
+    if serials is None or serials[1] != pos + header_size:
+        return None
+    return _read_values(buf, serials[0], serials[1], end, pos, encoding)
+
+
+def _freed_cell_at(buf, pos, end, schema, encoding):
+    # Freeing a cell overwrites its first four bytes with a freeblock
+    # header (next block, block size), clobbering the payload length,
+    # ROWID and often the record header size. Such headers survive
+    # when blocks merge or fall back into the unallocated gap. A freed
+    # cell fills its block, give or take a merged fragment of up to
+    # three bytes, or ends where the next freed cell of a merged block
+    # starts, and a decode that ends anywhere else is misaligned.
+    stop = _block_end(buf, pos, end)
+    if stop is None:
+        return None
+    start = pos + 4
+    # With the header size gone, read the serial types from the start
+    # of the block, or one column later when the first column is the
+    # ROWID alias whose NULL type byte was overwritten too.
+    candidates = [decode_record(buf, start, stop, schema, encoding)]
+    skips = [0]
+    if NULL in schema.allowed[0]:
+        skips.append(1)
+    for skip in skips:
+        serials = _read_serials(buf, start, stop, schema, skip)
+        if serials is not None:
+            types = [0] * skip + serials[0]
+            candidates.append(_read_values(
+                buf, types, serials[1], stop, start, encoding))
+    for hit in candidates:
+        if hit is None:
+            continue
+        tail = start + hit[1]
+        if stop - tail <= 3 or _block_end(buf, tail, stop) is not None:
+            return hit
+    return None
+
+
+def _block_end(buf, pos, end):
+    # Return where a plausible freeblock header at pos says the block
+    # ends, or None
+    if pos + 4 >= end:
+        return None
+    next_block, size = struct.unpack_from(">HH", buf, pos)
+    if size <= 4 or pos + size > end or next_block >= len(buf) or \
+            (next_block and next_block < pos + size):
+        return None
+    return pos + size
+
+
+def _read_serials(buf, pos, stop, schema, skip):
+    types = []
+    for allowed in schema.allowed[skip:]:
+        if pos >= stop:
+            return None
+        byte = buf[pos]
+        if byte < 0x80:
+            serial = byte
+            pos += 1
+        else:
+            try:
+                serial, size = decode_varint(buf, pos)
+            except ValueError:
+                return None
+            pos += size
+        if serial >= 12:
+            kind = TEXT if serial & 1 else BLOB
+        elif serial == 0:
+            kind = NULL
+        elif serial == 7:
+            kind = REAL
+        elif serial < 10:
+            kind = INTEGER
+        else:
+            return None
+        if kind not in allowed:
+            return None
+        types.append(serial)
+    if pos > stop:
+        return None
+    return types, pos
+
+
+def _read_values(buf, types, pos, end, start, encoding, lenient=False):
+    # Carved records must decode cleanly and hold something other than
+    # NULLs; live records (lenient) are taken as they are
+    values = []
+    empty = True
+    errors = "replace" if lenient else "strict"
+    for serial in types:
+        if serial >= 12:
+            size = (serial - 12) >> 1
+        elif serial < 10:
+            size = FIXED_SIZES[serial]
+        else:
+            return None
+        if pos + size > end:
+            return None
+        if serial == 0:
+            values.append(None)
+            continue
+        empty = False
+        if serial < 7:
+            values.append(int.from_bytes(buf[pos:pos + size], "big",
+                                         signed=True))
+        elif serial == 7:
+            values.append(struct.unpack_from(">d", buf, pos)[0])
+        elif serial < 10:
+            values.append(serial - 8)
+        elif serial & 1:
+            try:
+                text = buf[pos:pos + size].decode(encoding, errors)
+            except UnicodeDecodeError:
+                return None
+            if "\x00" in text and not lenient:
+                # Zeroed space decodes as NUL-filled text
+                return None
+            values.append(text)
+        else:
+            values.append(binascii.hexlify(
+                buf[pos:pos + size]).decode("ascii"))
+        pos += size
+    if empty and not lenient:
+        return None
+    return values, pos - start
@@ -0,0 +1,262 @@
+from __future__ import print_function
+import argparse
+from collections import namedtuple
+import csv
+import multiprocessing as mp
+import os
+import sys
+from sqlite_journal import open_snapshot
+from sqlite_pages import (JOURNAL_PAGE, LIVE_LEAF, SUPERSEDED_PAGE, WAL_FRAME,
+                          MappedFile, carve_page, freelist_pages, read_schema,
+                          table_leaves, table_rows)
+
+"""
+MIT License
+
+Copyright (c) 2017 Chapin Bryce, Preston Miller
+
+Please share comments and questions at:
+    https://github.com/PythonForensics/PythonForensicsCookbook
+    or email pyforcookbook@gmail.com
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+__authors__ = ["Chapin Bryce", "Preston Miller"]
+__date__ = 20170815
+__description__ = "SQLite page-level record recovery utility"
+
+HEADERS = ["File", "Commit", "Page", "Offset", "Region", "Carved ROWID"]
+
+# A page to carve: where its bytes live, which database page it is, how
+# to carve it and the WAL commit it belongs to, if any
+PageJob = namedtuple("PageJob", ["path", "offset", "page_no", "label",
+                                 "commit"])
+
+# Open files, schema and header of the current worker process
+_worker = {}
+
+
+def main(database, table, out_csv, workers=None, batch_size=64,
+         commit=None):
+    print("[+] Attempting connection to {} database".format(database))
+    if not os.path.exists(database) or not os.path.isfile(database):
+        print("[-] Database does not exist or is not a file")
+        sys.exit(1)
+
+    try:
+        snapshot = open_snapshot(database, commit)
+    except ValueError:
+        _, e, _ = sys.exc_info()
+        print("[-] Unable to parse database: {}".format(e))
+        sys.exit(3)
+    schema = read_schema(snapshot, table)
+    if schema is None:
+        snapshot.close()
+        print("[-] Check spelling of table name - '{}' did not return "
+              "any results".format(table))
+        sys.exit(2)
+
+    jobs = page_jobs(snapshot, schema)
+    history = version_jobs(snapshot)
+    print("[+] Carving {} pages of {} and the freelist".format(
+        len(jobs), table))
+    if history:
+        print("[+] Carving {} superseded page versions".format(
+            len(history)))
+    seen = live_keys(snapshot, schema)
+    header = snapshot.header
+    snapshot.close()
+
+    rows = recover_rows(schema, header, jobs + history, workers, batch_size)
+    total = write_csv(out_csv, HEADERS + schema.names,
+                      unique_rows(rows, seen, schema))
+    if total:
+        print("[+] Wrote {} recovered records to {}".format(total, out_csv))
+    else:
+        print("[-] No records recovered from free space")
+
+
+def page_jobs(snapshot, schema):
+    """Return a PageJob for each page of the snapshot to carve
+
+    Live pages are the leaves of the table's own b-tree, so records of
+    other tables sharing its shape are not reported from them. Pages on
+    the freelist once belonged to any table and are all carved.
+    """
+    labels = {}
+    if schema.rootpage:
+        for page_no in table_leaves(snapshot, schema.rootpage):
+            labels[page_no] = LIVE_LEAF
+    for page_no, label in freelist_pages(snapshot):
+        labels.setdefault(page_no, label)
+
+    jobs = []
+    for page_no, label in sorted(labels.items()):
+        source, offset = snapshot.locate(page_no)
+        commit = None
+        if source is snapshot.wal:
+            commit = source.version_at(offset).commit
+        jobs.append(PageJob(source.path, offset, page_no, label, commit))
+    return jobs
+
+
+def version_jobs(snapshot):
+    """Return a PageJob for each page version the snapshot does not read
+
+    These pages are carved whole, live cells included, since rows that
+    were live in an old version may be gone from the snapshot.
+    """
+    jobs = []
+    for version in snapshot.versions():
+        if version.path == snapshot.db.path:
+            label = SUPERSEDED_PAGE
+        elif snapshot.wal is not None and \
+                version.path == snapshot.wal.path:
+            label = WAL_FRAME
+        else:
+            label = JOURNAL_PAGE
+        jobs.append(PageJob(version.path, version.offset, version.page_no,
+                            label, version.commit))
+    return jobs
+
+
+def live_keys(snapshot, schema):
+    """Return the keys unique_rows gives each live row of the snapshot"""
+    return set(_row_key(values, schema)
+               for _, values in table_rows(snapshot, schema))
+
+
+def unique_rows(rows, seen, schema):
+    """Yield rows whose values are not live and have not been seen yet
+
+    Every page version of a busy table repeats most of its rows, and
+    free space keeps stale copies of rows that moved. A carved row is
+    only kept the first time its values turn up, and never if a live
+    row holds them. Keys are hashes of the values besides the ROWID, so
+    memory grows with the number of distinct rows, not their size.
+    """
+    for row in rows:
+        key = _row_key(row[len(HEADERS):], schema)
+        if key not in seen:
+            seen.add(key)
+            yield row
+
+
+def _row_key(values, schema):
+    return hash(tuple(x for i, x in enumerate(values)
+                      if i != schema.rowid_alias))
+
+
+def recover_rows(schema, header, jobs, workers=None, batch_size=64):
+    """Yield recovered rows for jobs, in job order
+
+    Batches of pages are carved in a process pool whose workers each
+    map the files they read from once. Rows come back batch by batch in
+    job order, so they can be written out as they arrive.
+    """
+    batches = [jobs[i:i + batch_size]
+               for i in range(0, len(jobs), batch_size)]
+    workers = workers or mp.cpu_count()
+    if workers == 1 or len(batches) <= 1:
+        _init_worker(schema, header)
+        try:
+            for batch in batches:
+                for row in _carve_batch(batch):
+                    yield row
+        finally:
+            _close_worker()
+        return
+
+    procs = mp.Pool(min(workers, len(batches)), initializer=_init_worker,
+                    initargs=(schema, header))
+    try:
+        for rows in procs.imap(_carve_batch, batches):
+            for row in rows:
+                yield row
+        procs.close()
+    except BaseException:
+        procs.terminate()
+        raise
+    finally:
+        procs.join()
+
+
+def _init_worker(schema, header):
+    _worker["files"] = {}
+    _worker["schema"] = schema
+    _worker["header"] = header
+
+
+def _close_worker():
+    for source in _worker.pop("files").values():
+        source.close()
+
+
+def _carve_batch(batch):
+    files = _worker["files"]
+    header = _worker["header"]
+    rows = []
+    for job in batch:
+        source = files.get(job.path)
+        if source is None:
+            source = files[job.path] = MappedFile(job.path)
+        prefix = [os.path.basename(job.path),
+                  "" if job.commit is None else job.commit]
+        for row in carve_page(
+                source.view(job.offset, header.page_size), job.page_no,
+                job.label, _worker["schema"], header.encoding,
+                header.usable_size, job.offset):
+            rows.append(prefix + row)
+    return rows
+
+
+def write_csv(output, cols, rows):
+    count = 0
+    with open(output, "w", newline="") as csvfile:
+        csv_writer = csv.writer(csvfile)
+        csv_writer.writerow(cols)
+        for row in rows:
+            csv_writer.writerow(row)
+            count += 1
+    return count
+
+
+if __name__ == "__main__":
+    # Command-line Argument Parser
+    parser = argparse.ArgumentParser(
+        description=__description__,
+        epilog="Developed by {} on {}".format(
+            ", ".join(__authors__), __date__)
+    )
+    parser.add_argument("SQLITE_DATABASE", help="Input SQLite database")
+    parser.add_argument("TABLE", help="Table to recover records of")
+    parser.add_argument("OUTPUT_CSV", help="Output CSV File")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="Worker processes (default: one per CPU)")
+    parser.add_argument("-c", "--commit", type=int, default=None,
+                        help="Carve the database as of this WAL commit "
+                        "(0 for the main file alone; default: the last)")
+    args = parser.parse_args()
+
+    directory = os.path.dirname(args.OUTPUT_CSV)
+    if directory != '' and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    main(args.SQLITE_DATABASE, args.TABLE, args.OUTPUT_CSV, args.workers,
+         commit=args.commit)
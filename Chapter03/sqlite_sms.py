@@ -2,8 +2,9 @@ from __future__ import print_function
 import argparse
 import csv
 import os
-import sqlite3
 import sys
+from sqlite_journal import connect, open_snapshot
+from sqlite_pages import read_schema, table_rows
 
 """
 MIT License
@@ -38,28 +39,51 @@ __date__ = 20170815
 __description__ = "SQLite SMS analysis utility"
 
 
-def main(database, out_csv):
+def main(database, out_csv, commit=None):
     print("[+] Attempting connection to {} database".format(database))
     if not os.path.exists(database) or not os.path.isfile(database):
         print("[-] Database does not exist or is not a file")
         sys.exit(1)
 
-    # Connect to SQLite Database
-    conn = sqlite3.connect(database)
-    c = conn.cursor()
+    if commit is not None:
+        columns, message_data = read_snapshot(database, commit)
+    else:
+        # Connect to SQLite Database
+        conn = connect(database)
+        c = conn.cursor()
 
-    # Query DB for Column Names and Data of Message Table
-    c.execute("pragma table_info(message)")
-    table_data = c.fetchall()
-    columns = [x[1] for x in table_data]
+        # Query DB for Column Names and Data of Message Table
+        c.execute("pragma table_info(message)")
+        table_data = c.fetchall()
+        columns = [x[1] for x in table_data]
 
-    c.execute("select * from message")
-    message_data = c.fetchall()
+        c.execute("select * from message")
+        message_data = c.fetchall()
+        conn.close()
 
     print("[+] Writing Message Content to {}".format(out_csv))
     write_csv(out_csv, columns, message_data)
 
 
+def read_snapshot(database, commit):
+    # Read the message table from the pages as of a WAL commit, since
+    # SQLite itself only ever shows the latest one
+    print("[+] Reading message table as of commit {}".format(commit))
+    try:
+        snapshot = open_snapshot(database, commit)
+    except ValueError:
+        _, e, _ = sys.exc_info()
+        print("[-] Unable to parse database: {}".format(e))
+        sys.exit(2)
+    schema = read_schema(snapshot, "message")
+    if schema is None:
+        print("[-] No message table in the snapshot")
+        sys.exit(2)
+    message_data = [values for _, values in table_rows(snapshot, schema)]
+    snapshot.close()
+    return schema.names, message_data
+
+
 def write_csv(output, cols, msgs):
     with open(output, "w", newline="") as csvfile:
         csv_writer = csv.writer(csvfile)
@@ -76,10 +100,13 @@ if __name__ == '__main__':
     )
     parser.add_argument("SQLITE_DATABASE", help="Input SQLite database")
     parser.add_argument("OUTPUT_CSV", help="Output CSV File")
+    parser.add_argument("-c", "--commit", type=int, default=None,
+                        help="Read the table as of this WAL commit "
+                        "(0 for the main file alone)")
     args = parser.parse_args()
 
     directory = os.path.dirname(args.OUTPUT_CSV)
     if directory != '' and not os.path.exists(directory):
         os.makedirs(directory)
 
-    main(args.SQLITE_DATABASE, args.OUTPUT_CSV)
+    main(args.SQLITE_DATABASE, args.OUTPUT_CSV, args.commit)
@@ -0,0 +1,71 @@
+from __future__ import print_function
+
+"""
+MIT License
+
+Copyright (c) 2017 Chapin Bryce, Preston Miller
+
+Please share comments and questions at:
+    https://github.com/PythonForensics/PythonForensicsCookbook
+    or email pyforcookbook@gmail.com
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+MAX_VARINT = 0xFFFFFFFFFFFFFFFF
+
+
+def encode_varint(value):
+    """Return the SQLite varint encoding of an unsigned 64-bit value
+
+    Big-endian groups of 7 bits with the high bit set on all but the
+    last byte; values above 56 bits take a 9th byte holding a full 8.
+    """
+    value &= MAX_VARINT
+    if value > 0x00FFFFFFFFFFFFFF:
+        out = bytearray(9)
+        out[8] = value & 0xFF
+        value >>= 8
+        for i in range(7, -1, -1):
+            out[i] = (value & 0x7F) | 0x80
+            value >>= 7
+        return bytes(out)
+
+    out = bytearray()
+    out.append(value & 0x7F)
+    value >>= 7
+    while value:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.reverse()
+    return bytes(out)
+
+
+def decode_varint(data, offset=0):
+    """Return (value, length) of the SQLite varint at data[offset:]"""
+    raw = bytearray(data[offset:offset + 9])
+    value = 0
+    for i, byte in enumerate(raw[:8]):
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            return value, i + 1
+    if len(raw) < 9:
+        raise ValueError("Truncated varint at offset {}".format(offset))
+    return (value << 8) | raw[8], 9
+
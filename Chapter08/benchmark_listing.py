@@ -0,0 +1,147 @@
+from __future__ import print_function
+import argparse
+import os
+import pytsk3
+import sys
+import time
+from recurse_files import mft_records, recurse_files
+from utility.imgpool import ImagePool
+from utility.partpool import partition_jobs
+
+"""
+MIT License
+
+Copyright (c) 2017 Chapin Bryce, Preston Miller
+
+Please share comments and questions at:
+    https://github.com/PythonForensics/PythonForensicsCookbook
+    or email pyforcookbook@gmail.com
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+__authors__ = ["Chapin Bryce", "Preston Miller"]
+__date__ = 20170815
+__description__ = "Benchmark the $MFT listing engine against the " \
+                  "directory walk in recurse_files.py"
+
+
+def main(image, img_type, part_type, repeat=1, show=10):
+    volume = None
+    print("[+] Opening {}".format(image))
+    try:
+        pool = ImagePool(image, img_type)
+    except IOError:
+        _, e, _ = sys.exc_info()
+        print("[-] Unable to open image:\n {}".format(e))
+        sys.exit(2)
+    img_info = pool.img_info()
+
+    try:
+        if part_type is not None:
+            attr_id = getattr(pytsk3, "TSK_VS_TYPE_" + part_type)
+            volume = pytsk3.Volume_Info(img_info, attr_id)
+        else:
+            volume = pytsk3.Volume_Info(img_info)
+    except IOError:
+        _, e, _ = sys.exc_info()
+        print("[-] Unable to read partition table:\n {}".format(e))
+
+    benchmarked = 0
+    for job in partition_jobs(volume, img_info):
+        fs = pytsk3.FS_Info(img_info, offset=job.offset)
+        if fs.info.ftype != pytsk3.TSK_FS_TYPE_NTFS:
+            print("[-] Partition {} is not NTFS, skipping".format(job.addr))
+            continue
+        benchmarked += 1
+        print("[+] Partition {}".format(job.addr))
+        walk_rows, walk_time = timed(
+            lambda: recurse_files(job.addr, fs.open_dir(path="/"),
+                                  job.fs_index), repeat)
+        mft_rows, mft_time = timed(
+            lambda: mft_records(job.addr, fs, job.fs_index), repeat)
+        report(walk_rows, walk_time, mft_rows, mft_time, show)
+
+    if not benchmarked:
+        print("[-] No NTFS partitions to benchmark")
+        sys.exit(3)
+
+
+def timed(engine, repeat):
+    # Best of repeat runs; the first run also warms the OS page cache, so
+    # use --repeat to compare warm runs rather than cold against warm
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        rows = list(engine())
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return rows, best
+
+
+def report(walk_rows, walk_time, mft_rows, mft_time, show):
+    for label, rows, elapsed in (("walk", walk_rows, walk_time),
+                                 ("$MFT", mft_rows, mft_time)):
+        print("    {:5} {:>10,} rows in {:8.2f}s ({:,.0f} rows/s)".format(
+            label, len(rows), elapsed, len(rows) / max(elapsed, 1e-9)))
+    print("    Speedup: {:.1f}x".format(walk_time / max(mft_time, 1e-9)))
+
+    # Rows are compared without regard to order: the walk is depth-first,
+    # the $MFT engine goes in record order
+    walk_set = set(walk_rows)
+    mft_set = set(mft_rows)
+    only_walk = sorted(walk_set - mft_set, key=lambda r: r[6])
+    only_mft = sorted(mft_set - walk_set, key=lambda r: r[6])
+    print("    Matching rows: {:,}".format(len(walk_set & mft_set)))
+    for label, rows in (("walk only", only_walk), ("$MFT only", only_mft)):
+        print("    {}: {:,}".format(label, len(rows)))
+        for row in rows[:show]:
+            print("      {} (inode {}, size {})".format(row[6], row[2],
+                                                      row[7]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=__description__,
+        epilog="Developed by {} on {}".format(
+            ", ".join(__authors__), __date__)
+    )
+    parser.add_argument("EVIDENCE_FILE", help="Evidence file path")
+    parser.add_argument("TYPE", help="Type of Evidence",
+                        choices=("raw", "ewf"))
+    parser.add_argument("-p", help="Partition Type",
+                        choices=("DOS", "GPT", "MAC", "SUN"))
+    parser.add_argument("-r", "--repeat", type=int, default=1,
+                        help="Time each engine N times and keep the best "
+                             "(default: 1)")
+    parser.add_argument("--show", type=int, default=10,
+                        help="Differing paths to print per engine "
+                             "(default: 10)")
+    args = parser.parse_args()
+
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    if os.path.exists(args.EVIDENCE_FILE) and \
+            os.path.isfile(args.EVIDENCE_FILE):
+        main(args.EVIDENCE_FILE, args.TYPE, args.p, args.repeat, args.show)
+    else:
+        print("[-] Supplied input file {} does not exist or is not a "
+              "file".format(args.EVIDENCE_FILE))
+        sys.exit(1)
@@ -3,8 +3,12 @@ import argparse
 import csv
 import os
 import pytsk3
-import pyewf
 import sys
+from utility.diskorder import disk_order
+from utility.extractor import MANIFEST_HEADERS, Extractor
+from utility.imgpool import ImagePool
+from utility.partpool import partition_jobs, run_jobs
+from utility.tskwalk import walk_fs
 
 """
 MIT License
@@ -39,24 +43,20 @@ __date__ = 20170815
 __description__ = "Utility to extract files from evidence containers"
 
 
-def main(image, img_type, ext, output, part_type):
+def main(image, img_type, ext, output, part_type, workers=1, split=False,
+         window=0, writers=4):
     volume = None
     print("[+] Opening {}".format(image))
-    if img_type == "ewf":
-        try:
-            filenames = pyewf.glob(image)
-        except IOError:
-            _, e, _ = sys.exc_info()
-            print("[-] Invalid EWF format:\n {}".format(e))
-            sys.exit(2)
-
-        ewf_handle = pyewf.handle()
-        ewf_handle.open(filenames)
+    try:
+        # Each consumer of the image gets a handle of its own from the pool
+        pool = ImagePool(image, img_type)
+    except IOError:
+        _, e, _ = sys.exc_info()
+        print("[-] Unable to open image:\n {}".format(e))
+        sys.exit(2)
 
-        # Open PYTSK3 handle on EWF Image
-        img_info = EWFImgInfo(ewf_handle)
-    else:
-        img_info = pytsk3.Img_Info(image)
+    # Open PYTSK3 handle on a pooled image handle with read-ahead
+    img_info = pool.img_info()
 
     try:
         if part_type is not None:
@@ -68,13 +68,30 @@ def main(image, img_type, ext, output, part_type):
         _, e, _ = sys.exc_info()
         print("[-] Unable to read partition table:\n {}".format(e))
 
-    open_fs(volume, img_info, ext, output)
+    open_fs(volume, img_info, ext, output, pool, workers, split, window,
+            writers)
 
 
-def open_fs(vol, img, ext, output):
+def open_fs(vol, img, ext, output, pool=None, workers=1, split=False,
+            window=0, writers=4):
     # Open FS and Recurse
     print("[+] Recursing through files and writing file extension matches "
           "to output directory")
+    manifest = []
+    if pool is not None and workers > 1:
+        # Workers extract whole partitions (or top-level directories) and
+        # list what they wrote, which is printed in job order
+        jobs = partition_jobs(vol, img, split)
+        for paths, rows in run_jobs(pool, jobs, extract_job,
+                                    (ext, output, window, writers),
+                                    workers):
+            for file_path in paths:
+                print("{}".format(file_path))
+            manifest.extend(rows)
+        write_manifest(manifest, output)
+        return
+
+    extractor = Extractor(writers)
     if vol is not None:
         for part in vol:
             if part.len > 2048 and "Unallocated" not in part.desc \
@@ -86,8 +103,11 @@ def open_fs(vol, img, ext, output):
                 except IOError:
                     _, e, _ = sys.exc_info()
                     print("[-] Unable to open FS:\n {}".format(e))
+                    continue
                 root = fs.open_dir(path="/")
-                recurse_files(part.addr, fs, root, [], [""], ext, output)
+                for file_path in recurse_files(part.addr, root, ext, output,
+                                               extractor, window=window):
+                    print("{}".format(file_path))
 
     else:
         try:
@@ -96,79 +116,61 @@ def open_fs(vol, img, ext, output):
             _, e, _ = sys.exc_info()
             print("[-] Unable to open FS:\n {}".format(e))
         root = fs.open_dir(path="/")
-        recurse_files(1, fs, root, [], [""], ext, output)
-
-
-def recurse_files(part, fs, root_dir, dirs, parent, ext, output):
+        for file_path in recurse_files(1, root, ext, output, extractor,
+                                       window=window):
+            print("{}".format(file_path))
+    write_manifest(extractor.close(), output)
+
+
+def extract_job(job, root_dir, descend, path, ext, output, window=0,
+                writers=4):
+    extractor = Extractor(writers)
+    paths = list(recurse_files(job.addr, root_dir, ext, output, extractor,
+                               descend, path, window))
+    return paths, extractor.close()
+
+
+def recurse_files(part, root_dir, ext, output, extractor, descend=None,
+                  path="", window=0):
+    targets = list_targets(root_dir, ext, descend, path)
+    if window:
+        targets = disk_order(targets, window)
+    for fs_object, (file_name, file_ext, file_path) in targets:
+        yield file_path
+        extractor.extract(fs_object, part, file_path,
+                          output_path(output, file_name, file_ext,
+                                      file_path, part,
+                                      fs_object.info.meta.addr))
+
+
+def list_targets(root_dir, ext, descend=None, path=""):
     extensions = [x.strip().lower() for x in ext.split(',')]
-    dirs.append(root_dir.info.fs_file.meta.addr)
-    for fs_object in root_dir:
-        # Skip ".", ".." or directory entries without a name.
-        if not hasattr(fs_object, "info") or \
-                not hasattr(fs_object.info, "name") or \
-                not hasattr(fs_object.info.name, "name") or \
-                fs_object.info.name.name in [".", ".."]:
+    for file_name, file_path, fs_object, is_dir in walk_fs(root_dir, descend,
+                                                           path):
+        if is_dir or "." not in file_name:
             continue
-        try:
-            file_name = fs_object.info.name.name
-            file_path = "{}/{}".format("/".join(parent),
-                                       fs_object.info.name.name)
-            try:
-                if fs_object.info.meta.type == pytsk3.TSK_FS_META_TYPE_DIR:
-                    f_type = "DIR"
-                    file_ext = ""
-                else:
-                    f_type = "FILE"
-                    if "." in file_name:
-                        file_ext = file_name.rsplit(".")[-1].lower()
-                    else:
-                        file_ext = ""
-            except AttributeError:
-                continue
-
-            if file_ext.strip() in extensions:
-                print("{}".format(file_path))
-                file_writer(fs_object, file_name, file_ext, file_path,
-                            output)
-
-            if f_type == "DIR":
-                parent.append(fs_object.info.name.name)
-                sub_directory = fs_object.as_directory()
-                inode = fs_object.info.meta.addr
-                if inode not in dirs:
-                    recurse_files(part, fs, sub_directory, dirs,
-                                  parent, ext, output)
-                    parent.pop(-1)
-
-        except IOError:
-            pass
-    dirs.pop(-1)
-
-
-def file_writer(fs_object, name, ext, path, output):
-    output_dir = os.path.join(output, ext,
-                              os.path.dirname(path.lstrip("//")))
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    with open(os.path.join(output_dir, name), "w") as outfile:
-        outfile.write(fs_object.read_random(0, fs_object.info.meta.size))
+        file_ext = file_name.rsplit(".")[-1].lower()
+        if file_ext.strip() in extensions:
+            yield fs_object, (file_name, file_ext, file_path)
 
 
-class EWFImgInfo(pytsk3.Img_Info):
-        def __init__(self, ewf_handle):
-            self._ewf_handle = ewf_handle
-            super(EWFImgInfo, self).__init__(
-                url="", type=pytsk3.TSK_IMG_TYPE_EXTERNAL)
+def output_path(output, name, ext, path, part, inode):
+    # A deleted and a live file, or one path in two partitions, can share
+    # a name; prefixing the partition and inode gives each its own output
+    # file however the writers and worker processes are interleaved
+    return os.path.join(output, ext, os.path.dirname(path.lstrip("//")),
+                        "{}_{}_{}".format(part, inode, name))
 
-        def close(self):
-            self._ewf_handle.close()
 
-        def read(self, offset, size):
-            self._ewf_handle.seek(offset)
-            return self._ewf_handle.read(size)
-
-        def get_size(self):
-            return self._ewf_handle.get_media_size()
+def write_manifest(rows, output):
+    # One MD5/SHA-256 record per exported file, in extraction order
+    manifest = os.path.join(output, "extraction_manifest.csv")
+    print("[+] Writing manifest of {} files to {}".format(len(rows),
+                                                          manifest))
+    with open(manifest, "wb") as csvfile:
+        csv_writer = csv.writer(csvfile)
+        csv_writer.writerow(MANIFEST_HEADERS)
+        csv_writer.writerows(rows)
 
 
 if __name__ == '__main__':
@@ -185,15 +187,36 @@ if __name__ == '__main__':
     parser.add_argument("OUTPUT_DIR", help="Output Directory")
     parser.add_argument("-p", help="Partition Type",
                         choices=("DOS", "GPT", "MAC", "SUN"))
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="Extract from partitions in N worker processes "
+                             "(default: 1)")
+    parser.add_argument("--split", action="store_true",
+                        help="With --workers, also give each top-level "
+                             "directory a worker job of its own")
+    parser.add_argument("-o", "--disk-order", type=int, nargs="?",
+                        const=10000, default=0, metavar="WINDOW",
+                        help="Read files in physical disk order, sorting "
+                             "WINDOW files at a time (default: 10000)")
+    parser.add_argument("--writers", type=int, default=4,
+                        help="Threads hashing and writing extracted files "
+                             "(default: 4)")
     args = parser.parse_args()
 
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.disk_order < 0:
+        parser.error("--disk-order window cannot be negative")
+    if args.writers < 1:
+        parser.error("--writers must be at least 1")
+
     if not os.path.exists(args.OUTPUT_DIR):
         os.makedirs(args.OUTPUT_DIR)
 
     if os.path.exists(args.EVIDENCE_FILE) and \
             os.path.isfile(args.EVIDENCE_FILE):
         main(args.EVIDENCE_FILE, args.TYPE, args.EXT, args.OUTPUT_DIR,
-             args.p)
+             args.p, args.workers, args.split, args.disk_order,
+             args.writers)
     else:
         print("[-] Supplied input file {} does not exist or is not a "
               "file".format(args.EVIDENCE_FILE))
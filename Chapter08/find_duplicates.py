@@ -0,0 +1,238 @@
+from __future__ import print_function
+import argparse
+import csv
+import hashlib
+import os
+import pytsk3
+import sys
+from utility.imgpool import ImagePool
+from utility.partpool import partition_jobs
+from utility.tskstream import iter_extents
+from utility.tskwalk import walk_fs
+
+"""
+MIT License
+
+Copyright (c) 2017 Chapin Bryce, Preston Miller
+
+Please share comments and questions at:
+    https://github.com/PythonForensics/PythonForensicsCookbook
+    or email pyforcookbook@gmail.com
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+__authors__ = ["Chapin Bryce", "Preston Miller"]
+__date__ = 20170815
+__description__ = "Utility to find duplicate files within an evidence " \
+                  "container"
+
+EDGE_SIZE = 64 * 1024
+
+
+def main(image, img_type, output, part_type, algorithm="sha256",
+         min_size=1):
+    volume = None
+    print("[+] Opening {}".format(image))
+    try:
+        pool = ImagePool(image, img_type)
+    except IOError:
+        _, e, _ = sys.exc_info()
+        print("[-] Unable to open image:\n {}".format(e))
+        sys.exit(2)
+
+    # Open PYTSK3 handle on a pooled image handle with read-ahead
+    img_info = pool.img_info()
+
+    try:
+        if part_type is not None:
+            attr_id = getattr(pytsk3, "TSK_VS_TYPE_" + part_type)
+            volume = pytsk3.Volume_Info(img_info, attr_id)
+        else:
+            volume = pytsk3.Volume_Info(img_info)
+    except IOError:
+        _, e, _ = sys.exc_info()
+        print("[-] Unable to read partition table:\n {}".format(e))
+
+    filesystems = {}
+    for job in partition_jobs(volume, img_info):
+        filesystems[job.fs_index] = (
+            job.addr, pytsk3.FS_Info(img_info, offset=job.offset))
+
+    stats = {"files": 0, "bytes": 0, "read": [0, 0, 0]}
+    print("[+] Stage 1: grouping files by size")
+    groups = group_by_size(filesystems, min_size, stats)
+    print("[+] Stage 2: hashing the first and last {} KiB of {} "
+          "files".format(EDGE_SIZE // 1024, count_files(groups)))
+    groups = split_groups(groups, filesystems, algorithm, edge_digest,
+                          stats, 1)
+    print("[+] Stage 3: fully hashing {} files".format(count_files(
+        [group for group in groups if group[0][0] > 2 * EDGE_SIZE])))
+    groups = split_groups(groups, filesystems, algorithm, full_digest,
+                          stats, 2)
+    write_report(groups, filesystems, output)
+    print_summary(groups, stats)
+
+
+def group_by_size(filesystems, min_size, stats):
+    # Only sizes shared by two or more files can hold duplicates; the
+    # entries are (fs_index, inode, path) so no TSK objects are kept open.
+    # Hard links are one file, so only the first path to an inode counts.
+    sizes = {}
+    seen = set()
+    for fs_index in sorted(filesystems):
+        part, fs = filesystems[fs_index]
+        for file_name, file_path, fs_object, is_dir in walk_fs(
+                fs.open_dir(path="/")):
+            if is_dir:
+                continue
+            meta = fs_object.info.meta
+            if (fs_index, meta.addr) in seen:
+                continue
+            seen.add((fs_index, meta.addr))
+            size = getattr(meta, "size", 0) or 0
+            stats["files"] += 1
+            stats["bytes"] += size
+            if size < min_size:
+                continue
+            sizes.setdefault(size, []).append(
+                (fs_index, meta.addr, file_path))
+    return [((size,), files) for size, files in sorted(sizes.items())
+            if len(files) > 1]
+
+
+def split_groups(groups, filesystems, algorithm, digest, stats, stage):
+    """Refine each group by a digest and keep the sub-groups of two or more
+
+    Files up to twice EDGE_SIZE were hashed whole by the edge digest, so
+    the full digest passes their groups through without reading again.
+    """
+    refined = []
+    for key, files in groups:
+        if stage == 2 and key[0] <= 2 * EDGE_SIZE:
+            refined.append((key, files))
+            continue
+        digests = {}
+        for entry in files:
+            fs_index, inode, file_path = entry
+            try:
+                fs_object = filesystems[fs_index][1].open_meta(inode=inode)
+                value, read = digest(fs_object, key[0], algorithm)
+            except IOError:
+                continue
+            stats["read"][stage] += read
+            digests.setdefault(value, []).append(entry)
+        for value, matched in sorted(digests.items()):
+            if len(matched) > 1:
+                refined.append((key[:1] + (value,), matched))
+    return refined
+
+
+def edge_digest(fs_object, size, algorithm):
+    hash_obj = hashlib.new(algorithm)
+    if size <= 2 * EDGE_SIZE:
+        data = fs_object.read_random(0, size)
+        hash_obj.update(data)
+        return hash_obj.hexdigest(), len(data)
+    head = fs_object.read_random(0, EDGE_SIZE)
+    tail = fs_object.read_random(size - EDGE_SIZE, EDGE_SIZE)
+    hash_obj.update(head)
+    hash_obj.update(tail)
+    return hash_obj.hexdigest(), len(head) + len(tail)
+
+
+def full_digest(fs_object, size, algorithm):
+    hash_obj = hashlib.new(algorithm)
+    read = 0
+    for chunk, sparse in iter_extents(fs_object):
+        hash_obj.update(chunk)
+        if not sparse:
+            read += len(chunk)
+    return hash_obj.hexdigest(), read
+
+
+def count_files(groups):
+    return sum(len(files) for _, files in groups)
+
+
+def write_report(groups, filesystems, output):
+    print("[+] Writing output to {}".format(output))
+    with open(output, "wb") as csvfile:
+        csv_writer = csv.writer(csvfile)
+        csv_writer.writerow(["Set", "Size", "Hash", "Partition", "Inode",
+                             "File Path"])
+        for set_id, (key, files) in enumerate(groups, 1):
+            size, value = key
+            for fs_index, inode, file_path in files:
+                csv_writer.writerow([
+                    set_id, size, value,
+                    "PARTITION {}".format(filesystems[fs_index][0]), inode,
+                    file_path])
+
+
+def print_summary(groups, stats):
+    duplicates = count_files(groups) - len(groups)
+    wasted = sum(key[0] * (len(files) - 1) for key, files in groups)
+    read = sum(stats["read"])
+    print("[+] {:,} files, {:,} bytes scanned".format(stats["files"],
+                                                    stats["bytes"]))
+    print("[+] {:,} duplicate sets holding {:,} redundant copies "
+          "({:,} bytes)".format(len(groups), duplicates, wasted))
+    print("[+] Bytes read: {:,} for edge hashes, {:,} for full hashes, "
+          "{:,} in total".format(stats["read"][1], stats["read"][2], read))
+    if stats["bytes"]:
+        print("[+] Hashing every file would have read {:,} bytes; {:.2%} "
+              "of that was needed".format(stats["bytes"],
+                                          float(read) / stats["bytes"]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=__description__,
+        epilog="Developed by {} on {}".format(
+            ", ".join(__authors__), __date__)
+    )
+    parser.add_argument("EVIDENCE_FILE", help="Evidence file path")
+    parser.add_argument("TYPE", help="Type of Evidence",
+                        choices=("raw", "ewf"))
+    parser.add_argument("OUTPUT_CSV", help="Output CSV of duplicate sets")
+    parser.add_argument("-p", help="Partition Type",
+                        choices=("DOS", "GPT", "MAC", "SUN"))
+    parser.add_argument("-a", "--algorithm", default="sha256",
+                        choices=("md5", "sha1", "sha256"),
+                        help="Hash algorithm (default: sha256)")
+    parser.add_argument("-m", "--min-size", type=int, default=1,
+                        help="Ignore files smaller than N bytes "
+                             "(default: 1)")
+    args = parser.parse_args()
+
+    if args.min_size < 1:
+        parser.error("--min-size must be at least 1")
+
+    directory = os.path.dirname(args.OUTPUT_CSV)
+    if not os.path.exists(directory) and directory != "":
+        os.makedirs(directory)
+
+    if os.path.exists(args.EVIDENCE_FILE) and \
+            os.path.isfile(args.EVIDENCE_FILE):
+        main(args.EVIDENCE_FILE, args.TYPE, args.OUTPUT_CSV, args.p,
+             args.algorithm, args.min_size)
+    else:
+        print("[-] Supplied input file {} does not exist or is not a "
+              "file".format(args.EVIDENCE_FILE))
+        sys.exit(1)
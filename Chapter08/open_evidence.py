@@ -5,6 +5,8 @@ import pytsk3
 import pyewf
 import sys
 from tabulate import tabulate
+from utility.ewfimg import EWFImgInfo
+from utility.rawimg import MmapImgInfo
 
 """
 MIT License
@@ -39,23 +41,6 @@ __date__ = 20170815
 __description__ = "Utility to gather open evidence containers"
 
 
-class EWFImgInfo(pytsk3.Img_Info):
-    def __init__(self, ewf_handle):
-        self._ewf_handle = ewf_handle
-        super(EWFImgInfo, self).__init__(url="",
-                                         type=pytsk3.TSK_IMG_TYPE_EXTERNAL)
-
-    def close(self):
-        self._ewf_handle.close()
-
-    def read(self, offset, size):
-        self._ewf_handle.seek(offset)
-        return self._ewf_handle.read(size)
-
-    def get_size(self):
-        return self._ewf_handle.get_media_size()
-
-
 def main(image, img_type, offset):
     print("[+] Opening {}".format(image))
     if img_type == "ewf":
@@ -70,7 +55,7 @@ def main(image, img_type, offset):
         # Open PYTSK3 handle on EWF Image
         img_info = EWFImgInfo(ewf_handle)
     else:
-        img_info = pytsk3.Img_Info(image)
+        img_info = MmapImgInfo(image)
 
     # Get Filesystem Handle
     try:
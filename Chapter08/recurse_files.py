@@ -4,8 +4,12 @@ import csv
 from datetime import datetime
 import os
 import pytsk3
-import pyewf
 import sys
+from utility.imgpool import ImagePool
+from utility.fsindex import FSIndex, image_fingerprint
+from utility.mftparse import list_files
+from utility.partpool import partition_jobs, run_jobs
+from utility.tskwalk import walk_fs
 
 """
 MIT License
@@ -40,24 +44,20 @@ __date__ = 20170815
 __description__ = "Utility to iterate over files in an evidence containers"
 
 
-def main(image, img_type, output, part_type):
+def main(image, img_type, output, part_type, index_path=None,
+         flush_every=1000, workers=1, split=False, mft=False):
     volume = None
     print("[+] Opening {}".format(image))
-    if img_type == "ewf":
-        try:
-            filenames = pyewf.glob(image)
-        except IOError:
-            _, e, _ = sys.exc_info()
-            print("[-] Invalid EWF format:\n {}".format(e))
-            sys.exit(2)
-
-        ewf_handle = pyewf.handle()
-        ewf_handle.open(filenames)
+    try:
+        # Each consumer of the image gets a handle of its own from the pool
+        pool = ImagePool(image, img_type)
+    except IOError:
+        _, e, _ = sys.exc_info()
+        print("[-] Unable to open image:\n {}".format(e))
+        sys.exit(2)
 
-        # Open PYTSK3 handle on EWF Image
-        img_info = EWFImgInfo(ewf_handle)
-    else:
-        img_info = pytsk3.Img_Info(image)
+    # Open PYTSK3 handle on a pooled image handle with read-ahead
+    img_info = pool.img_info()
 
     try:
         if part_type is not None:
@@ -69,14 +69,64 @@ def main(image, img_type, output, part_type):
         _, e, _ = sys.exc_info()
         print("[-] Unable to read partition table:\n {}".format(e))
 
-    open_fs(volume, img_info, output)
+    open_fs(volume, img_info, output, index_path, flush_every, pool,
+            workers, split, mft)
+
+
+def open_fs(vol, img, output, index_path=None, flush_every=1000, pool=None,
+            workers=1, split=False, mft=False):
+    index = None
+    if index_path is not None:
+        index = FSIndex(index_path)
+        fingerprint = image_fingerprint(img)
+        if index.is_current(fingerprint):
+            print("[+] Reading file listing from index {}".format(
+                index_path))
+            write_csv(index_rows(index), output, flush_every)
+            index.close()
+            return
+        print("[+] Building index {}".format(index_path))
+        index.reset(fingerprint)
 
-
-def open_fs(vol, img, output):
     print("[+] Recursing through files..")
-    recursed_data = []
+    # Rows stream from the walk straight into the CSV writer, so memory
+    # stays bounded and output appears as soon as the image is opened
+    if pool is not None and workers > 1:
+        records = parallel_records(vol, img, pool, workers, split)
+    else:
+        records = walk_partitions(vol, img, mft)
+    write_csv(index_records(records, index), output, flush_every)
+
+
+def parallel_records(vol, img, pool, workers, split=False):
+    # Each partition, or top-level directory with split, is walked by a
+    # worker process; its records come back in walk order
+    jobs = partition_jobs(vol, img, split)
+    for records in run_jobs(pool, jobs, list_records, workers=workers):
+        for record in records:
+            yield record
+
+
+def list_records(job, root_dir, descend, path):
+    return list(recurse_files(job.addr, root_dir, job.fs_index, descend,
+                              path))
+
+
+def index_records(records, index=None):
+    for record in records:
+        if index is not None:
+            index.add(*record)
+        yield format_row(record)
+
+    if index is not None:
+        index.finish()
+        index.close()
+
+
+def walk_partitions(vol, img, mft=False):
     # Open FS and Recurse
     if vol is not None:
+        fs_index = 0
         for part in vol:
             if part.len > 2048 and "Unallocated" not in part.desc and \
                     "Extended" not in part.desc and \
@@ -87,9 +137,10 @@ def open_fs(vol, img, output):
                 except IOError:
                     _, e, _ = sys.exc_info()
                     print("[-] Unable to open FS:\n {}".format(e))
-                root = fs.open_dir(path="/")
-                data = recurse_files(part.addr, fs, root, [], [], [""])
-                recursed_data.append(data)
+                    continue
+                for record in partition_records(part.addr, fs, fs_index, mft):
+                    yield record
+                fs_index += 1
 
     else:
         try:
@@ -97,65 +148,63 @@ def open_fs(vol, img, output):
         except IOError:
             _, e, _ = sys.exc_info()
             print("[-] Unable to open FS:\n {}".format(e))
-        root = fs.open_dir(path="/")
-        data = recurse_files(1, fs, root, [], [], [""])
-        recursed_data.append(data)
-    write_csv(recursed_data, output)
-
-
-def recurse_files(part, fs, root_dir, dirs, data, parent):
-    dirs.append(root_dir.info.fs_file.meta.addr)
-    for fs_object in root_dir:
-        # Skip ".", ".." or directory entries without a name.
-        if not hasattr(fs_object, "info") or \
-                not hasattr(fs_object.info, "name") or \
-                not hasattr(fs_object.info.name, "name") or \
-                fs_object.info.name.name in [".", ".."]:
-            continue
-        try:
-            file_name = fs_object.info.name.name
-            file_path = "{}/{}".format(
-                "/".join(parent), fs_object.info.name.name)
-            try:
-                if fs_object.info.meta.type == pytsk3.TSK_FS_META_TYPE_DIR:
-                    f_type = "DIR"
-                    file_ext = ""
-                else:
-                    f_type = "FILE"
-                    if "." in file_name:
-                        file_ext = file_name.rsplit(".")[-1].lower()
-                    else:
-                        file_ext = ""
-            except AttributeError:
-                continue
-
-            size = fs_object.info.meta.size
-            create = convert_time(fs_object.info.meta.crtime)
-            change = convert_time(fs_object.info.meta.ctime)
-            modify = convert_time(fs_object.info.meta.mtime)
-            data.append(["PARTITION {}".format(part), file_name, file_ext,
-                         f_type, create, change, modify, size, file_path])
-
-            if f_type == "DIR":
-                parent.append(fs_object.info.name.name)
-                sub_directory = fs_object.as_directory()
-                inode = fs_object.info.meta.addr
-
-                # This ensures that we don't recurse into a directory
-                # above the current level and thus avoid circular loops.
-                if inode not in dirs:
-                    recurse_files(part, fs, sub_directory, dirs, data,
-                                  parent)
-                parent.pop(-1)
+        for record in partition_records(1, fs, 0, mft):
+            yield record
 
-        except IOError:
-            pass
-    dirs.pop(-1)
-    return data
+
+def partition_records(part, fs, fs_index=0, mft=False):
+    if mft and fs.info.ftype == pytsk3.TSK_FS_TYPE_NTFS:
+        return mft_records(part, fs, fs_index)
+    return recurse_files(part, fs.open_dir(path="/"), fs_index)
+
+
+def index_rows(index):
+    for record in index.rows():
+        yield format_row(record)
+
+
+def format_row(record):
+    fs_index, part, inode, file_name, file_ext, f_type, file_path, \
+        size, crtime, ctime, mtime, atime = record
+    return ["PARTITION {}".format(part), file_name, file_ext, f_type,
+            convert_time(crtime), convert_time(ctime),
+            convert_time(mtime), size, file_path]
+
+
+def recurse_files(part, root_dir, fs_index=0, descend=None, path=""):
+    # Records carry the raw metadata in FSIndex column order, so they can
+    # cross a process boundary and feed the index before formatting
+    for file_name, file_path, fs_object, is_dir in walk_fs(root_dir, descend,
+                                                           path):
+        f_type, file_ext = file_type(file_name, is_dir)
+        meta = fs_object.info.meta
+        yield (fs_index, part, meta.addr, file_name, file_ext, f_type,
+               file_path, meta.size, meta.crtime, meta.ctime, meta.mtime,
+               meta.atime)
+
+
+def mft_records(part, fs, fs_index=0):
+    # NTFS fast path: $MFT is read front to back instead of following
+    # directories across the volume, so records come in MFT order
+    for inode, file_name, file_path, is_dir, size, crtime, ctime, mtime, \
+            atime in list_files(fs):
+        f_type, file_ext = file_type(file_name, is_dir)
+        yield (fs_index, part, inode, file_name, file_ext, f_type,
+               file_path, size, crtime, ctime, mtime, atime)
 
 
-def write_csv(data, output):
-    if data == []:
+def file_type(file_name, is_dir):
+    if is_dir:
+        return "DIR", ""
+    if "." in file_name:
+        return "FILE", file_name.rsplit(".")[-1].lower()
+    return "FILE", ""
+
+
+def write_csv(rows, output, flush_every=1000):
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
         print("[-] No output results to write")
         sys.exit(3)
 
@@ -166,8 +215,11 @@ def write_csv(data, output):
                    "Create Date", "Modify Date", "Change Date", "Size",
                    "File Path"]
         csv_writer.writerow(headers)
-        for result_list in data:
-            csv_writer.writerows(result_list)
+        csv_writer.writerow(first)
+        for count, row in enumerate(rows, 2):
+            csv_writer.writerow(row)
+            if count % flush_every == 0:
+                csvfile.flush()
 
 
 def convert_time(ts):
@@ -176,23 +228,6 @@ def convert_time(ts):
     return datetime.utcfromtimestamp(ts)
 
 
-class EWFImgInfo(pytsk3.Img_Info):
-    def __init__(self, ewf_handle):
-        self._ewf_handle = ewf_handle
-        super(EWFImgInfo, self).__init__(url="",
-                                         type=pytsk3.TSK_IMG_TYPE_EXTERNAL)
-
-    def close(self):
-        self._ewf_handle.close()
-
-    def read(self, offset, size):
-        self._ewf_handle.seek(offset)
-        return self._ewf_handle.read(size)
-
-    def get_size(self):
-        return self._ewf_handle.get_media_size()
-
-
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
         description=__description__,
@@ -205,14 +240,40 @@ if __name__ == '__main__':
     parser.add_argument("OUTPUT_CSV", help="Output CSV with lookup results")
     parser.add_argument("-p", help="Partition Type",
                         choices=("DOS", "GPT", "MAC", "SUN"))
+    parser.add_argument("-i", "--index", nargs="?", const="",
+                        help="Reuse, or build, a SQLite file listing "
+                             "index of the image (default path: "
+                             "EVIDENCE_FILE.fsidx)")
+    parser.add_argument("--flush", type=int, default=1000,
+                        help="Flush the CSV every N rows (default: 1000)")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="Walk partitions in N worker processes "
+                             "(default: 1)")
+    parser.add_argument("--split", action="store_true",
+                        help="With --workers, also give each top-level "
+                             "directory a worker job of its own")
+    parser.add_argument("--mft", action="store_true",
+                        help="List NTFS volumes by reading $MFT "
+                             "sequentially instead of walking directories")
     args = parser.parse_args()
 
+    if args.flush < 1:
+        parser.error("--flush must be at least 1")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.mft and args.workers > 1:
+        parser.error("--mft reads each volume in one pass; drop --workers")
+
+    if args.index == "":
+        args.index = args.EVIDENCE_FILE + ".fsidx"
+
     directory = os.path.dirname(args.OUTPUT_CSV)
     if not os.path.exists(directory) and directory != "":
         os.makedirs(directory)
 
     if os.path.exists(args.EVIDENCE_FILE) and os.path.isfile(args.EVIDENCE_FILE):
-        main(args.EVIDENCE_FILE, args.TYPE, args.OUTPUT_CSV, args.p)
+        main(args.EVIDENCE_FILE, args.TYPE, args.OUTPUT_CSV, args.p,
+             args.index, args.flush, args.workers, args.split, args.mft)
     else:
         print("[-] Supplied input file {} does not exist or is not a "
               "file".format(args.EVIDENCE_FILE))
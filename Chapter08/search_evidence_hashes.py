@@ -4,9 +4,14 @@ import csv
 import hashlib
 import os
 import pytsk3
-import pyewf
 import sys
 from tqdm import tqdm
+from utility.imgpool import ImagePool
+from utility.partpool import partition_jobs, run_jobs
+from utility.diskorder import disk_order
+from utility.hashindex import open_index
+from utility.tskstream import iter_content
+from utility.tskwalk import walk_fs
 
 """
 MIT License
@@ -41,25 +46,21 @@ __date__ = 20170815
 __description__ = "Utility to hash files within an evidence containers"
 
 
-def main(image, img_type, hashes, part_type, pbar_total=0):
+def main(image, img_type, hashes, part_type, pbar_total=0, workers=1,
+         split=False, window=0):
     hash_list, hash_type = read_hashes(hashes)
     volume = None
     print("[+] Opening {}".format(image))
-    if img_type == "ewf":
-        try:
-            filenames = pyewf.glob(image)
-        except IOError:
-            _, e, _ = sys.exc_info()
-            print("[-] Invalid EWF format:\n {}".format(e))
-            sys.exit(2)
-
-        ewf_handle = pyewf.handle()
-        ewf_handle.open(filenames)
+    try:
+        # Each consumer of the image gets a handle of its own from the pool
+        pool = ImagePool(image, img_type)
+    except IOError:
+        _, e, _ = sys.exc_info()
+        print("[-] Unable to open image:\n {}".format(e))
+        sys.exit(2)
 
-        # Open PYTSK3 handle on EWF Image
-        img_info = EWFImgInfo(ewf_handle)
-    else:
-        img_info = pytsk3.Img_Info(image)
+    # Open PYTSK3 handle on a pooled image handle with read-ahead
+    img_info = pool.img_info()
 
     try:
         if part_type is not None:
@@ -71,35 +72,43 @@ def main(image, img_type, hashes, part_type, pbar_total=0):
         _, e, _ = sys.exc_info()
         print("[-] Unable to read partition table:\n {}".format(e))
 
-    open_fs(volume, img_info, hash_list, hash_type, pbar_total)
+    open_fs(volume, img_info, hash_list, hash_type, pbar_total, pool,
+            workers, split, window)
 
 
 def read_hashes(hashes):
-    hash_list = []
-    hash_type = None
-    with open(hashes) as infile:
-        for line in infile:
-            if hash_type is None:
-                if len(line.strip()) == 32:
-                    hash_type = "md5"
-                elif len(line.strip()) == 40:
-                    hash_type == "sha1"
-                elif len(line.strip()) == 64:
-                    hash_type == "sha256"
-            hash_list.append(line.strip().lower())
-    if hash_type is None:
+    # The hash list is converted once into a sorted, memory-mapped index
+    # next to it; later runs map the existing index instantly
+    hash_index = open_index(hashes)
+    if len(hash_index) == 0 or hash_index.hash_type is None:
         print("[-] No valid hashes identified in {}".format(hashes))
         sys.exit(3)
 
-    return hash_list, hash_type
+    print("[+] Loaded {} {} hashes".format(len(hash_index),
+                                          hash_index.hash_type))
+    if hash_index.size_count:
+        print("[+] Only files of {} listed sizes will be read".format(
+            hash_index.size_count))
+    return hash_index, hash_index.hash_type
 
 
-def open_fs(vol, img, hashes, hash_type, pbar_total=0):
+def open_fs(vol, img, hashes, hash_type, pbar_total=0, pool=None,
+            workers=1, split=False, window=0):
     # Open FS and Recurse
     print("[+] Recursing through and hashing files")
     pbar = tqdm(desc="Hashing", unit=" files",
                 unit_scale=True, total=pbar_total)
-    if vol is not None:
+    if pool is not None and workers > 1:
+        # Workers hash whole partitions (or top-level directories) and
+        # report back in job order; matches print once a job completes
+        jobs = partition_jobs(vol, img, split)
+        for count, matches in run_jobs(pool, jobs, hash_job,
+                                       (hashes, hash_type, window),
+                                       workers):
+            pbar.update(count)
+            for path, digest in matches:
+                pbar.write("[*] MATCH: {}\n{}".format(path, digest))
+    elif vol is not None:
         for part in vol:
             if part.len > 2048 and "Unallocated" not in part.desc and \
                     "Extended" not in part.desc and \
@@ -110,9 +119,10 @@ def open_fs(vol, img, hashes, hash_type, pbar_total=0):
                 except IOError:
                     _, e, _ = sys.exc_info()
                     print("[-] Unable to open FS:\n {}".format(e))
+                    continue
                 root = fs.open_dir(path="/")
-                recurse_files(part.addr, fs, root, [], [""], hashes,
-                              hash_type, pbar)
+                recurse_files(part.addr, root, hashes, hash_type, pbar,
+                              window=window)
 
     else:
         try:
@@ -121,75 +131,71 @@ def open_fs(vol, img, hashes, hash_type, pbar_total=0):
             _, e, _ = sys.exc_info()
             print("[-] Unable to open FS:\n {}".format(e))
         root = fs.open_dir(path="/")
-        recurse_files(1, fs, root, [], [""], hashes, hash_type, pbar)
+        recurse_files(1, root, hashes, hash_type, pbar, window=window)
     pbar.close()
 
 
-def recurse_files(part, fs, root_dir, dirs, parent, hashes,
-                  hash_type, pbar):
-    dirs.append(root_dir.info.fs_file.meta.addr)
-    for fs_object in root_dir:
-        # Skip ".", ".." or directory entries without a name.
-        if not hasattr(fs_object, "info") or \
-                not hasattr(fs_object.info, "name") or \
-                not hasattr(fs_object.info.name, "name") or \
-                fs_object.info.name.name in [".", ".."]:
-            continue
-        try:
-            file_path = "{}/{}".format("/".join(parent),
-                                       fs_object.info.name.name)
-            if getattr(fs_object.info.meta, "type", None) == \
-                    pytsk3.TSK_FS_META_TYPE_DIR:
-                parent.append(fs_object.info.name.name)
-                sub_directory = fs_object.as_directory()
-                inode = fs_object.info.meta.addr
-
-                # This ensures that we don't recurse into a directory
-                # above the current level and thus avoid circular loops.
-                if inode not in dirs:
-                    recurse_files(part, fs, sub_directory, dirs,
-                                  parent, hashes, hash_type, pbar)
-                    parent.pop(-1)
-            else:
-                hash_file(fs_object, file_path, hashes, hash_type, pbar)
+def hash_job(job, root_dir, descend, path, hashes, hash_type, window=0):
+    matches = []
+    count = recurse_files(job.addr, root_dir, hashes, hash_type, None,
+                          descend, path, matches, window)
+    return count, matches
+
 
+def recurse_files(part, root_dir, hashes, hash_type, pbar, descend=None,
+                  path="", matches=None, window=0):
+    seen = [0]
+    targets = list_targets(root_dir, hashes, pbar, seen, descend, path)
+    if window:
+        targets = disk_order(targets, window)
+    for fs_object, file_path in targets:
+        try:
+            hash_file(fs_object, file_path, hashes, hash_type, pbar,
+                      matches)
         except IOError:
             pass
-    dirs.pop(-1)
+    return seen[0]
 
 
-def hash_file(fs_object, path, hashes, hash_type, pbar):
+def list_targets(root_dir, hashes, pbar=None, seen=None, descend=None,
+                 path=""):
+    for file_name, file_path, fs_object, is_dir in walk_fs(root_dir, descend,
+                                                           path):
+        if is_dir:
+            continue
+        if seen is not None:
+            seen[0] += 1
+        # A file whose size is in no hash,size entry cannot match, so it
+        # is counted but never read
+        if hashes.has_size(getattr(fs_object.info.meta, "size", 0) or 0):
+            yield fs_object, file_path
+        elif pbar is not None:
+            pbar.update()
+
+
+def hash_file(fs_object, path, hashes, hash_type, pbar, matches=None):
     if hash_type == "md5":
         hash_obj = hashlib.md5()
     elif hash_type == "sha1":
         hash_obj = hashlib.sha1()
     elif hash_type == "sha256":
         hash_obj = hashlib.sha256()
-    f_size = getattr(fs_object.info.meta, "size", 0)
-    pbar.set_postfix(File_Size="{:.2f}MB".format(f_size / 1024.0 / 1024))
-    hash_obj.update(fs_object.read_random(0, f_size))
-    hash_digest = hash_obj.hexdigest()
-    pbar.update()
-
-    if hash_digest in hashes:
-        pbar.write("[*] MATCH: {}\n{}".format(path, hash_digest))
-
+    if pbar is not None:
+        f_size = getattr(fs_object.info.meta, "size", 0)
+        pbar.set_postfix(
+            File_Size="{:.2f}MB".format(f_size / 1024.0 / 1024))
+    for chunk in iter_content(fs_object):
+        hash_obj.update(chunk)
+
+    if matches is not None:
+        # Collected by a worker process and reported by the parent
+        if hash_obj.digest() in hashes:
+            matches.append((path, hash_obj.hexdigest()))
+        return
 
-class EWFImgInfo(pytsk3.Img_Info):
-    def __init__(self, ewf_handle):
-        self._ewf_handle = ewf_handle
-        super(EWFImgInfo, self).__init__(
-            url="", type=pytsk3.TSK_IMG_TYPE_EXTERNAL)
-
-    def close(self):
-        self._ewf_handle.close()
-
-    def read(self, offset, size):
-        self._ewf_handle.seek(offset)
-        return self._ewf_handle.read(size)
-
-    def get_size(self):
-        return self._ewf_handle.get_media_size()
+    pbar.update()
+    if hash_obj.digest() in hashes:
+        pbar.write("[*] MATCH: {}\n{}".format(path, hash_obj.hexdigest()))
 
 
 if __name__ == '__main__':
@@ -203,18 +209,36 @@ if __name__ == '__main__':
                         choices=("raw", "ewf"))
     parser.add_argument("HASH_LIST",
                         help="Filepath to Newline-delimited list of "
-                             "hashes (either MD5, SHA1, or SHA-256)")
+                             "hashes (either MD5, SHA1, or SHA-256), "
+                             "optionally as hash,size lines, or a hash "
+                             "index built from one")
     parser.add_argument("-p", help="Partition Type",
                         choices=("DOS", "GPT", "MAC", "SUN"))
     parser.add_argument("-t", type=int,
                         help="Total number of files, for the progress bar")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="Hash partitions in N worker processes "
+                             "(default: 1)")
+    parser.add_argument("--split", action="store_true",
+                        help="With --workers, also give each top-level "
+                             "directory a worker job of its own")
+    parser.add_argument("-o", "--disk-order", type=int, nargs="?",
+                        const=10000, default=0, metavar="WINDOW",
+                        help="Read files in physical disk order, sorting "
+                             "WINDOW files at a time (default: 10000)")
     args = parser.parse_args()
 
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.disk_order < 0:
+        parser.error("--disk-order window cannot be negative")
+
     if os.path.exists(args.EVIDENCE_FILE) and \
             os.path.isfile(args.EVIDENCE_FILE) and \
             os.path.exists(args.HASH_LIST) and \
             os.path.isfile(args.HASH_LIST):
-        main(args.EVIDENCE_FILE, args.TYPE, args.HASH_LIST, args.p, args.t)
+        main(args.EVIDENCE_FILE, args.TYPE, args.HASH_LIST, args.p, args.t,
+             args.workers, args.split, args.disk_order)
     else:
         print("[-] Supplied input file {} does not exist or is not a "
               "file".format(args.EVIDENCE_FILE))
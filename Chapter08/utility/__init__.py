@@ -0,0 +1,11 @@
+from . import hashindex
+from . import tskstream
+from . import fsindex
+from . import tskwalk
+from . import ewfimg
+from . import imgpool
+from . import partpool
+from . import rawimg
+from . import mftparse
+from . import diskorder
+from . import extractor
@@ -0,0 +1,74 @@
+from __future__ import print_function
+from .tskstream import UNMAPPED, data_attribute
+
+"""
+MIT License
+
+Copyright (c) 2017 Chapin Bryce, Preston Miller
+
+Please share comments and questions at:
+    https://github.com/PythonForensics/PythonForensicsCookbook
+    or email pyforcookbook@gmail.com
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+def first_block(fs_object):
+    """Return the first physical block of a file's data, -1 if it has none
+
+    Resident, empty and fully sparse files report -1 so they sort first;
+    their content lives in the metadata TSK has already read.
+    """
+    attr = data_attribute(fs_object)
+    if attr is None:
+        return -1
+    try:
+        for run in attr:
+            if not run.flags & UNMAPPED:
+                return run.addr
+    except IOError:
+        pass
+    return -1
+
+
+def disk_order(entries, window=10000):
+    """Yield (fs_object, item) pairs re-ordered by physical location
+
+    Up to window entries from the traversal are collected at a time with
+    the address of their first data run, then handed on sorted by it, so
+    content reads sweep the volume in one direction instead of seeking
+    back and forth in directory order. The window bounds how many open
+    TSK file objects are held at once.
+    """
+    batch = []
+    for fs_object, item in entries:
+        batch.append((first_block(fs_object), fs_object, item))
+        if len(batch) >= window:
+            for entry in _sorted(batch):
+                yield entry
+            batch = []
+    for entry in _sorted(batch):
+        yield entry
+
+
+def _sorted(batch):
+    batch.sort(key=lambda entry: entry[0])
+    for _, fs_object, item in batch:
+        yield fs_object, item
@@ -0,0 +1,99 @@
+from __future__ import print_function
+from collections import OrderedDict
+import pytsk3
+
+"""
+MIT License
+
+Copyright (c) 2017 Chapin Bryce, Preston Miller
+
+Please share comments and questions at:
+    https://github.com/PythonForensics/PythonForensicsCookbook
+    or email pyforcookbook@gmail.com
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+class BlockCache(object):
+    """Size-bounded LRU cache of aligned blocks read from an image"""
+    def __init__(self, read_block, block_size=32768,
+                 max_bytes=64 * 1024 * 1024):
+        self._read_block = read_block
+        self.block_size = block_size
+        self.max_blocks = max(1, max_bytes // block_size)
+        self.blocks = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def read(self, offset, size):
+        block_size = self.block_size
+        first = offset // block_size
+        last = (offset + size - 1) // block_size
+        pieces = []
+        for block in range(first, last + 1):
+            data = self.blocks.pop(block, None)
+            if data is None:
+                self.misses += 1
+                data = self._read_block(block * block_size, block_size)
+                if len(self.blocks) >= self.max_blocks:
+                    self.blocks.popitem(last=False)
+            else:
+                self.hits += 1
+            # Re-inserting marks the block as most recently used
+            self.blocks[block] = data
+            pieces.append(data)
+
+        start = offset - first * block_size
+        if len(pieces) == 1:
+            return pieces[0][start:start + size]
+        return b"".join(pieces)[start:start + size]
+
+    def clear(self):
+        self.blocks.clear()
+
+
+class EWFImgInfo(pytsk3.Img_Info):
+    """EWF Image Format helper class with an LRU cache of EWF chunks"""
+    def __init__(self, ewf_handle, block_size=32768,
+                 cache_size=64 * 1024 * 1024):
+        self._ewf_handle = ewf_handle
+        # TSK issues many small, overlapping metadata reads. Caching whole
+        # chunk-aligned blocks avoids decompressing the same EWF chunk
+        # over and over; large content reads bypass the cache.
+        self.cache = None
+        if cache_size > 0:
+            self.cache = BlockCache(self._read, block_size, cache_size)
+        super(EWFImgInfo, self).__init__(
+            url="", type=pytsk3.TSK_IMG_TYPE_EXTERNAL)
+
+    def close(self):
+        self._ewf_handle.close()
+
+    def read(self, offset, size):
+        if self.cache is None or size > self.cache.block_size * 4:
+            return self._read(offset, size)
+        return self.cache.read(offset, size)
+
+    def _read(self, offset, size):
+        self._ewf_handle.seek(offset)
+        return self._ewf_handle.read(size)
+
+    def get_size(self):
+        return self._ewf_handle.get_media_size()
@@ -0,0 +1,182 @@
+from __future__ import print_function
+import hashlib
+import os
+import sys
+import threading
+from .tskstream import iter_extents
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+"""
+MIT License
+
+Copyright (c) 2017 Chapin Bryce, Preston Miller
+
+Please share comments and questions at:
+    https://github.com/PythonForensics/PythonForensicsCookbook
+    or email pyforcookbook@gmail.com
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+MANIFEST_HEADERS = ["Partition", "Source Path", "Output Path", "Size",
+                    "MD5", "SHA256", "Error"]
+
+
+class Extractor(object):
+    """Streams TSK file content to writer threads that hash as they write
+
+    The calling thread does all TSK reads, which pytsk3 needs, and queues
+    each file's chunks to one writer thread in order. Writers update MD5
+    and SHA-256 while writing, turn sparse ranges into holes in the
+    output file and record a manifest row per file. Queues are bounded,
+    so memory stays flat however large the files are.
+    """
+    def __init__(self, writers=4, queue_depth=8, chunk_size=1024 * 1024):
+        self.chunk_size = chunk_size
+        self.rows = []
+        self._sequence = 0
+        self._dirs = set()
+        self._lock = threading.Lock()
+        self._queues = [queue.Queue(queue_depth) for _ in range(writers)]
+        self._threads = []
+        for work in self._queues:
+            thread = threading.Thread(target=self._writer, args=(work,))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def extract(self, fs_object, part, source_path, output_path):
+        seq = self._sequence
+        self._sequence += 1
+        work = self._queues[seq % len(self._queues)]
+        self._make_dirs(os.path.dirname(output_path))
+        work.put(("open", seq, (part, source_path, output_path)))
+        try:
+            for chunk, sparse in iter_extents(fs_object, self.chunk_size):
+                # Zero chunks are views of a shared block; only their
+                # length crosses over to the writer
+                work.put(("hole" if sparse else "data", seq,
+                          len(chunk) if sparse else chunk))
+        except IOError:
+            _, e, _ = sys.exc_info()
+            work.put(("fail", seq, str(e)))
+            return
+        work.put(("close", seq, None))
+
+    def close(self):
+        """Wait for the writers and return the manifest rows in order"""
+        for work in self._queues:
+            work.put(None)
+        for thread in self._threads:
+            thread.join()
+        self.rows.sort(key=lambda row: row[0])
+        return [row[1] for row in self.rows]
+
+    def _make_dirs(self, path):
+        # Each output directory is created, or found to exist, only once
+        if path in self._dirs:
+            return
+        if not os.path.isdir(path):
+            try:
+                os.makedirs(path)
+            except OSError:
+                # Another worker process may have just created it
+                if not os.path.isdir(path):
+                    raise
+        self._dirs.add(path)
+
+    @staticmethod
+    def _abandon(outfile):
+        """Close an output file after a failed write; return the error
+
+        The writer keeps hashing and draining the file's chunks up to its
+        close or fail item, as a writer that died on a full or failing
+        disk would leave extract() and close() blocked on its queue.
+        """
+        _, e, _ = sys.exc_info()
+        try:
+            outfile.close()
+        except (IOError, OSError):
+            pass
+        return str(e)
+
+    def _writer(self, work):
+        outfile = None
+        zeros = None
+        while True:
+            item = work.get()
+            if item is None:
+                return
+            action, seq, value = item
+            if action == "open":
+                part, source_path, output_path = value
+                md5 = hashlib.md5()
+                sha256 = hashlib.sha256()
+                size = 0
+                error = ""
+                try:
+                    outfile = open(output_path, "wb")
+                except IOError:
+                    _, e, _ = sys.exc_info()
+                    outfile = None
+                    error = str(e)
+            elif action == "data":
+                md5.update(value)
+                sha256.update(value)
+                size += len(value)
+                if outfile is not None:
+                    try:
+                        outfile.write(value)
+                    except (IOError, OSError):
+                        error, outfile = self._abandon(outfile), None
+            elif action == "hole":
+                if zeros is None or len(zeros) < value:
+                    zeros = bytearray(max(value, self.chunk_size))
+                view = memoryview(zeros)[:value]
+                md5.update(view)
+                sha256.update(view)
+                size += value
+                if outfile is not None:
+                    try:
+                        outfile.seek(value, os.SEEK_CUR)
+                    except (IOError, OSError):
+                        error, outfile = self._abandon(outfile), None
+            else:
+                if action == "fail" and not error:
+                    error = value
+                if outfile is not None:
+                    try:
+                        # Extends the file over a trailing hole as well
+                        outfile.truncate(size)
+                        outfile.close()
+                    except (IOError, OSError):
+                        error = self._abandon(outfile)
+                    outfile = None
+                row = ["PARTITION {}".format(part), source_path,
+                       output_path, size, md5.hexdigest(),
+                       sha256.hexdigest(), error]
+                if error:
+                    row[4:6] = ["", ""]
+                with self._lock:
+                    self.rows.append((seq, row))
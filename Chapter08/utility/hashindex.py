@@ -0,0 +1,288 @@
+from __future__ import print_function
+import binascii
+import bisect
+import heapq
+import math
+import mmap
+import os
+import struct
+import tempfile
+
+"""
+MIT License
+
+Copyright (c) 2017 Chapin Bryce, Preston Miller
+
+Please share comments and questions at:
+    https://github.com/PythonForensics/PythonForensicsCookbook
+    or email pyforcookbook@gmail.com
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+MAGIC = b"PFCIDX02"
+HEADER = struct.Struct("<8sIQQIQ")
+# Version 1 indexes carry no file sizes and are still readable
+LEGACY_MAGIC = b"PFCIDX01"
+LEGACY_HEADER = struct.Struct("<8sIQQI")
+# Sizes are stored big-endian so byte order sorts them numerically
+SIZE = struct.Struct(">Q")
+HASH_TYPES = {16: "md5", 20: "sha1", 32: "sha256"}
+
+
+class HashIndex(object):
+    """Memory-mapped sorted array of binary digests with a Bloom filter
+
+    Indexes built from hash,size lists also hold the sorted set of file
+    sizes in the list, so files of any other size can be ruled out
+    without reading them.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._fh = open(path, "rb")
+        self._map = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic = self._map[:len(MAGIC)]
+        if magic == MAGIC:
+            header = HEADER
+            _, self.digest_size, self.count, bloom_size, self.bloom_k, \
+                self.size_count = HEADER.unpack(self._map[:HEADER.size])
+        elif magic == LEGACY_MAGIC:
+            header = LEGACY_HEADER
+            _, self.digest_size, self.count, bloom_size, self.bloom_k = \
+                LEGACY_HEADER.unpack(self._map[:LEGACY_HEADER.size])
+            self.size_count = 0
+        else:
+            self.close()
+            raise IOError("{} is not a hash index".format(path))
+        self.hash_type = HASH_TYPES.get(self.digest_size)
+        self._bloom_start = header.size
+        self._bloom_bits = bloom_size * 8
+        digests_start = header.size + bloom_size
+        self._digests = _DigestArray(
+            self._map, digests_start, self.digest_size, self.count)
+        self._sizes = _DigestArray(
+            self._map, digests_start + self.digest_size * self.count,
+            SIZE.size, self.size_count)
+
+    def __getstate__(self):
+        # Worker processes remap the index file rather than copy it
+        return self.path
+
+    def __setstate__(self, path):
+        self.__init__(path)
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, digest):
+        if len(digest) == self.digest_size * 2:
+            digest = binascii.unhexlify(digest)
+        if len(digest) != self.digest_size:
+            return False
+        if self._bloom_bits:
+            for bit in bloom_bits(digest, self._bloom_bits, self.bloom_k):
+                byte = self._map[self._bloom_start + (bit >> 3):
+                                 self._bloom_start + (bit >> 3) + 1]
+                if not ord(byte) & (1 << (bit & 7)):
+                    return False
+        i = bisect.bisect_left(self._digests, digest)
+        return i < self.count and self._digests[i] == digest
+
+    def has_size(self, size):
+        """Return False only when no listed file can have this size"""
+        if not self.size_count:
+            return True
+        key = SIZE.pack(size)
+        i = bisect.bisect_left(self._sizes, key)
+        return i < self.size_count and self._sizes[i] == key
+
+    def close(self):
+        self._map.close()
+        self._fh.close()
+
+
+class _DigestArray(object):
+    """Sequence view over fixed-width sorted records for bisect"""
+    def __init__(self, mapped, offset, digest_size, count):
+        self._map = mapped
+        self._offset = offset
+        self._size = digest_size
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        start = self._offset + i * self._size
+        return self._map[start:start + self._size]
+
+
+def bloom_bits(digest, num_bits, k):
+    # Digests are already uniformly distributed, so two 64-bit slices of
+    # the digest drive the double hashing instead of extra hash functions
+    h1, h2 = struct.unpack("<QQ", digest[:16])
+    h2 |= 1
+    return [(h1 + i * h2) % num_bits for i in range(k)]
+
+
+def open_index(hash_list, bits_per_hash=10):
+    """Open hash_list as an index, building <hash_list>.idx when needed"""
+    if is_index(hash_list):
+        return HashIndex(hash_list)
+
+    index_path = hash_list + ".idx"
+    if not os.path.exists(index_path) or \
+            os.path.getmtime(index_path) < os.path.getmtime(hash_list) or \
+            _magic(index_path) != MAGIC:
+        print("[+] Building hash index {}".format(index_path))
+        build_index(hash_list, index_path, bits_per_hash)
+    return HashIndex(index_path)
+
+
+def is_index(path):
+    return _magic(path) in (MAGIC, LEGACY_MAGIC)
+
+
+def _magic(path):
+    with open(path, "rb") as infile:
+        return infile.read(len(MAGIC))
+
+
+def build_index(hash_list, index_path, bits_per_hash=10,
+                run_size=2000000):
+    # External merge sort: sorted runs of run_size digests are spilled to
+    # temporary files so memory stays bounded for very large hash sets.
+    # Sizes from hash,size lines go through the same process; they are
+    # kept only if every hash in the list came with one.
+    digest_size = None
+    runs = []
+    run = []
+    size_runs = []
+    size_run = []
+    sized = True
+    with open(hash_list) as infile:
+        for line in infile:
+            fields = [x.strip().strip('"') for x in line.strip().split(",")]
+            line = fields[0].lower()
+            if line.startswith("#") or len(line) not in (32, 40, 64):
+                continue
+            if digest_size is None:
+                digest_size = len(line) // 2
+            elif len(line) != digest_size * 2:
+                continue
+            try:
+                run.append(binascii.unhexlify(line))
+            except (TypeError, ValueError):
+                continue
+            if len(run) >= run_size:
+                runs.append(_write_run(run))
+                run = []
+            if not sized:
+                continue
+            if len(fields) < 2 or not fields[1].isdigit():
+                sized = False
+                size_run = []
+                continue
+            size_run.append(SIZE.pack(int(fields[1])))
+            if len(size_run) >= run_size:
+                size_runs.append(_write_run(size_run))
+                size_run = []
+    if run:
+        runs.append(_write_run(run))
+    if size_run:
+        size_runs.append(_write_run(size_run))
+    if digest_size is None:
+        digest_size = 16
+
+    index_dir = os.path.dirname(os.path.abspath(index_path))
+    sorted_path, count = _merge_runs(runs, digest_size, index_dir)
+    sizes_path, size_count = _merge_runs(size_runs, SIZE.size, index_dir)
+    if not sized:
+        size_count = 0
+
+    bloom = bytearray()
+    k = 0
+    if bits_per_hash > 0 and count > 0:
+        bloom = bytearray(int(math.ceil(count * bits_per_hash / 8.0)))
+        k = max(1, int(round(bits_per_hash * math.log(2))))
+        with open(sorted_path, "rb") as sorted_file:
+            for digest in _read_run(sorted_file, digest_size):
+                for bit in bloom_bits(digest, len(bloom) * 8, k):
+                    bloom[bit >> 3] |= 1 << (bit & 7)
+
+    try:
+        with open(index_path, "wb") as outfile:
+            outfile.write(HEADER.pack(MAGIC, digest_size, count,
+                                      len(bloom), k, size_count))
+            outfile.write(bytes(bloom))
+            _copy_into(sorted_path, outfile)
+            if size_count:
+                _copy_into(sizes_path, outfile)
+    finally:
+        os.remove(sorted_path)
+        os.remove(sizes_path)
+    return count
+
+
+def _merge_runs(runs, record_size, index_dir):
+    # Merges sorted run files into one de-duplicated temporary file and
+    # returns its path and record count; the runs are removed
+    sorted_fd, sorted_path = tempfile.mkstemp(dir=index_dir)
+    count = 0
+    run_files = [open(path, "rb") for path in runs]
+    try:
+        with os.fdopen(sorted_fd, "wb") as sorted_file:
+            last = None
+            iters = [_read_run(f, record_size) for f in run_files]
+            for record in heapq.merge(*iters):
+                if record != last:
+                    sorted_file.write(record)
+                    count += 1
+                    last = record
+    finally:
+        for run_file in run_files:
+            run_file.close()
+        for path in runs:
+            os.remove(path)
+    return sorted_path, count
+
+
+def _copy_into(path, outfile):
+    with open(path, "rb") as infile:
+        buff = infile.read(1024 * 1024)
+        while buff:
+            outfile.write(buff)
+            buff = infile.read(1024 * 1024)
+
+
+def _write_run(run):
+    run.sort()
+    fd, path = tempfile.mkstemp()
+    with os.fdopen(fd, "wb") as outfile:
+        outfile.write(b"".join(run))
+    return path
+
+
+def _read_run(infile, digest_size):
+    buff_size = digest_size * 65536
+    buff = infile.read(buff_size)
+    while buff:
+        for i in range(0, len(buff), digest_size):
+            yield buff[i:i + digest_size]
+        buff = infile.read(buff_size)
@@ -0,0 +1,186 @@
+from __future__ import print_function
+import pyewf
+import threading
+from .ewfimg import EWFImgInfo
+from .rawimg import MappedImage, MmapImgInfo
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+"""
+MIT License
+
+Copyright (c) 2017 Chapin Bryce, Preston Miller
+
+Please share comments and questions at:
+    https://github.com/PythonForensics/PythonForensicsCookbook
+    or email pyforcookbook@gmail.com
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+class ImagePool(object):
+    """Pool of independently opened handles on one EWF image
+
+    Raw images share a single memory map instead of pooled handles.
+    """
+    def __init__(self, image, img_type, max_handles=4):
+        self.image = image
+        self.img_type = img_type
+        self.max_handles = max(1, max_handles)
+        self._free = queue.Queue()
+        self._lock = threading.Lock()
+        self._handles = []
+        self._mapped = None
+        # Open the image eagerly so a bad one fails right away
+        if self.img_type == "ewf":
+            self.release(self._open())
+        else:
+            self._mapped = MappedImage(self.image)
+
+    def _open(self):
+        handle = pyewf.handle()
+        handle.open(pyewf.glob(self.image))
+        self._handles.append(handle)
+        return handle
+
+    def acquire(self, block=True):
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._handles) < self.max_handles:
+                return self._open()
+        if not block:
+            return None
+        return self._free.get()
+
+    def release(self, handle):
+        self._free.put(handle)
+
+    def img_info(self, readahead=4 * 1024 * 1024, **kwargs):
+        """Return a TSK image backed by a handle of its own from the pool"""
+        if self.img_type != "ewf":
+            return MmapImgInfo(self._mapped)
+        return PooledImgInfo(self, self.acquire(), readahead, **kwargs)
+
+    def close(self):
+        for handle in self._handles:
+            handle.close()
+        self._handles = []
+        if self._mapped is not None:
+            self._mapped.close()
+            self._mapped = None
+
+
+class PooledImgInfo(EWFImgInfo):
+    """EWFImgInfo on a pooled handle that prefetches sequential reads
+
+    A sequential consumer is served from the current read-ahead window
+    while the next window, starting where this one ends, is fetched on
+    a second handle. Each byte is read from the image once.
+    """
+    def __init__(self, pool, handle, readahead=4 * 1024 * 1024, **kwargs):
+        self._pool = pool
+        self.readahead = readahead
+        self._next_offset = None
+        self._buffer = (0, b"")
+        self._prefetch = None
+        super(PooledImgInfo, self).__init__(handle, **kwargs)
+
+    def close(self):
+        # The handle goes back to the pool instead of being closed
+        self._take_prefetch()
+        self._buffer = (0, b"")
+        self._pool.release(self._ewf_handle)
+
+    def read(self, offset, size):
+        if self.cache is not None and size <= self.cache.block_size * 4:
+            return self.cache.read(offset, size)
+
+        data = self._buffered(offset, size)
+        if len(data) < size:
+            data += self._read(offset + len(data), size - len(data))
+
+        # Two back-to-back large reads mark a sequential consumer such as
+        # a hasher or a copy; fetch the window after the current one
+        sequential = offset == self._next_offset
+        self._next_offset = offset + len(data)
+        if sequential and self.readahead and len(data) == size and \
+                self._prefetch is None:
+            start, buffered = self._buffer
+            self._start_prefetch(max(start + len(buffered),
+                                     self._next_offset),
+                                 max(size, self.readahead))
+        return data
+
+    def _buffered(self, offset, size):
+        # Return the leading part of [offset, offset + size) held in the
+        # read-ahead window, moving on to the prefetched window when the
+        # read reaches it
+        parts = []
+        while size:
+            start, data = self._buffer
+            if not start <= offset < start + len(data):
+                if self._prefetch is None or \
+                        self._prefetch[1][0] != offset:
+                    break
+                self._buffer = tuple(self._take_prefetch())
+                if not self._buffer[1]:
+                    break
+                continue
+            part = data[offset - start:offset - start + size]
+            parts.append(part)
+            offset += len(part)
+            size -= len(part)
+        if not parts:
+            # A seek elsewhere; the windows are of no further use
+            self._take_prefetch()
+            self._buffer = (0, b"")
+        return b"".join(parts)
+
+    def _start_prefetch(self, offset, size):
+        handle = self._pool.acquire(block=False)
+        if handle is None:
+            return
+        result = [offset, b""]
+
+        def fetch():
+            try:
+                handle.seek(offset)
+                result[1] = handle.read(size)
+            finally:
+                self._pool.release(handle)
+
+        thread = threading.Thread(target=fetch)
+        thread.daemon = True
+        thread.start()
+        self._prefetch = (thread, result)
+
+    def _take_prefetch(self):
+        if self._prefetch is None:
+            return None
+        thread, result = self._prefetch
+        self._prefetch = None
+        thread.join()
+        return result
@@ -0,0 +1,272 @@
+from __future__ import print_function
+import struct
+import sys
+from .tskstream import TSKFileReader
+
+"""
+MIT License
+
+Copyright (c) 2017 Chapin Bryce, Preston Miller
+
+Please share comments and questions at:
+    https://github.com/PythonForensics/PythonForensicsCookbook
+    or email pyforcookbook@gmail.com
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+ROOT_RECORD = 5
+FILETIME_EPOCH = 116444736000000000
+
+ATTR_STANDARD_INFORMATION = 0x10
+ATTR_ATTRIBUTE_LIST = 0x20
+ATTR_FILE_NAME = 0x30
+ATTR_DATA = 0x80
+ATTR_INDEX_ROOT = 0x90
+ATTR_END = 0xFFFFFFFF
+
+NAMESPACE_DOS = 2
+REF_MASK = 0xFFFFFFFFFFFF
+
+# Marks a parent chain that can never reach the root
+ORPHAN = object()
+
+
+class MFTEntry(object):
+    """In-use base FILE record reduced to what a file listing needs"""
+    __slots__ = ("inode", "seq", "is_dir", "names", "size", "times",
+                 "has_list")
+
+    def __init__(self, inode, seq, is_dir):
+        self.inode = inode
+        self.seq = seq
+        self.is_dir = is_dir
+        self.names = []
+        self.size = None
+        self.times = (0, 0, 0, 0)
+        self.has_list = False
+
+
+def record_size(fs):
+    """Return the MFT record size from the NTFS boot sector"""
+    boot = fs.open("/$Boot").read_random(0, 512)
+    bytes_per_sector, sectors_per_cluster = struct.unpack_from(
+        "<HB", boot, 0x0B)
+    clusters = struct.unpack_from("<b", boot, 0x40)[0]
+    if clusters > 0:
+        return clusters * bytes_per_sector * sectors_per_cluster
+    return 1 << -clusters
+
+
+def unix_time(filetime):
+    # Matches TSK, which reports times before 1970 as 0
+    if filetime < FILETIME_EPOCH:
+        return 0
+    return (filetime - FILETIME_EPOCH) // 10000000
+
+
+def apply_fixups(buff, offset, size):
+    """Restore the sector tails of one record in place; False if torn"""
+    usa_offset, usa_count = struct.unpack_from("<HH", buff, offset + 4)
+    if usa_offset + usa_count * 2 > size:
+        return False
+    check = buff[offset + usa_offset:offset + usa_offset + 2]
+    for i in range(1, usa_count):
+        tail = offset + i * 512 - 2
+        if tail + 2 > offset + size or buff[tail:tail + 2] != check:
+            return False
+        fix = offset + usa_offset + i * 2
+        buff[tail:tail + 2] = buff[fix:fix + 2]
+    return True
+
+
+def parse_record(buff, offset, size, inode):
+    """Decode one FILE record into (MFTEntry or None, base reference)
+
+    Unused records give (None, 0). Extension records give a headless
+    MFTEntry carrying their names and data size plus the base record
+    they belong to.
+    """
+    if buff[offset:offset + 4] != b"FILE" or \
+            not apply_fixups(buff, offset, size):
+        return None, 0
+    seq, _, attr_offset, flags = struct.unpack_from("<HHHH", buff,
+                                                    offset + 0x10)
+    if not flags & 0x01:
+        return None, 0
+    base = struct.unpack_from("<Q", buff, offset + 0x20)[0] & REF_MASK
+    entry = MFTEntry(inode, seq, bool(flags & 0x02))
+
+    pos = offset + attr_offset
+    end = offset + size
+    win32_names = []
+    dos_names = []
+    while pos + 16 <= end:
+        attr_type, attr_len = struct.unpack_from("<II", buff, pos)
+        if attr_type == ATTR_END or attr_len < 16 or pos + attr_len > end:
+            break
+        non_resident, name_len = struct.unpack_from("<BB", buff, pos + 8)
+        if non_resident:
+            content = None
+            if attr_type == ATTR_DATA and not name_len and \
+                    struct.unpack_from("<Q", buff, pos + 16)[0] == 0:
+                # Only the first extent carries the real size
+                entry.size = struct.unpack_from("<Q", buff, pos + 48)[0]
+        else:
+            content_len, content_offset = struct.unpack_from(
+                "<IH", buff, pos + 16)
+            content = pos + content_offset
+            if attr_type == ATTR_DATA and not name_len:
+                entry.size = content_len
+            elif attr_type == ATTR_INDEX_ROOT and entry.is_dir and \
+                    entry.size is None:
+                entry.size = content_len
+
+        if content is not None:
+            if attr_type == ATTR_STANDARD_INFORMATION:
+                crtime, mtime, ctime, atime = struct.unpack_from(
+                    "<QQQQ", buff, content)
+                entry.times = (unix_time(crtime), unix_time(ctime),
+                               unix_time(mtime), unix_time(atime))
+            elif attr_type == ATTR_FILE_NAME:
+                parent_ref = struct.unpack_from("<Q", buff, content)[0]
+                length, namespace = struct.unpack_from(
+                    "<BB", buff, content + 64)
+                name = _decode_name(
+                    buff[content + 66:content + 66 + length * 2])
+                name = (parent_ref & REF_MASK, parent_ref >> 48, name)
+                if namespace == NAMESPACE_DOS:
+                    dos_names.append(name)
+                elif name not in win32_names:
+                    win32_names.append(name)
+            elif attr_type == ATTR_ATTRIBUTE_LIST:
+                entry.has_list = True
+        elif attr_type == ATTR_ATTRIBUTE_LIST:
+            entry.has_list = True
+        pos += attr_len
+
+    # A short DOS name only shows up in a listing when it is the only one
+    entry.names = win32_names or dos_names
+    return entry, base
+
+
+if sys.version_info[0] < 3:
+    def _decode_name(raw):
+        # TSK hands Python 2 callers UTF-8 encoded names
+        return bytes(raw).decode("utf-16-le", "replace").encode("utf-8")
+else:
+    def _decode_name(raw):
+        return bytes(raw).decode("utf-16-le", "replace")
+
+
+def iter_entries(fs, batch_records=1024):
+    """Yield each in-use base MFTEntry, reading $MFT sequentially
+
+    $MFT is streamed in batches of whole records through one reusable
+    buffer. Records that keep attributes in extension records are held
+    back until the end of the stream and merged then.
+    """
+    size = record_size(fs)
+    reader = TSKFileReader(fs.open("/$MFT"), size * batch_records)
+    buff = bytearray(size * batch_records)
+    held = {}
+    extensions = {}
+    inode = 0
+    count = reader.readinto(buff)
+    while count:
+        for offset in range(0, count - size + 1, size):
+            entry, base = parse_record(buff, offset, size, inode)
+            inode += 1
+            if entry is None:
+                continue
+            if base:
+                extensions.setdefault(base, []).append(entry)
+            elif entry.has_list:
+                held[entry.inode] = entry
+            else:
+                yield entry
+        count = reader.readinto(buff)
+
+    for base_inode in sorted(held):
+        entry = held[base_inode]
+        for extra in extensions.get(base_inode, []):
+            for name in extra.names:
+                if name not in entry.names:
+                    entry.names.append(name)
+            if entry.size is None:
+                entry.size = extra.size
+        yield entry
+
+
+def list_files(fs, batch_records=1024):
+    """Yield (inode, name, path, is_dir, size, crtime, ctime, mtime, atime)
+
+    Paths are rebuilt from the parent references in $FILE_NAME using an
+    in-memory map of directories. Entries whose parents have not been
+    seen yet are held until the end of $MFT. Orphans whose parent is gone
+    or reused are dropped, as a walk from the root would never reach them.
+    A hard-linked file yields one row per name.
+    """
+    dirs = {}
+    paths = {}
+    pending = []
+    for entry in iter_entries(fs, batch_records):
+        if entry.inode == ROOT_RECORD:
+            paths[ROOT_RECORD] = (entry.seq, "")
+            continue
+        if entry.is_dir and entry.names:
+            parent, parent_seq, name = entry.names[0]
+            dirs[entry.inode] = (entry.seq, parent, parent_seq, name)
+        for parent, parent_seq, name in entry.names:
+            parent_path = _dir_path(parent, parent_seq, dirs, paths)
+            if parent_path is None:
+                pending.append((entry, parent, parent_seq, name))
+            elif parent_path is not ORPHAN:
+                yield _row(entry, name, parent_path)
+
+    for entry, parent, parent_seq, name in pending:
+        parent_path = _dir_path(parent, parent_seq, dirs, paths)
+        if parent_path is not None and parent_path is not ORPHAN:
+            yield _row(entry, name, parent_path)
+
+
+def _row(entry, name, parent_path):
+    return (entry.inode, name, parent_path + "/" + name, entry.is_dir,
+            entry.size or 0) + entry.times
+
+
+def _dir_path(inode, seq, dirs, paths):
+    """Return the path of a directory, None if unknown, ORPHAN if orphaned"""
+    chain = []
+    while inode not in paths:
+        info = dirs.get(inode)
+        if info is None:
+            return None
+        if info[0] != seq or len(chain) > len(dirs):
+            return ORPHAN
+        chain.append((inode, seq, info[3]))
+        inode, seq = info[1], info[2]
+    known_seq, path = paths[inode]
+    if known_seq != seq:
+        return ORPHAN
+    for inode, seq, name in reversed(chain):
+        path = path + "/" + name
+        paths[inode] = (seq, path)
+    return path
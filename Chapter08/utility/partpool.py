@@ -0,0 +1,137 @@
+from __future__ import print_function
+from collections import namedtuple
+import multiprocessing as mp
+import pytsk3
+import sys
+from .imgpool import ImagePool
+from .tskwalk import walk_fs
+
+"""
+MIT License
+
+Copyright (c) 2017 Chapin Bryce, Preston Miller
+
+Please share comments and questions at:
+    https://github.com/PythonForensics/PythonForensicsCookbook
+    or email pyforcookbook@gmail.com
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+PartitionJob = namedtuple("PartitionJob", ["addr", "offset", "fs_index",
+                                           "path", "recursive"])
+
+# Image pool, open filesystems and task of the current worker process
+_worker = {}
+
+
+def eligible_partitions(vol):
+    """Yield (address, byte offset) for each partition worth opening"""
+    if vol is None:
+        yield 1, 0
+        return
+    for part in vol:
+        if part.len > 2048 and "Unallocated" not in part.desc and \
+                "Extended" not in part.desc and \
+                "Primary Table" not in part.desc:
+            yield part.addr, part.start * vol.info.block_size
+
+
+def partition_jobs(vol, img, split=False):
+    """Return the work units for a volume, in sequential walk order
+
+    Filesystems that fail to open are reported and left out here, so
+    fs_index numbers only the ones that opened, as the sequential
+    walkers do. With split, each top-level directory becomes a job of
+    its own, after a non-recursive job for the root entries.
+    """
+    jobs = []
+    fs_index = 0
+    for addr, offset in eligible_partitions(vol):
+        try:
+            fs = pytsk3.FS_Info(img, offset=offset)
+        except IOError:
+            _, e, _ = sys.exc_info()
+            print("[-] Unable to open FS:\n {}".format(e))
+            continue
+        if not split:
+            jobs.append(PartitionJob(addr, offset, fs_index, "/", True))
+        else:
+            root = fs.open_dir(path="/")
+            jobs.append(PartitionJob(addr, offset, fs_index, "/", False))
+            for _, path, _, is_dir in walk_fs(root, _no_descend):
+                if is_dir:
+                    jobs.append(
+                        PartitionJob(addr, offset, fs_index, path, True))
+        fs_index += 1
+    return jobs
+
+
+def run_jobs(pool, jobs, task, args=(), workers=None):
+    """Yield task(job, root_dir, descend, path, *args) for each job
+
+    Every worker process opens the image in a pool of its own and keeps
+    its filesystems open between jobs. Results come back in job
+    order whatever order the workers finish in, so the merged output is
+    the same from run to run. Results must be picklable.
+
+    The task and args reach each worker once, through the Pool
+    initializer, so an argument such as a memory-mapped hash index is
+    opened once per worker rather than once per job.
+    """
+    workers = workers or mp.cpu_count()
+    procs = mp.Pool(min(workers, max(1, len(jobs))),
+                    initializer=_init_worker,
+                    initargs=(pool.image, pool.img_type, pool.max_handles,
+                              task, args))
+    try:
+        for result in procs.imap(_run_job, jobs):
+            yield result
+        procs.close()
+    except BaseException:
+        procs.terminate()
+        raise
+    finally:
+        procs.join()
+
+
+def _init_worker(image, img_type, max_handles, task, args):
+    # Only the image settings cross over: a forked worker would otherwise
+    # share the parent's open handles, file offsets and all
+    _worker["pool"] = ImagePool(image, img_type, max_handles)
+    _worker["img"] = _worker["pool"].img_info()
+    _worker["fs"] = {}
+    _worker["task"] = task
+    _worker["args"] = args
+
+
+def _run_job(job):
+    fs = _worker["fs"].get(job.offset)
+    if fs is None:
+        fs = _worker["fs"][job.offset] = pytsk3.FS_Info(
+            _worker["img"], offset=job.offset)
+    root = fs.open_dir(path=job.path)
+    descend = None if job.recursive else _no_descend
+    path = "" if job.path == "/" else job.path
+    return _worker["task"](job, root, descend, path, *_worker["args"])
+
+
+def _no_descend(path):
+    return False
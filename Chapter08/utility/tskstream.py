@@ -0,0 +1,200 @@
+from __future__ import print_function
+import os
+import pytsk3
+
+"""
+MIT License
+
+Copyright (c) 2017 Chapin Bryce, Preston Miller
+
+Please share comments and questions at:
+    https://github.com/PythonForensics/PythonForensicsCookbook
+    or email pyforcookbook@gmail.com
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+class TSKFileReader(object):
+    """File-like reader serving a pytsk3 File object in bounded chunks"""
+    def __init__(self, fs_object, chunk_size=1024 * 1024):
+        self.fs_object = fs_object
+        self.chunk_size = chunk_size
+        self.size = getattr(fs_object.info.meta, "size", 0) or 0
+        self.offset = 0
+
+    def __iter__(self):
+        chunk = self.read(self.chunk_size)
+        while chunk:
+            yield chunk
+            chunk = self.read(self.chunk_size)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self.offset
+        size = min(size, self.size - self.offset)
+        if size <= 0:
+            return b""
+        data = self.fs_object.read_random(self.offset, size)
+        self.offset += len(data)
+        return data
+
+    def readinto(self, buff):
+        view = memoryview(buff)
+        data = self.read(len(view))
+        view[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.offset
+        elif whence == os.SEEK_END:
+            offset += self.size
+        self.offset = max(0, offset)
+        return self.offset
+
+    def tell(self):
+        return self.offset
+
+
+DATA_TYPES = (pytsk3.TSK_FS_ATTR_TYPE_DEFAULT,
+              pytsk3.TSK_FS_ATTR_TYPE_NTFS_DATA)
+UNMAPPED = pytsk3.TSK_FS_ATTR_RUN_FLAG_SPARSE | \
+    pytsk3.TSK_FS_ATTR_RUN_FLAG_FILLER
+_zero_blocks = {}
+
+
+def data_attribute(fs_object):
+    """Return the default (unnamed) data attribute of a file, or None"""
+    try:
+        for attr in fs_object:
+            if attr.info.type in DATA_TYPES and not attr.info.name:
+                return attr
+    except IOError:
+        pass
+    return None
+
+
+def iter_chunks(fs_object, chunk_size=1024 * 1024):
+    return iter(TSKFileReader(fs_object, chunk_size))
+
+
+def copy_file(fs_object, outfile, chunk_size=1024 * 1024):
+    # A single reusable buffer keeps memory flat for files of any size
+    reader = TSKFileReader(fs_object, chunk_size)
+    buff = bytearray(chunk_size)
+    view = memoryview(buff)
+    written = 0
+    count = reader.readinto(buff)
+    while count:
+        outfile.write(view[:count])
+        written += count
+        count = reader.readinto(buff)
+    return written
+
+
+def iter_content(fs_object, chunk_size=1024 * 1024):
+    """Yield the same bytes as iter_chunks, skipping reads of sparse runs
+
+    Sparse and filler runs, and anything past the initialized size, are
+    served from a shared block of zeros instead of being read through
+    TSK. Resident data falls back to plain chunked reads, which TSK
+    answers from the MFT record it already holds; so do compressed and
+    encrypted data and run lists that do not add up.
+    """
+    for chunk, sparse in iter_extents(fs_object, chunk_size):
+        yield chunk
+
+
+def iter_extents(fs_object, chunk_size=1024 * 1024):
+    """Yield (chunk, sparse) pairs covering the content of a file
+
+    The chunks are those of iter_content; sparse is True for the ones
+    served from the zero block, which were never read from the image.
+    """
+    size = getattr(fs_object.info.meta, "size", 0) or 0
+    plan = _content_plan(fs_object, size)
+    if plan is None:
+        for chunk in iter_chunks(fs_object, chunk_size):
+            yield chunk, False
+        return
+
+    zeros = _zero_blocks.get(chunk_size)
+    if zeros is None:
+        zeros = _zero_blocks[chunk_size] = memoryview(bytearray(chunk_size))
+    reader = TSKFileReader(fs_object, chunk_size)
+    for start, end, allocated in plan:
+        if not allocated:
+            while start < end:
+                count = min(chunk_size, end - start)
+                yield zeros[:count], True
+                start += count
+            continue
+        reader.seek(start)
+        while start < end:
+            chunk = reader.read(min(chunk_size, end - start))
+            if not chunk:
+                return
+            yield chunk, False
+            start += len(chunk)
+
+
+def _content_plan(fs_object, size):
+    # Returns (start, end, allocated) byte ranges covering the file, or
+    # None when the runs cannot be trusted to describe the content
+    attr = data_attribute(fs_object)
+    if attr is None or attr.info.flags & (
+            pytsk3.TSK_FS_ATTR_RES | pytsk3.TSK_FS_ATTR_COMP |
+            pytsk3.TSK_FS_ATTR_ENC):
+        return None
+    try:
+        block_size = fs_object.info.fs_info.block_size
+        init_size = min(size, attr.info.nrd.initsize)
+        runs = sorted(((run.offset, run.len, run.flags) for run in attr),
+                      key=lambda run: run[0])
+    except (AttributeError, IOError):
+        return None
+
+    plan = []
+    pos = 0
+    for offset, length, flags in runs:
+        start = offset * block_size
+        end = min(size, start + length * block_size)
+        if start != pos:
+            return None
+        if end <= start:
+            break
+        if flags & UNMAPPED or start >= init_size:
+            _add_range(plan, start, end, False)
+        else:
+            _add_range(plan, start, min(end, init_size), True)
+            _add_range(plan, min(end, init_size), end, False)
+        pos = end
+    if pos != size:
+        return None
+    return plan
+
+
+def _add_range(plan, start, end, allocated):
+    if end <= start:
+        return
+    if plan and plan[-1][2] == allocated and plan[-1][1] == start:
+        plan[-1] = (plan[-1][0], end, allocated)
+    else:
+        plan.append((start, end, allocated))
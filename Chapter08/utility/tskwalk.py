@@ -0,0 +1,75 @@
+from __future__ import print_function
+import pytsk3
+
+"""
+MIT License
+
+Copyright (c) 2017 Chapin Bryce, Preston Miller
+
+Please share comments and questions at:
+    https://github.com/PythonForensics/PythonForensicsCookbook
+    or email pyforcookbook@gmail.com
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+def walk_fs(root_dir, descend=None, path=""):
+    """Yield (name, path, fs_object, is_dir) for each entry below root_dir"""
+    # Depth-first like the old recursive walkers, but with an explicit
+    # stack so deep trees cannot hit the recursion limit. Every frame
+    # carries its own path prefix and directory address; only the
+    # addresses on the stack are skipped, which breaks loops while a
+    # directory reachable by two names is still listed under both.
+    root_inode = root_dir.info.fs_file.meta.addr
+    active = set([root_inode])
+    stack = [(iter(root_dir), path, root_inode)]
+    while stack:
+        entries, parent_path, _ = stack[-1]
+        try:
+            fs_object = next(entries)
+        except (StopIteration, IOError):
+            active.discard(stack.pop()[2])
+            continue
+
+        # Skip ".", ".." or directory entries without a name.
+        if not hasattr(fs_object, "info") or \
+                not hasattr(fs_object.info, "name") or \
+                not hasattr(fs_object.info.name, "name") or \
+                fs_object.info.name.name in [".", ".."]:
+            continue
+        file_name = fs_object.info.name.name
+        file_path = parent_path + "/" + file_name
+        try:
+            is_dir = fs_object.info.meta.type == pytsk3.TSK_FS_META_TYPE_DIR
+        except AttributeError:
+            continue
+
+        yield file_name, file_path, fs_object, is_dir
+
+        if is_dir and (descend is None or descend(file_path)):
+            inode = fs_object.info.meta.addr
+            if inode in active:
+                continue
+            try:
+                stack.append((iter(fs_object.as_directory()), file_path,
+                              inode))
+            except IOError:
+                continue
+            active.add(inode)
@@ -0,0 +1,113 @@
+from __future__ import print_function
+import argparse
+import os
+import sys
+from utility.pytskutil import NameMatcher, TSKUtil
+from evt_explorer import parse_event_logs
+from index_parser import parse_index_files
+from pf_parser import parse_prefetch
+from srum_parser import parse_srum_files
+
+"""
+MIT License
+
+Copyright (c) 2017 Chapin Bryce, Preston Miller
+
+Please share comments and questions at:
+    https://github.com/PythonForensics/PythonForensicsCookbook
+    or email pyforcookbook@gmail.com
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+__authors__ = ["Chapin Bryce", "Preston Miller"]
+__date__ = 20170815
+__description__ = "Run every artifact parser from a single pass over " \
+    "the evidence"
+
+
+def main(evidence, image_type, output_dir, pf_dir, evt_dir, index_dir,
+         srum_dir):
+    tsk_util = TSKUtil(evidence, image_type)
+    os.chdir(output_dir)
+
+    # Every consumer collects its hits during one traversal of the
+    # evidence instead of each parser recursing the image on its own
+    artifacts = {"prefetch": [], "event logs": [], "index.dat": [],
+                 "SRUDB.dat": []}
+    tsk_util.register(
+        "prefetch", NameMatcher("pf", "ext"),
+        artifacts["prefetch"].append, path=pf_dir)
+    tsk_util.register(
+        "event logs", NameMatcher(["evt", "evtx"], "ext"),
+        artifacts["event logs"].append, path=evt_dir)
+    tsk_util.register(
+        "index.dat", NameMatcher("index.dat", "equal"),
+        artifacts["index.dat"].append, path=index_dir)
+    tsk_util.register(
+        "SRUDB.dat", NameMatcher("SRUDB.dat", "equal"),
+        artifacts["SRUDB.dat"].append, path=srum_dir)
+
+    print("[+] Walking evidence for artifacts")
+    hits = tsk_util.walk()
+    for name in sorted(hits):
+        print("[+] Identified {} {} file(s)".format(hits[name], name))
+
+    if artifacts["prefetch"]:
+        parse_prefetch(artifacts["prefetch"], "prefetch.csv", pf_dir)
+    if artifacts["event logs"]:
+        parse_event_logs(artifacts["event logs"], evt_dir)
+    if artifacts["index.dat"]:
+        parse_index_files(artifacts["index.dat"], index_dir)
+    if artifacts["SRUDB.dat"]:
+        parse_srum_files(artifacts["SRUDB.dat"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__description__,
+        epilog="Developed by {} on {}".format(
+            ", ".join(__authors__), __date__)
+    )
+    parser.add_argument("EVIDENCE_FILE", help="Evidence file path")
+    parser.add_argument("TYPE", help="Type of Evidence",
+                        choices=("raw", "ewf"))
+    parser.add_argument("OUTPUT_DIR", help="Directory to write reports to")
+    parser.add_argument("--pf-dir", help="Prefetch directory to scan",
+                        default="/WINDOWS/PREFETCH")
+    parser.add_argument("--evt-dir", help="Event log directory to scan",
+                        default="/WINDOWS/SYSTEM32/WINEVT")
+    parser.add_argument("--index-dir", help="Index.dat directory to scan",
+                        default="/USERS")
+    parser.add_argument("--srum-dir", help="SRUM directory to scan",
+                        default="/Windows/System32/sru")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.OUTPUT_DIR):
+        os.makedirs(args.OUTPUT_DIR)
+
+    if os.path.exists(args.EVIDENCE_FILE) and \
+            os.path.isfile(args.EVIDENCE_FILE):
+        main(os.path.abspath(args.EVIDENCE_FILE), args.TYPE,
+             args.OUTPUT_DIR, args.pf_dir, args.evt_dir, args.index_dir,
+             args.srum_dir)
+    else:
+        print("[-] Supplied input file {} does not exist or is not a "
+              "file".format(args.EVIDENCE_FILE))
+        sys.exit(1)
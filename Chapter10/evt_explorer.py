@@ -7,7 +7,7 @@ import pyewf
 import pyevt
 import pyevtx
 import sys
-from utility.pytskutil import TSKUtil
+from utility.pytskutil import TSKUtil, copy_file
 
 """
 MIT License
@@ -53,54 +53,7 @@ def main(evidence, image_type, log, win_event, fuzzy):
             event_log = tsk_util.recurse_files(
                 log, path=win_event, logic="equal")
         if event_log is not None:
-            event_data = []
-            for hit in event_log:
-                event_file = hit[2]
-                temp_evt = write_file(event_file)
-                if pyevt.check_file_signature(temp_evt):
-                    evt_log = pyevt.open(temp_evt)
-                    print("[+] Identified {} records in {}".format(
-                        evt_log.number_of_records, temp_evt))
-                    for i, record in enumerate(evt_log.records):
-                        strings = ""
-                        for s in record.strings:
-                            if s is not None:
-                                strings += s + "\n"
-
-                        event_data.append([
-                            i, hit[0], record.computer_name,
-                            record.user_security_identifier,
-                            record.creation_time, record.written_time,
-                            record.event_category, record.source_name,
-                            record.event_identifier, record.event_type,
-                            strings, "",
-                            os.path.join(win_event, hit[1].lstrip("//"))
-                        ])
-
-                elif pyevtx.check_file_signature(temp_evt):
-                    evtx_log = pyevtx.open(temp_evt)
-                    print("[+] Identified {} records in {}".format(
-                          evtx_log.number_of_records, temp_evt))
-                    for i, record in enumerate(evtx_log.records):
-                        strings = ""
-                        for s in record.strings:
-                            if s is not None:
-                                strings += s + "\n"
-
-                        event_data.append([
-                            i, hit[0], record.computer_name,
-                            record.user_security_identifier, "",
-                            record.written_time, record.event_level,
-                            record.source_name, record.event_identifier,
-                            "", strings, record.xml_string,
-                            os.path.join(win_event, hit[1].lstrip("//"))
-                        ])
-                else:
-                    print("[-] {} not a valid event log. Removing temp "
-                          "file...".format(temp_evt))
-                    os.remove(temp_evt)
-                    continue
-            write_output(event_data)
+            parse_event_logs(event_log, win_event)
         else:
             print("[-] {} Event log not found in {} directory".format(
                 log, win_event))
@@ -112,9 +65,60 @@ def main(evidence, image_type, log, win_event, fuzzy):
         sys.exit(2)
 
 
+def parse_event_logs(event_log, win_event):
+    event_data = []
+    for hit in event_log:
+        event_file = hit[2]
+        temp_evt = write_file(event_file)
+        if pyevt.check_file_signature(temp_evt):
+            evt_log = pyevt.open(temp_evt)
+            print("[+] Identified {} records in {}".format(
+                evt_log.number_of_records, temp_evt))
+            for i, record in enumerate(evt_log.records):
+                strings = ""
+                for s in record.strings:
+                    if s is not None:
+                        strings += s + "\n"
+
+                event_data.append([
+                    i, hit[0], record.computer_name,
+                    record.user_security_identifier,
+                    record.creation_time, record.written_time,
+                    record.event_category, record.source_name,
+                    record.event_identifier, record.event_type,
+                    strings, "",
+                    os.path.join(win_event, hit[1].lstrip("//"))
+                ])
+
+        elif pyevtx.check_file_signature(temp_evt):
+            evtx_log = pyevtx.open(temp_evt)
+            print("[+] Identified {} records in {}".format(
+                  evtx_log.number_of_records, temp_evt))
+            for i, record in enumerate(evtx_log.records):
+                strings = ""
+                for s in record.strings:
+                    if s is not None:
+                        strings += s + "\n"
+
+                event_data.append([
+                    i, hit[0], record.computer_name,
+                    record.user_security_identifier, "",
+                    record.written_time, record.event_level,
+                    record.source_name, record.event_identifier,
+                    "", strings, record.xml_string,
+                    os.path.join(win_event, hit[1].lstrip("//"))
+                ])
+        else:
+            print("[-] {} not a valid event log. Removing temp "
+                  "file...".format(temp_evt))
+            os.remove(temp_evt)
+            continue
+    write_output(event_data)
+
+
 def write_file(event_file):
-    with open(event_file.info.name.name, "w") as outfile:
-        outfile.write(event_file.read_random(0, event_file.info.meta.size))
+    with open(event_file.info.name.name, "wb") as outfile:
+        copy_file(event_file, outfile)
     return event_file.info.name.name
 
 
@@ -7,7 +7,7 @@ import pyewf
 import pymsiecf
 import sys
 import unicodecsv as csv
-from utility.pytskutil import TSKUtil
+from utility.pytskutil import TSKUtil, copy_file
 
 """
 MIT License
@@ -50,68 +50,72 @@ def main(evidence, image_type, path):
         index_files = tsk_util.recurse_files("index.dat", path=path,
                                              logic="equal")
         if index_files is not None:
-            print("[+] Identified {} potential index.dat files".format(
-                  len(index_files)))
-            index_data = []
-            for hit in index_files:
-                index_file = hit[2]
-                temp_index = write_file(index_file)
-                if pymsiecf.check_file_signature(temp_index):
-                    index_dat = pymsiecf.open(temp_index)
-                    print("[+] Identified {} records in {}".format(
-                        index_dat.number_of_items, temp_index))
-                    for i, record in enumerate(index_dat.items):
-                        try:
-                            data = record.data
-                            if data is not None:
-                                data = data.rstrip("\x00")
-                        except AttributeError:
-                            if isinstance(record, pymsiecf.redirected):
-                                index_data.append([
-                                    i, temp_index, "", "", "", "", "",
-                                    record.location, "", "", record.offset,
-                                    os.path.join(path, hit[1].lstrip("//"))
-                                ])
-
-                            elif isinstance(record, pymsiecf.leak):
-                                index_data.append([
-                                    i, temp_index, record.filename, "",
-                                    "", "", "", "", "", "", record.offset,
-                                    os.path.join(path, hit[1].lstrip("//"))
-                                ])
-
-                            continue
+            parse_index_files(index_files, path)
+        else:
+            print("[-] Index.dat files not found in {} directory".format(
+                path))
+            sys.exit(3)
+
+    else:
+        print("[-] Directory {} not found".format(win_event))
+        sys.exit(2)
+
+
+def parse_index_files(index_files, path):
+    print("[+] Identified {} potential index.dat files".format(
+          len(index_files)))
+    index_data = []
+    for hit in index_files:
+        index_file = hit[2]
+        temp_index = write_file(index_file)
+        if pymsiecf.check_file_signature(temp_index):
+            index_dat = pymsiecf.open(temp_index)
+            print("[+] Identified {} records in {}".format(
+                index_dat.number_of_items, temp_index))
+            for i, record in enumerate(index_dat.items):
+                try:
+                    data = record.data
+                    if data is not None:
+                        data = data.rstrip("\x00")
+                except AttributeError:
+                    if isinstance(record, pymsiecf.redirected):
+                        index_data.append([
+                            i, temp_index, "", "", "", "", "",
+                            record.location, "", "", record.offset,
+                            os.path.join(path, hit[1].lstrip("//"))
+                        ])
 
+                    elif isinstance(record, pymsiecf.leak):
                         index_data.append([
-                            i, temp_index, record.filename,
-                            record.type, record.primary_time,
-                            record.secondary_time,
-                            record.last_checked_time, record.location,
-                            record.number_of_hits, data, record.offset,
+                            i, temp_index, record.filename, "",
+                            "", "", "", "", "", "", record.offset,
                             os.path.join(path, hit[1].lstrip("//"))
                         ])
 
-                else:
-                    print("[-] {} not a valid index.dat file. Removing "
-                          "temp file..".format(temp_index))
-                    os.remove("index.dat")
                     continue
 
-            os.remove("index.dat")
-            write_output(index_data)
+                index_data.append([
+                    i, temp_index, record.filename,
+                    record.type, record.primary_time,
+                    record.secondary_time,
+                    record.last_checked_time, record.location,
+                    record.number_of_hits, data, record.offset,
+                    os.path.join(path, hit[1].lstrip("//"))
+                ])
+
         else:
-            print("[-] Index.dat files not found in {} directory".format(
-                path))
-            sys.exit(3)
+            print("[-] {} not a valid index.dat file. Removing "
+                  "temp file..".format(temp_index))
+            os.remove("index.dat")
+            continue
 
-    else:
-        print("[-] Directory {} not found".format(win_event))
-        sys.exit(2)
+    os.remove("index.dat")
+    write_output(index_data)
 
 
 def write_file(index_file):
-    with open(index_file.info.name.name, "w") as outfile:
-        outfile.write(index_file.read_random(0, index_file.info.meta.size))
+    with open(index_file.info.name.name, "wb") as outfile:
+        copy_file(index_file, outfile)
     return index_file.info.name.name
 
 
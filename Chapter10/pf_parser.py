@@ -54,6 +54,10 @@ def main(evidence, image_type, output_csv, path):
         print("[-] No .pf files found")
         sys.exit(2)
 
+    parse_prefetch(prefetch_files, output_csv, path)
+
+
+def parse_prefetch(prefetch_files, output_csv, path):
     print("[+] Identified {} potential prefetch files".format(
           len(prefetch_files)))
     prefetch_data = []
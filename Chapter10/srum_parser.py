@@ -8,7 +8,7 @@ import pyesedb
 import struct
 import sys
 import unicodecsv as csv
-from utility.pytskutil import TSKUtil
+from utility.pytskutil import TSKUtil, copy_file
 
 """
 MIT License
@@ -61,51 +61,7 @@ def main(evidence, image_type):
         srum_files = tsk_util.recurse_files("SRUDB.dat", path=path,
                                             logic="equal")
         if srum_files is not None:
-            print("[+] Identified {} potential SRUDB.dat file(s)".format(
-                len(srum_files)))
-            for hit in srum_files:
-                srum_file = hit[2]
-                srum_tables = {}
-                temp_srum = write_file(srum_file)
-                if pyesedb.check_file_signature(temp_srum):
-                    srum_dat = pyesedb.open(temp_srum)
-                    print("[+] Process {} tables within database".format(
-                        srum_dat.number_of_tables))
-                    for table in srum_dat.tables:
-                        if table.name != "SruDbIdMapTable":
-                            continue
-                        global APP_ID_LOOKUP
-                        for entry in table.records:
-                            app_id = entry.get_value_data_as_integer(1)
-                            try:
-                                app = entry.get_value_data(2).replace(
-                                    "\x00", "")
-                            except AttributeError:
-                                app = ""
-                            APP_ID_LOOKUP[app_id] = app
-
-                    for table in srum_dat.tables:
-                        t_name = table.name
-                        print("[+] Processing {} table with {} records"
-                              .format(t_name, table.number_of_records))
-                        srum_tables[t_name] = {"columns": [], "data": []}
-                        columns = [x.name for x in table.columns]
-                        srum_tables[t_name]["columns"] = columns
-                        for entry in table.records:
-                            data = []
-                            for x in range(entry.number_of_values):
-                                data.append(convert_data(
-                                    entry.get_value_data(x), columns[x],
-                                    entry.get_column_type(x))
-                                )
-                            srum_tables[t_name]["data"].append(data)
-                        write_output(t_name, srum_tables)
-
-                else:
-                    print("[-] {} not a valid SRUDB.dat file. Removing "
-                          "temp file...".format(temp_srum))
-                    os.remove(temp_srum)
-                    continue
+            parse_srum_files(srum_files)
 
         else:
             print("[-] SRUDB.dat files not found in {} "
@@ -117,6 +73,54 @@ def main(evidence, image_type):
         sys.exit(2)
 
 
+def parse_srum_files(srum_files):
+    print("[+] Identified {} potential SRUDB.dat file(s)".format(
+        len(srum_files)))
+    for hit in srum_files:
+        srum_file = hit[2]
+        srum_tables = {}
+        temp_srum = write_file(srum_file)
+        if pyesedb.check_file_signature(temp_srum):
+            srum_dat = pyesedb.open(temp_srum)
+            print("[+] Process {} tables within database".format(
+                srum_dat.number_of_tables))
+            for table in srum_dat.tables:
+                if table.name != "SruDbIdMapTable":
+                    continue
+                global APP_ID_LOOKUP
+                for entry in table.records:
+                    app_id = entry.get_value_data_as_integer(1)
+                    try:
+                        app = entry.get_value_data(2).replace(
+                            "\x00", "")
+                    except AttributeError:
+                        app = ""
+                    APP_ID_LOOKUP[app_id] = app
+
+            for table in srum_dat.tables:
+                t_name = table.name
+                print("[+] Processing {} table with {} records"
+                      .format(t_name, table.number_of_records))
+                srum_tables[t_name] = {"columns": [], "data": []}
+                columns = [x.name for x in table.columns]
+                srum_tables[t_name]["columns"] = columns
+                for entry in table.records:
+                    data = []
+                    for x in range(entry.number_of_values):
+                        data.append(convert_data(
+                            entry.get_value_data(x), columns[x],
+                            entry.get_column_type(x))
+                        )
+                    srum_tables[t_name]["data"].append(data)
+                write_output(t_name, srum_tables)
+
+        else:
+            print("[-] {} not a valid SRUDB.dat file. Removing "
+                  "temp file...".format(temp_srum))
+            os.remove(temp_srum)
+            continue
+
+
 def convert_data(data, column, col_type):
     if data is None:
         return ""
@@ -159,8 +163,8 @@ def convert_data(data, column, col_type):
 
 
 def write_file(srum_file):
-    with open(srum_file.info.name.name, "w") as outfile:
-        outfile.write(srum_file.read_random(0, srum_file.info.meta.size))
+    with open(srum_file.info.name.name, "wb") as outfile:
+        copy_file(srum_file, outfile)
     return srum_file.info.name.name
 
 
@@ -1 +1,3 @@
 import pytskutil
+import fsindex
+import rawimg
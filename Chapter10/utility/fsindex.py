@@ -0,0 +1,159 @@
+from __future__ import print_function
+import hashlib
+import sqlite3
+
+"""
+MIT License
+
+Copyright (c) 2017 Chapin Bryce, Preston Miller
+
+Please share comments and questions at:
+    https://github.com/PythonForensics/PythonForensicsCookbook
+    or email pyforcookbook@gmail.com
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+class FSIndex(object):
+    """SQLite file listing of an evidence image, reused between runs"""
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.text_factory = str
+        self.conn.execute("create table if not exists meta ("
+                          "key text primary key, value text)")
+        self.conn.execute(
+            "create table if not exists files ("
+            "fs_index integer, partition integer, inode integer, "
+            "name text, lower_name text, ext text, type text, path text, "
+            "lower_path text, size integer, crtime integer, "
+            "ctime integer, mtime integer, atime integer)")
+        self.conn.commit()
+
+    def get_meta(self, key):
+        row = self.conn.execute("select value from meta where key = ?",
+                                (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def is_current(self, fingerprint):
+        # Only a completed build for the very same image can be trusted
+        return self.get_meta("fingerprint") == fingerprint and \
+            self.get_meta("complete") == "1"
+
+    def reset(self, fingerprint):
+        self.conn.execute("drop index if exists files_lower_name")
+        self.conn.execute("drop index if exists files_ext")
+        self.conn.execute("delete from files")
+        self.conn.executemany(
+            "insert or replace into meta values (?, ?)",
+            [("fingerprint", fingerprint), ("complete", "0")])
+        self.conn.commit()
+
+    def add(self, fs_index, partition, inode, name, ext, f_type, path,
+            size, crtime, ctime, mtime, atime):
+        self.conn.execute(
+            "insert into files values "
+            "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (fs_index, partition, inode, name, name.lower(), ext, f_type,
+             path, path.lower(), size, crtime, ctime, mtime, atime))
+
+    def finish(self):
+        # Indexes are built once after the bulk insert, which is far
+        # cheaper than maintaining them row by row
+        self.conn.execute("create index if not exists files_lower_name "
+                          "on files (lower_name)")
+        self.conn.execute("create index if not exists files_ext "
+                          "on files (ext)")
+        self.conn.execute("insert or replace into meta values "
+                          "('complete', '1')")
+        self.conn.commit()
+
+    def rows(self):
+        return self.conn.execute(
+            "select fs_index, partition, inode, name, ext, type, path, "
+            "size, crtime, ctime, mtime, atime from files order by rowid")
+
+    def files(self, path="/"):
+        """Return (name, path, fs_index, inode) of every file below path"""
+        scope = path.rstrip("/").lower() + "/"
+        return self.conn.execute(
+            "select name, path, fs_index, inode from files "
+            "where type = 'FILE' "
+            "and substr(lower_path, 1, ?) = ? order by rowid",
+            (len(scope), scope))
+
+    def query(self, substring, logic="contains", case=False, path="/"):
+        """Return (name, path, fs_index, inode) of matching files
+
+        Names are matched the way recurse_files matches them.
+        """
+        lower = substring.lower()
+        logic = logic.lower()
+        if logic == "equal":
+            where, params = "lower_name = ?", (lower,)
+        elif logic == "endswith" and lower.startswith(".") and \
+                "." not in lower[1:]:
+            where, params = "ext = ?", (lower[1:],)
+        elif logic == "endswith":
+            where, params = "substr(lower_name, -?) = ?", (len(lower), lower)
+        elif logic == "startswith":
+            where, params = "substr(lower_name, 1, ?) = ?", \
+                (len(lower), lower)
+        elif logic == "contains":
+            where, params = "instr(lower_name, ?) > 0", (lower,)
+        else:
+            raise ValueError("invalid logic {}".format(logic))
+
+        scope = path.rstrip("/").lower() + "/"
+        results = []
+        for name, file_path, fs_index, inode in self.conn.execute(
+                "select name, path, fs_index, inode from files "
+                "where type = 'FILE' and " + where + " and "
+                "substr(lower_path, 1, ?) = ? order by rowid",
+                params + (len(scope), scope)):
+            if case and not _case_match(name, substring, logic):
+                continue
+            results.append((name, file_path, fs_index, inode))
+        return results
+
+    def close(self):
+        self.conn.close()
+
+
+def _case_match(name, substring, logic):
+    if logic == "equal":
+        return name == substring
+    elif logic == "endswith":
+        return name.endswith(substring)
+    elif logic == "startswith":
+        return name.startswith(substring)
+    return substring in name
+
+
+def image_fingerprint(img_info, sample=65536):
+    # The media size plus a digest of its first and last blocks is enough
+    # to notice a different or modified image without hashing all of it
+    size = img_info.get_size()
+    sha1 = hashlib.sha1()
+    sha1.update(img_info.read(0, min(sample, size)))
+    if size > sample:
+        tail = max(sample, size - sample)
+        sha1.update(img_info.read(tail, size - tail))
+    return "{}:{}".format(size, sha1.hexdigest())
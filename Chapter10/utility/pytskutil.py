@@ -1,9 +1,13 @@
 from __future__ import print_function
+from collections import OrderedDict
 import os
 import pytsk3
+import re
 import sys
 import pyewf
 from datetime import datetime
+from .fsindex import FSIndex, image_fingerprint
+from .rawimg import MmapImgInfo
 
 """
 MIT License
@@ -34,16 +38,64 @@ SOFTWARE.
 """
 
 
+class BlockCache(object):
+    """Size-bounded LRU cache of aligned blocks read from an image"""
+    def __init__(self, read_block, block_size=32768,
+                 max_bytes=64 * 1024 * 1024):
+        self._read_block = read_block
+        self.block_size = block_size
+        self.max_blocks = max(1, max_bytes // block_size)
+        self.blocks = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def read(self, offset, size):
+        block_size = self.block_size
+        first = offset // block_size
+        last = (offset + size - 1) // block_size
+        pieces = []
+        for block in range(first, last + 1):
+            data = self.blocks.pop(block, None)
+            if data is None:
+                self.misses += 1
+                data = self._read_block(block * block_size, block_size)
+                if len(self.blocks) >= self.max_blocks:
+                    self.blocks.popitem(last=False)
+            else:
+                self.hits += 1
+            # Re-inserting marks the block as most recently used
+            self.blocks[block] = data
+            pieces.append(data)
+
+        start = offset - first * block_size
+        if len(pieces) == 1:
+            return pieces[0][start:start + size]
+        return b"".join(pieces)[start:start + size]
+
+    def clear(self):
+        self.blocks.clear()
+
+
 class EWFImgInfo(pytsk3.Img_Info):
-    """EWF Image Format helper class"""
-    def __init__(self, ewf_handle):
+    """EWF Image Format helper class with an LRU cache of EWF chunks"""
+    def __init__(self, ewf_handle, block_size=32768, cache_size=64 * 1024 * 1024):
         self._ewf_handle = ewf_handle
+        # Small, overlapping TSK metadata reads are served from cached
+        # chunk-aligned blocks instead of decompressing the chunk again
+        self.cache = None
+        if cache_size > 0:
+            self.cache = BlockCache(self._read, block_size, cache_size)
         super(EWFImgInfo, self).__init__(url="", type=pytsk3.TSK_IMG_TYPE_EXTERNAL)
 
     def close(self):
         self._ewf_handle.close()
 
     def read(self, offset, size):
+        if self.cache is None or size > self.cache.block_size * 4:
+            return self._read(offset, size)
+        return self.cache.read(offset, size)
+
+    def _read(self, offset, size):
         self._ewf_handle.seek(offset)
         return self._ewf_handle.read(size)
 
@@ -51,18 +103,171 @@ class EWFImgInfo(pytsk3.Img_Info):
         return self._ewf_handle.get_media_size()
 
 
+class TSKFileReader(object):
+    """File-like reader serving a pytsk3 File object in bounded chunks"""
+    def __init__(self, fs_object, chunk_size=1024 * 1024):
+        self.fs_object = fs_object
+        self.chunk_size = chunk_size
+        self.size = getattr(fs_object.info.meta, "size", 0) or 0
+        self.offset = 0
+
+    def __iter__(self):
+        chunk = self.read(self.chunk_size)
+        while chunk:
+            yield chunk
+            chunk = self.read(self.chunk_size)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self.offset
+        size = min(size, self.size - self.offset)
+        if size <= 0:
+            return b""
+        data = self.fs_object.read_random(self.offset, size)
+        self.offset += len(data)
+        return data
+
+    def readinto(self, buff):
+        view = memoryview(buff)
+        data = self.read(len(view))
+        view[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.offset
+        elif whence == os.SEEK_END:
+            offset += self.size
+        self.offset = max(0, offset)
+        return self.offset
+
+    def tell(self):
+        return self.offset
+
+
+def iter_chunks(fs_object, chunk_size=1024 * 1024):
+    return iter(TSKFileReader(fs_object, chunk_size))
+
+
+def copy_file(fs_object, outfile, chunk_size=1024 * 1024):
+    # A single reusable buffer keeps memory flat for files of any size
+    reader = TSKFileReader(fs_object, chunk_size)
+    buff = bytearray(chunk_size)
+    view = memoryview(buff)
+    written = 0
+    count = reader.readinto(buff)
+    while count:
+        outfile.write(view[:count])
+        written += count
+        count = reader.readinto(buff)
+    return written
+
+
+class NameMatcher(object):
+    """File name rules compiled once and checked at constant cost per entry"""
+    LOGIC = ("contains", "startswith", "endswith", "equal", "ext", "glob", "regex")
+
+    def __init__(self, patterns=None, logic="contains", case=False):
+        self.case = case
+        self.rules = []
+        self.names = set()
+        self.exts = set()
+        self.regex = None
+        self._expressions = []
+        if patterns is not None:
+            if not isinstance(patterns, (list, tuple)):
+                patterns = [patterns]
+            for pattern in patterns:
+                if isinstance(pattern, tuple):
+                    self.add(*pattern)
+                else:
+                    self.add(pattern, logic)
+
+    def add(self, pattern, logic="contains"):
+        logic = logic.lower()
+        if logic not in self.LOGIC:
+            raise ValueError("invalid logic {}".format(logic))
+        self.rules.append((pattern, logic))
+        key = pattern if self.case else pattern.lower()
+
+        # Exact names and extensions are set lookups, everything else is
+        # folded into a single alternation compiled on first use
+        if logic == "equal":
+            self.names.add(key)
+        elif logic == "ext" or (logic == "endswith" and key.startswith(".") and "." not in key[1:]):
+            self.exts.add(key.lstrip("."))
+        elif logic == "contains":
+            self._expressions.append(re.escape(pattern))
+        elif logic == "startswith":
+            self._expressions.append(r"\A" + re.escape(pattern))
+        elif logic == "endswith":
+            self._expressions.append(re.escape(pattern) + r"\Z")
+        elif logic == "glob":
+            self._expressions.append(glob_to_regex(pattern))
+        else:
+            self._expressions.append(pattern)
+        self.regex = None
+        return self
+
+    def compile(self):
+        if self._expressions:
+            flags = 0 if self.case else re.IGNORECASE
+            self.regex = re.compile("|".join("(?:{})".format(x) for x in self._expressions), flags)
+        return self
+
+    def __call__(self, file_name):
+        key = file_name if self.case else file_name.lower()
+        if key in self.names:
+            return True
+        if self.exts and "." in key and key.rsplit(".", 1)[-1] in self.exts:
+            return True
+        if self._expressions:
+            if self.regex is None:
+                self.compile()
+            return self.regex.search(file_name) is not None
+        return False
+
+
+def glob_to_regex(pattern):
+    # Translate a shell-style name glob, anchored to the whole name
+    regex = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "*":
+            regex.append(".*")
+        elif char == "?":
+            regex.append(".")
+        elif char == "[" and "]" in pattern[i + 1:]:
+            end = pattern.index("]", i + 1)
+            group = pattern[i + 1:end].replace("\\", "\\\\")
+            if group.startswith("!"):
+                group = "^" + group[1:]
+            regex.append("[{}]".format(group))
+            i = end
+        else:
+            regex.append(re.escape(char))
+        i += 1
+    return r"\A" + "".join(regex) + r"\Z"
+
+
 class TSKUtil(object):
-    def __init__(self, evidence, image_type):
+    def __init__(self, evidence, image_type, index_path=None):
         self.evidence = evidence
         self.image_type = image_type
+        self.index_path = index_path or evidence + ".fsidx"
 
         # Assigned parameters
         self.vol = None
         self.image_handle = None
         self.fs = []
+        self.partitions = []
+        self.consumers = []
+        self.index = None
 
         # Prep volume and fs objects
         self.run()
+        self.open_index()
 
     def run(self):
         self.open_vol()
@@ -85,7 +290,7 @@ class TSKUtil(object):
             # Open PYTSK3 handle on EWF Image
             self.image_handle = EWFImgInfo(ewf_handle)
         else:
-            self.image_handle = pytsk3.Img_Info(self.evidence)
+            self.image_handle = MmapImgInfo(self.evidence)
 
         # Open volume from image
         try:
@@ -112,7 +317,7 @@ class TSKUtil(object):
             # Open PYTSK3 handle on EWF Image
             self.image_handle = EWFImgInfo(ewf_handle)
         else:
-            self.image_handle = pytsk3.Img_Info(self.evidence)
+            self.image_handle = MmapImgInfo(self.evidence)
 
         # Open volume from image
         try:
@@ -130,16 +335,51 @@ class TSKUtil(object):
                         self.fs.append(pytsk3.FS_Info(
                             self.image_handle,
                             offset=partition.start * self.vol.info.block_size))
+                        self.partitions.append(partition.addr)
                     except IOError:
                         _, e, _ = sys.exc_info()
                         sys.stderr.write("[-] Unable to open FS:\n {}\n".format(e))
         else:
             try:
                 self.fs.append(pytsk3.FS_Info(self.image_handle))
+                self.partitions.append(1)
             except IOError:
                 _, e, _ = sys.exc_info()
                 sys.stderr.write("[-] Unable to open FS:\n {}\n".format(e))
 
+    def open_index(self):
+        # Reuse a file listing index built earlier for this same image
+        if not os.path.exists(self.index_path):
+            return
+        index = FSIndex(self.index_path)
+        if index.is_current(image_fingerprint(self.image_handle)):
+            sys.stderr.write("[+] Using file listing index {}\n".format(self.index_path))
+            self.index = index
+        else:
+            index.close()
+
+    def build_index(self):
+        """Walk every filesystem once and persist the listing to index_path"""
+        sys.stderr.write("[+] Building file listing index {}\n".format(self.index_path))
+        index = FSIndex(self.index_path)
+        index.reset(image_fingerprint(self.image_handle))
+        for i, fs in enumerate(self.fs):
+            try:
+                root_dir = fs.open_dir("/")
+            except IOError:
+                continue
+            for file_name, file_path, fs_object, is_dir in walk_fs(root_dir):
+                meta = fs_object.info.meta
+                if is_dir:
+                    f_type, file_ext = "DIR", ""
+                else:
+                    f_type = "FILE"
+                    file_ext = file_name.rsplit(".")[-1].lower() if "." in file_name else ""
+                index.add(i, self.partitions[i], meta.addr, file_name, file_ext, f_type, file_path,
+                          meta.size, meta.crtime, meta.ctime, meta.mtime, meta.atime)
+        index.finish()
+        self.index = index
+
     def detect_ntfs(self, vol, partition):
         try:
             block_size = vol.info.block_size
@@ -153,13 +393,93 @@ class TSKUtil(object):
             return False
 
     def recurse_files(self, substring, path="/", logic="contains", case=False):
+        """Find files below path matching substring
+
+        substring may be a single pattern, a list of patterns (or
+        (pattern, logic) tuples) or a prepared NameMatcher.
+        """
+        if isinstance(substring, NameMatcher):
+            matcher = substring
+        else:
+            try:
+                matcher = NameMatcher(substring, logic, case).compile()
+            except ValueError:
+                sys.stderr.write("[-] Warning invalid logic {} provided\n".format(logic))
+                sys.exit()
+
+        if self.index is not None:
+            return self.query_index(matcher, path)
+
         files = []
         for i, fs in enumerate(self.fs):
             try:
                 root_dir = fs.open_dir(path)
             except IOError:
                 continue
-            files += self.recurse_dirs(i, fs, root_dir, [], [], [""], substring, logic, case)
+            files += self.recurse_dirs(i, root_dir, matcher)
+
+        if files == []:
+            return None
+        else:
+            return files
+
+    def register(self, name, predicate, callback, path="/"):
+        """Add a consumer served by the next walk() of the evidence"""
+        consumer_path = path.rstrip("/").lower()
+        self.consumers.append((name, predicate, callback, consumer_path))
+
+    def walk(self):
+        """Traverse each filesystem once and dispatch files to consumers"""
+        hits = dict((consumer[0], 0) for consumer in self.consumers)
+        paths = [consumer[3] for consumer in self.consumers]
+
+        def descend(dir_path):
+            # Only enter directories on the way to, or inside, a consumer path
+            dir_path = dir_path.lower()
+            for path in paths:
+                if path == dir_path or path.startswith(dir_path + "/") or \
+                        dir_path.startswith(path + "/"):
+                    return True
+            return False
+
+        for i, fs in enumerate(self.fs):
+            try:
+                root_dir = fs.open_dir("/")
+            except IOError:
+                continue
+            for file_name, file_path, fs_object, is_dir in walk_fs(
+                    root_dir, descend):
+                if is_dir:
+                    continue
+                lower_path = file_path.lower()
+                for name, predicate, callback, path in self.consumers:
+                    if lower_path.startswith(path + "/") and \
+                            predicate(file_name):
+                        hits[name] += 1
+                        callback((file_name, file_path[len(path):],
+                                  fs_object, i))
+        return hits
+
+    def query_index(self, matcher, path):
+        # A single plain rule maps onto an indexed SQL query, anything
+        # richer filters the indexed listing below path
+        if len(matcher.rules) == 1 and matcher.rules[0][1] in (
+                "contains", "startswith", "endswith", "equal"):
+            pattern, logic = matcher.rules[0]
+            results = self.index.query(pattern, logic, matcher.case, path)
+        else:
+            results = [x for x in self.index.files(path) if matcher(x[0])]
+
+        files = []
+        scope = len(path.rstrip("/"))
+        for file_name, file_path, i, inode in results:
+            # Reopen by inode, as a path may name a different (allocated)
+            # entry than a deleted or same-named hit the walk listed
+            try:
+                fs_object = self.fs[i].open_meta(inode=inode)
+            except IOError:
+                continue
+            files.append((file_name, file_path[scope:], fs_object, i))
 
         if files == []:
             return None
@@ -179,73 +499,57 @@ class TSKUtil(object):
         else:
             return dirs
 
-    def recurse_dirs(self, part, fs, root_dir, dirs, data, parent, substring, logic, case):
-        dirs.append(root_dir.info.fs_file.meta.addr)
-        for fs_object in root_dir:
-            # Skip ".", ".." or directory entries without a name.
-            if not hasattr(fs_object, "info") or not hasattr(fs_object.info, "name") or not hasattr(fs_object.info.name, "name") or fs_object.info.name.name in [".", ".."]:
+    def recurse_dirs(self, part, root_dir, matcher):
+        data = []
+        for file_name, file_path, fs_object, is_dir in walk_fs(root_dir):
+            if not is_dir and matcher(file_name):
+                data.append((file_name, file_path, fs_object, part))
+        return data
+
+
+def walk_fs(root_dir, descend=None, path=""):
+    """Yield (name, path, fs_object, is_dir) for each entry below root_dir"""
+    # Depth-first like the old recursive walkers, but with an explicit
+    # stack so deep trees cannot hit the recursion limit. Every frame
+    # carries its own path prefix and directory address; only the
+    # addresses on the stack are skipped, which breaks loops while a
+    # directory reachable by two names is still listed under both.
+    root_inode = root_dir.info.fs_file.meta.addr
+    active = set([root_inode])
+    stack = [(iter(root_dir), path, root_inode)]
+    while stack:
+        entries, parent_path, _ = stack[-1]
+        try:
+            fs_object = next(entries)
+        except (StopIteration, IOError):
+            active.discard(stack.pop()[2])
+            continue
+
+        # Skip ".", ".." or directory entries without a name.
+        if not hasattr(fs_object, "info") or \
+                not hasattr(fs_object.info, "name") or \
+                not hasattr(fs_object.info.name, "name") or \
+                fs_object.info.name.name in [".", ".."]:
+            continue
+        file_name = fs_object.info.name.name
+        file_path = parent_path + "/" + file_name
+        try:
+            is_dir = fs_object.info.meta.type == pytsk3.TSK_FS_META_TYPE_DIR
+        except AttributeError:
+            continue
+
+        yield file_name, file_path, fs_object, is_dir
+
+        if is_dir and (descend is None or descend(file_path)):
+            inode = fs_object.info.meta.addr
+            if inode in active:
                 continue
             try:
-                file_name = fs_object.info.name.name
-                file_path = "{}/{}".format("/".join(parent), fs_object.info.name.name)
-                try:
-                    if fs_object.info.meta.type == pytsk3.TSK_FS_META_TYPE_DIR:
-                        f_type = "DIR"
-                        file_ext = ""
-                    else:
-                        f_type = "FILE"
-
-                except AttributeError:
-                    continue  # Which object has the AttributeError?
-
-                if f_type == "FILE":
-                    if logic.lower() == 'contains':
-                        if case is False:
-                            if substring.lower() in file_name.lower():
-                                data.append((file_name, file_path, fs_object, part))
-                        else:
-                            if substring in file_name:
-                                data.append((file_name, file_path, fs_object, part))
-                    elif logic.lower() == 'startswith':
-                        if case is False:
-                            if file_name.lower().startswith(substring.lower()):
-                                data.append((file_name, file_path, fs_object, part))
-                        else:
-                            if file_name.startswith(substring):
-                                data.append((file_name, file_path, fs_object, part))
-                    elif logic.lower() == 'endswith':
-                        if case is False:
-                            if file_name.lower().endswith(substring.lower()):
-                                data.append((file_name, file_path, fs_object, part))
-                        else:
-                            if file_name.endswith(substring):
-                                data.append((file_name, file_path, fs_object, part))
-                    elif logic.lower() == 'equal':
-                        if case is False:
-                            if substring.lower() == file_name.lower():
-                                data.append((file_name, file_path, fs_object, part))
-                        else:
-                            if substring == file_name:
-                                data.append((file_name, file_path, fs_object, part))
-                    else:
-                        sys.stderr.write("[-] Warning invalid logic {} provided\n".format(logic))
-                        sys.exit()
-
-                elif f_type == "DIR":
-                    parent.append(fs_object.info.name.name)
-                    sub_directory = fs_object.as_directory()
-                    inode = fs_object.info.meta.addr
-
-                    # This ensures that we don't recurse into a directory
-                    # above the current level and thus avoid circular loops.
-                    if inode not in dirs:
-                        self.recurse_dirs(part, fs, sub_directory, dirs, data, parent, substring, logic, case)
-                    parent.pop(-1)
-
+                stack.append((iter(fs_object.as_directory()), file_path,
+                              inode))
             except IOError:
-                pass
-        dirs.pop(-1)
-        return data
+                continue
+            active.add(inode)
 
 
 def openVSSFS(img, count):
@@ -256,52 +560,28 @@ def openVSSFS(img, count):
         _, e, _ = sys.exc_info()
         sys.stderr.write("[-] Unable to open FS: {}".format(e))
     root = fs.open_dir(path="/")
-    data = recurseFiles(count, fs, root, [], [], [""])
+    data = recurseFiles(count, root)
     return data
 
 
-def recurseFiles(count, fs, root_dir, dirs, data, parent):
-    dirs.append(root_dir.info.fs_file.meta.addr)
-    for fs_object in root_dir:
-        # Skip ".", ".." or directory entries without a name.
-        if not hasattr(fs_object, "info") or not hasattr(fs_object.info, "name") or not hasattr(fs_object.info.name, "name") or fs_object.info.name.name in [".", ".."]:
-            continue
-        try:
-            file_name = fs_object.info.name.name
-            file_path = "{}/{}".format("/".join(parent), fs_object.info.name.name)
-            try:
-                if fs_object.info.meta.type == pytsk3.TSK_FS_META_TYPE_DIR:
-                    f_type = "DIR"
-                    file_ext = ""
-                else:
-                    f_type = "FILE"
-                    if "." in file_name:
-                        file_ext = file_name.rsplit(".")[-1].lower()
-                    else:
-                        file_ext = ""
-            except AttributeError:
-                continue
-
-            size = fs_object.info.meta.size
-            create = convertTime(fs_object.info.meta.crtime)
-            change = convertTime(fs_object.info.meta.ctime)
-            modify = convertTime(fs_object.info.meta.mtime)
-            data.append(["VSS {}".format(count), file_name, file_ext, f_type, create, change, modify, size, file_path])
-
-            if f_type == "DIR":
-                parent.append(fs_object.info.name.name)
-                sub_directory = fs_object.as_directory()
-                inode = fs_object.info.meta.addr
-
-                # This ensures that we don't recurse into a directory
-                # above the current level and thus avoid circular loops.
-                if inode not in dirs:
-                    recurseFiles(count, fs, sub_directory, dirs, data, parent)
-                parent.pop(-1)
-
-        except IOError:
-            pass
-    dirs.pop(-1)
+def recurseFiles(count, root_dir):
+    data = []
+    for file_name, file_path, fs_object, is_dir in walk_fs(root_dir):
+        if is_dir:
+            f_type = "DIR"
+            file_ext = ""
+        else:
+            f_type = "FILE"
+            if "." in file_name:
+                file_ext = file_name.rsplit(".")[-1].lower()
+            else:
+                file_ext = ""
+
+        size = fs_object.info.meta.size
+        create = convertTime(fs_object.info.meta.crtime)
+        change = convertTime(fs_object.info.meta.ctime)
+        modify = convertTime(fs_object.info.meta.mtime)
+        data.append(["VSS {}".format(count), file_name, file_ext, f_type, create, change, modify, size, file_path])
     return data
 
 
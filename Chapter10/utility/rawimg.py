@@ -0,0 +1,211 @@
+from __future__ import print_function
+import bisect
+import itertools
+import mmap
+import os
+import pytsk3
+import re
+import string
+
+"""
+MIT License
+
+Copyright (c) 2017 Chapin Bryce, Preston Miller
+
+Please share comments and questions at:
+    https://github.com/PythonForensics/PythonForensicsCookbook
+    or email pyforcookbook@gmail.com
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+def split_segments(image):
+    """Return the files of a raw image in order, following split segments
+
+    As with TSK, a first segment named like image.001, image.000 or
+    image.aa pulls in its consecutively numbered siblings; any other
+    name is a single-file image.
+    """
+    match = re.match(r"(.*\.)(0*[01]|aa)$", image, re.IGNORECASE)
+    if match is None:
+        return [image]
+    prefix, first = match.groups()
+    if first.isdigit():
+        names = (prefix + str(number).zfill(len(first))
+                 for number in itertools.count(int(first)))
+    else:
+        letters = string.ascii_lowercase
+        if first.isupper():
+            letters = string.ascii_uppercase
+        names = (prefix + a + b for a in letters for b in letters)
+    segments = []
+    for name in names:
+        if not os.path.isfile(name):
+            break
+        segments.append(name)
+    return segments or [image]
+
+
+class MappedImage(object):
+    """Read-only memory map of a raw (dd) image shared by its readers
+
+    Split images get one map per segment; reads across a segment
+    boundary are stitched together from both maps.
+    """
+    def __init__(self, image):
+        self._files = []
+        self._maps = []
+        self._views = []
+        self._starts = []
+        self.size = 0
+        try:
+            for segment in split_segments(image):
+                self._add_segment(segment)
+        except Exception:
+            self.close()
+            raise
+
+    def _add_segment(self, segment):
+        fh = open(segment, "rb")
+        self._files.append(fh)
+        size = os.fstat(fh.fileno()).st_size
+        if not size:
+            return
+        seg_map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(seg_map)
+        try:
+            self._views.append(memoryview(seg_map))
+        except TypeError:
+            # Python 2 mmap objects only offer the old buffer API
+            self._views.append(None)
+        self._starts.append(self.size)
+        self.size += size
+
+    def _pieces(self, offset, size):
+        """Yield (map index, start, end) ranges covering offset:offset+size"""
+        end = min(offset + size, self.size)
+        index = bisect.bisect_right(self._starts, offset) - 1
+        while offset < end and index < len(self._maps):
+            start = offset - self._starts[index]
+            stop = min(end - self._starts[index], len(self._maps[index]))
+            yield index, start, stop
+            offset += stop - start
+            index += 1
+
+    def read(self, offset, size):
+        """Return bytes at offset, copied once straight from the page cache"""
+        return b"".join(self._maps[index][start:stop]
+                        for index, start, stop in self._pieces(offset, size))
+
+    def view(self, offset, size):
+        """Return a zero-copy view of the bytes at offset
+
+        Views point into the map itself, so drop them before close().
+        A range spanning two segments cannot be one view and is copied.
+        """
+        pieces = list(self._pieces(offset, size))
+        if not pieces:
+            return b""
+        if len(pieces) > 1:
+            return self.read(offset, size)
+        index, start, stop = pieces[0]
+        if self._views[index] is not None:
+            return self._views[index][start:stop]
+        return buffer(self._maps[index], start,  # noqa: F821 (Python 2)
+                      stop - start)
+
+    def close(self):
+        for seg_view in self._views:
+            if seg_view is not None:
+                seg_view.release()
+        for seg_map in self._maps:
+            seg_map.close()
+        for fh in self._files:
+            fh.close()
+        self._views = []
+        self._maps = []
+        self._files = []
+        self._starts = []
+
+
+class MmapImgInfo(pytsk3.Img_Info):
+    """TSK image over a memory-mapped raw image"""
+    def __init__(self, image):
+        # Only a map opened here is closed here; a shared one stays open
+        self._owns_map = not isinstance(image, MappedImage)
+        self.mapped = MappedImage(image) if self._owns_map else image
+        super(MmapImgInfo, self).__init__(
+            url="", type=pytsk3.TSK_IMG_TYPE_EXTERNAL)
+
+    def close(self):
+        if self._owns_map:
+            self.mapped.close()
+
+    def read(self, offset, size):
+        return self.mapped.read(offset, size)
+
+    def view(self, offset, size):
+        return self.mapped.view(offset, size)
+
+    def get_size(self):
+        return self.mapped.size
+
+    def file(self):
+        """Return a file-like reader, e.g. for pyvshadow, on the same map"""
+        return MmapFile(self.mapped)
+
+
+class MmapFile(object):
+    """File-like object with its own position over a MappedImage"""
+    def __init__(self, image):
+        self._owns_map = not isinstance(image, MappedImage)
+        self.mapped = MappedImage(image) if self._owns_map else image
+        self._pos = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = max(0, self.mapped.size - self._pos)
+        data = self.mapped.read(self._pos, size)
+        self._pos += len(data)
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += self.mapped.size
+        elif whence != os.SEEK_SET:
+            raise IOError("Illegal whence value {}".format(whence))
+        if offset < 0:
+            raise IOError("Invalid seek to negative offset")
+        self._pos = offset
+
+    def tell(self):
+        return self._pos
+
+    def get_offset(self):
+        return self._pos
+
+    def get_size(self):
+        return self.mapped.size
+
+    def close(self):
+        if self._owns_map:
+            self.mapped.close()
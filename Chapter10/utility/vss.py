@@ -23,6 +23,8 @@ import os
 import pytsk3
 import pyvshadow
 
+from .rawimg import MmapFile, MmapImgInfo
+
 
 class VShadowImgInfo(pytsk3.Img_Info):
   """Extending the TSK Img_Info to allow VSS images to be read in."""
@@ -62,7 +64,7 @@ class VShadowVolume(object):
     ofs = int(offset / sector_size)
     self._block_size, self._image_size = GetImageSize(file_path, ofs)
 
-    self._fh = open(file_path, 'rb')
+    self._fh = MmapFile(file_path)
     self._fh.seek(0, os.SEEK_END)
     self._fh_size = self._fh.tell()
     self._image_offset = ofs
@@ -150,7 +152,7 @@ def GetImageSize(file_path, offset):
   if not offset:
     return 0, 0
 
-  img = pytsk3.Img_Info(file_path)
+  img = MmapImgInfo(file_path)
   try:
     volume = pytsk3.Volume_Info(img)
   except IOError: